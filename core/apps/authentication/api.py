@@ -1,13 +1,18 @@
 from ninja import Router, Schema
 from django.contrib.auth import get_user_model
-from .authentication import api_key_auth
+from apps.common.rate_limit import RateLimit, async_rate_limit
+from apps.common.response_cache import cache_response
+from .authentication import api_key_auth, async_api_key_auth
 from .schemas import UserProfileSchema, APIKeyRegenSchema
 
 User = get_user_model()
-router = Router(tags=["Authentication"])
+router = Router(tags=["Authentication"], throttle=RateLimit("api"))
+async_router = Router(tags=["Authentication"])
+async_router.add_decorator(async_rate_limit("api"))
 
 
 @router.get("/me", response=UserProfileSchema, auth=api_key_auth)
+@cache_response("auth.me", secret_fields=("api_key",))
 def get_user_profile(request):
     """Get current user profile"""
     return UserProfileSchema(
@@ -23,7 +28,37 @@ def get_user_profile(request):
 def regenerate_api_key(request):
     """Regenerate API key for current user"""
     request.auth.regenerate_api_key()
-    request.auth.refresh_from_db()  # Get updated api_key from database
+    request.auth.refresh_from_db(fields=["api_key"])  # Get updated api_key
+
+    return APIKeyRegenSchema(
+        message="API key regenerated successfully",
+        new_api_key=request.auth.api_key,
+    )
+
+
+# Async variants, mounted instead of the routes above when API_ASYNC is enabled
+
+
+@async_router.get("/me", response=UserProfileSchema, auth=async_api_key_auth)
+@cache_response("auth.me", secret_fields=("api_key",))
+async def aget_user_profile(request):
+    """Get current user profile"""
+    return UserProfileSchema(
+        id=str(request.auth.id),
+        username=request.auth.username,
+        email=request.auth.email,
+        is_staff=request.auth.is_staff,
+        api_key=request.auth.api_key,
+    )
+
+
+@async_router.post(
+    "/regenerate-key", response=APIKeyRegenSchema, auth=async_api_key_auth
+)
+async def aregenerate_api_key(request):
+    """Regenerate API key for current user"""
+    await request.auth.aregenerate_api_key()
+    await request.auth.arefresh_from_db(fields=["api_key"])  # Get updated api_key
 
     return APIKeyRegenSchema(
         message="API key regenerated successfully",
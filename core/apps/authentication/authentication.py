@@ -2,6 +2,7 @@ from django.contrib.auth.backends import BaseBackend
 from django.contrib.auth import get_user_model
 from ninja.security import APIKeyHeader
 from django.http import HttpRequest
+from .cache import api_key_cache
 
 User = get_user_model()
 
@@ -10,12 +11,18 @@ class APIKeyAuthentication(APIKeyHeader):
     param_name = "X-API-Key"
 
     def authenticate(self, request: HttpRequest, key: str):
-        try:
-            user = User.objects.get(api_key=key, is_api_key_active=True)
-            return user
-        except User.DoesNotExist:
-            return None
+        return api_key_cache.get_user(key)
 
 
-# Create global instance
+class AsyncAPIKeyAuthentication(APIKeyHeader):
+    """Same lookup as APIKeyAuthentication, awaited on the event loop"""
+
+    param_name = "X-API-Key"
+
+    async def authenticate(self, request: HttpRequest, key: str):
+        return await api_key_cache.aget_user(key)
+
+
+# Create global instances
 api_key_auth = APIKeyAuthentication()
+async_api_key_auth = AsyncAPIKeyAuthentication()
@@ -0,0 +1,140 @@
+import secrets
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from apps.common.redis_clients import get_redis
+from apps.common.task_control import task_key
+
+from .cache import invalidate_api_keys
+from .models import APIKeyLookup
+
+User = get_user_model()
+
+
+def rotate_api_keys(user_ids):
+    """
+    Give each user a new API key; returns the number of users rotated.
+
+    One UPDATE writes only ``api_key_seed`` (the database recomputes
+    ``api_key``), one upsert refreshes the lookup rows, and the old keys'
+    cache entries are dropped after the commit.
+    """
+    with transaction.atomic():
+        old_keys = dict(
+            User.objects.filter(pk__in=user_ids)
+            .select_for_update()
+            .values_list("pk", "api_key")
+        )
+        User.objects.bulk_update(
+            [User(pk=pk, api_key_seed=secrets.token_urlsafe(64)) for pk in old_keys],
+            ["api_key_seed"],
+        )
+        APIKeyLookup.objects.sync_users(list(old_keys))
+        transaction.on_commit(lambda: invalidate_api_keys(*old_keys.values()))
+    return len(old_keys)
+
+
+def activate_api_keys(user_ids):
+    return set_api_keys_active(user_ids, True)
+
+
+def deactivate_api_keys(user_ids):
+    return set_api_keys_active(user_ids, False)
+
+
+def set_api_keys_active(user_ids, active):
+    with transaction.atomic():
+        users = User.objects.filter(pk__in=user_ids)
+        api_keys = list(users.values_list("api_key", flat=True))
+        count = users.update(is_api_key_active=active)
+        transaction.on_commit(lambda: invalidate_api_keys(*api_keys))
+    return count
+
+
+BULK_ACTIONS = {
+    "rotate": rotate_api_keys,
+    "activate": activate_api_keys,
+    "deactivate": deactivate_api_keys,
+}
+
+
+def store_user_ids(user_ids, batch_size=None):
+    """
+    Keep ``user_ids`` in Redis for a background run and return the key to
+    pass as ``user_set``, so a large selection stays out of the task message
+    """
+    batch_size = batch_size or settings.API_KEY_BULK_BATCH_SIZE
+    key = task_key("users", uuid.uuid4().hex)
+    user_ids = [str(pk) for pk in user_ids]
+    pipe = get_redis("tasks").pipeline(transaction=False)
+    # Equal scores keep members in string order, ranged with ZRANGEBYLEX
+    for start in range(0, len(user_ids), batch_size):
+        pipe.zadd(key, dict.fromkeys(user_ids[start : start + batch_size], 0))
+    pipe.expire(key, settings.TASK_CHECKPOINT_TTL)
+    pipe.execute()
+    return key
+
+
+def stored_user_count(user_set):
+    return get_redis("tasks").zcard(user_set)
+
+
+def drop_stored_user_ids(user_set):
+    get_redis("tasks").delete(user_set)
+
+
+def user_id_batches(user_ids=None, batch_size=None, after=None, user_set=None):
+    """
+    Lists of at most ``batch_size`` user ids in primary key order, after
+    ``after`` (a primary key) when resuming: ``user_ids``, the ids stored
+    under ``user_set`` by store_user_ids(), read a batch at a time, or, when
+    both are None, the whole user table walked by primary key instead of
+    loading every id at once.
+    """
+    batch_size = batch_size or settings.API_KEY_BULK_BATCH_SIZE
+    if user_set is not None:
+        client = get_redis("tasks")
+        while True:
+            start = f"({after}" if after is not None else "-"
+            batch = [
+                pk.decode()
+                for pk in client.zrangebylex(user_set, start, "+", 0, batch_size)
+            ]
+            if not batch:
+                return
+            yield batch
+            after = batch[-1]
+    if user_ids is not None:
+        ids = sorted({str(pk) for pk in user_ids})
+        if after is not None:
+            ids = [pk for pk in ids if pk > str(after)]
+        for start in range(0, len(ids), batch_size):
+            yield ids[start : start + batch_size]
+        return
+
+    users = User.objects.order_by("pk").values_list("pk", flat=True)
+    while True:
+        batch = list(
+            users.filter(pk__gt=after)[:batch_size] if after else users[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        after = batch[-1]
+
+
+def bulk_update_api_keys(
+    action, user_ids=None, batch_size=None, after=None, user_set=None
+):
+    """
+    Apply ``action`` (a BULK_ACTIONS key) a batch at a time, each batch in
+    its own transaction. Yields (users updated, last primary key of the
+    batch) after each commit, so callers can report progress, checkpoint
+    and stop between batches.
+    """
+    apply = BULK_ACTIONS[action]
+    for batch in user_id_batches(user_ids, batch_size, after, user_set):
+        yield apply(batch), str(batch[-1])
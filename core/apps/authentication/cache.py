@@ -0,0 +1,243 @@
+import datetime
+import hashlib
+import json
+import logging
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+
+from apps.common.local_cache import MISSING, LocalTTLCache
+from apps.common.metrics import Counter
+from apps.common.redis_clients import get_async_redis, get_redis, redis_clients
+from apps.common.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+API_KEY_CACHE_LOOKUPS = Counter(
+    "api_key_cache_lookups",
+    "API key cache lookups by tier (local, redis) and result (hit, miss, error)",
+    ["tier", "result"],
+)
+
+
+class FieldValueEncoder(DjangoJSONEncoder):
+    """Like DjangoJSONEncoder, but keeps datetime microseconds intact"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class APIKeyCache:
+    """
+    Two-tier cache in front of the API key -> user lookup.
+
+    Tier 1 is a per-process LRU with a short TTL, tier 2 is a shared Redis
+    entry. Both tiers also remember keys that matched no active user.
+    Only the ``fields`` that API key authentication and the routes read are
+    cached, never the password hash, the key seed or the key itself; the
+    cached user gets the presented key back and loads any other field from
+    the database on first access.
+    Invalidation clears the local tier of the calling process and the Redis
+    tier; other processes may serve their local copy for up to
+    ``API_KEY_CACHE_LOCAL_TTL`` seconds.
+    """
+
+    fields = (
+        "id",
+        "username",
+        "email",
+        "first_name",
+        "last_name",
+        "is_active",
+        "is_staff",
+        "is_superuser",
+        "is_api_key_active",
+    )
+
+    def __init__(self):
+        self.key_prefix = redis_clients.prefix("auth") + "apikey:"
+        self.enabled = settings.API_KEY_CACHE_ENABLED
+        self.redis_ttl = settings.API_KEY_CACHE_REDIS_TTL
+        self.negative_ttl = settings.API_KEY_CACHE_NEGATIVE_TTL
+        self.local = LocalTTLCache(
+            maxsize=settings.API_KEY_CACHE_LOCAL_MAXSIZE,
+            ttl=settings.API_KEY_CACHE_LOCAL_TTL,
+        )
+
+    @property
+    def redis(self):
+        return get_redis("auth")
+
+    @property
+    def async_redis(self):
+        return get_async_redis("auth")
+
+    def cache_key(self, api_key):
+        # Hash the key so raw API keys never appear in Redis
+        return self.key_prefix + hashlib.sha256(api_key.encode()).hexdigest()
+
+    def get_user(self, api_key):
+        """Return the active user owning ``api_key``, or None"""
+        if not api_key:
+            return None
+        if not self.enabled:
+            return self.to_user(self.load(api_key), api_key)
+
+        cache_key = self.cache_key(api_key)
+        values = self.local.get(cache_key)
+        API_KEY_CACHE_LOOKUPS.inc(
+            tier="local", result="miss" if values is MISSING else "hit"
+        )
+        if values is MISSING:
+            values = self.get_shared(cache_key)
+            if values is MISSING:
+                values = self.load(api_key)
+                self.set_shared(cache_key, values)
+            self.set_local(cache_key, values)
+        return self.to_user(values, api_key)
+
+    async def aget_user(self, api_key):
+        """Async variant of get_user() using redis.asyncio and the async ORM"""
+        if not api_key:
+            return None
+        if not self.enabled:
+            return self.to_user(await self.aload(api_key), api_key)
+
+        cache_key = self.cache_key(api_key)
+        values = self.local.get(cache_key)
+        API_KEY_CACHE_LOOKUPS.inc(
+            tier="local", result="miss" if values is MISSING else "hit"
+        )
+        if values is MISSING:
+            values = await self.aget_shared(cache_key)
+            if values is MISSING:
+                values = await self.aload(api_key)
+                await self.aset_shared(cache_key, values)
+            self.set_local(cache_key, values)
+        return self.to_user(values, api_key)
+
+    def invalidate(self, *api_keys):
+        """Drop cached entries (positive and negative) for the given keys"""
+        cache_keys = [self.cache_key(api_key) for api_key in api_keys if api_key]
+        if not cache_keys:
+            return
+        self.local.delete(*cache_keys)
+        try:
+            self.redis.delete(*cache_keys)
+        except redis.RedisError:
+            logger.exception(
+                "Failed to invalidate %d API key cache entries", len(cache_keys)
+            )
+
+    def load(self, api_key):
+        """Fetch the user's cached fields from the database"""
+        from .models import APIKeyLookup
+
+        user = APIKeyLookup.objects.resolve(api_key)
+        if user is None:
+            return None
+        return self.values_of(user)
+
+    async def aload(self, api_key):
+        from .models import APIKeyLookup
+
+        user = await APIKeyLookup.objects.aresolve(api_key)
+        if user is None:
+            return None
+        return self.values_of(user)
+
+    def cached_fields(self):
+        """The cached concrete fields, in model order as from_db() needs"""
+        User = get_user_model()
+        return [f for f in User._meta.concrete_fields if f.name in self.fields]
+
+    def values_of(self, user):
+        return {
+            field.attname: field.value_from_object(user)
+            for field in self.cached_fields()
+        }
+
+    def to_user(self, values, api_key):
+        if values is None:
+            return None
+        User = get_user_model()
+        values = {
+            field.attname: api_key if field.name == "api_key" else values[field.attname]
+            for field in User._meta.concrete_fields
+            if field.name in self.fields or field.name == "api_key"
+        }
+        return User.from_db(
+            router.db_for_read(User), list(values), list(values.values())
+        )
+
+    def set_local(self, cache_key, values):
+        if values is None:
+            self.local.set(cache_key, None, min(self.local.ttl, self.negative_ttl))
+        else:
+            self.local.set(cache_key, values)
+
+    def get_shared(self, cache_key):
+        try:
+            payload = self.redis.get(cache_key)
+        except redis.RedisError:
+            logger.warning("API key cache unavailable, falling back to database")
+            API_KEY_CACHE_LOOKUPS.inc(tier="redis", result="error")
+            return MISSING
+        if payload is None:
+            API_KEY_CACHE_LOOKUPS.inc(tier="redis", result="miss")
+            return MISSING
+        API_KEY_CACHE_LOOKUPS.inc(tier="redis", result="hit")
+        return self.decode(payload)
+
+    def set_shared(self, cache_key, values):
+        ttl = self.negative_ttl if values is None else self.redis_ttl
+        try:
+            self.redis.set(cache_key, self.encode(values), ex=ttl)
+        except redis.RedisError:
+            logger.warning("API key cache unavailable, entry not stored")
+
+    async def aget_shared(self, cache_key):
+        try:
+            payload = await self.async_redis.get(cache_key)
+        except redis.RedisError:
+            logger.warning("API key cache unavailable, falling back to database")
+            API_KEY_CACHE_LOOKUPS.inc(tier="redis", result="error")
+            return MISSING
+        if payload is None:
+            API_KEY_CACHE_LOOKUPS.inc(tier="redis", result="miss")
+            return MISSING
+        API_KEY_CACHE_LOOKUPS.inc(tier="redis", result="hit")
+        return self.decode(payload)
+
+    async def aset_shared(self, cache_key, values):
+        ttl = self.negative_ttl if values is None else self.redis_ttl
+        try:
+            await self.async_redis.set(cache_key, self.encode(values), ex=ttl)
+        except redis.RedisError:
+            logger.warning("API key cache unavailable, entry not stored")
+
+    def encode(self, values):
+        return json.dumps({"user": values}, cls=FieldValueEncoder)
+
+    def decode(self, payload):
+        values = json.loads(payload)["user"]
+        if values is None:
+            return None
+        return {
+            field.attname: field.to_python(values[field.attname])
+            for field in self.cached_fields()
+        }
+
+
+api_key_cache = APIKeyCache()
+
+
+def invalidate_api_keys(*api_keys):
+    """Drop everything cached under these keys: the user and their responses"""
+    api_key_cache.invalidate(*api_keys)
+    response_cache.invalidate(*api_keys)
@@ -0,0 +1,135 @@
+import random
+import secrets
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from authentication.models import APIKeyLookup
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure API key lookup latency as the user table grows. Synthetic "
+        "users are created inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[10_000, 100_000, 1_000_000],
+            help="User counts to measure at (e.g. 10000 100000 1000000 10000000)",
+        )
+        parser.add_argument(
+            "--lookups", type=int, default=2000, help="Lookups per size"
+        )
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument(
+            "--compare-generated-field",
+            action="store_true",
+            help="Also time the old unindexed User.objects.get(api_key=...) query",
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(options["sizes"])
+        self.stdout.write(
+            f"{'users':>12} {'hit p50':>10} {'hit p99':>10} {'miss p50':>10} "
+            f"{'miss p99':>10}"
+            + (f" {'scan p50':>10}" if options["compare_generated_field"] else "")
+        )
+
+        with transaction.atomic():
+            created = User.objects.count()
+            for size in sizes:
+                created = self.grow_to(size, created, options["batch_size"])
+                self.analyze()
+                self.report(size, options)
+            transaction.set_rollback(True)
+
+    def grow_to(self, size, created, batch_size):
+        """Bulk insert synthetic users (and their lookup rows) up to ``size``"""
+        while created < size:
+            count = min(batch_size, size - created)
+            users = User.objects.bulk_create(
+                [
+                    User(
+                        username=f"bench_{created + i}_{secrets.token_hex(4)}",
+                        password="!",
+                        api_key_seed=secrets.token_urlsafe(48),
+                    )
+                    for i in range(count)
+                ]
+            )
+            APIKeyLookup.objects.sync_users([user.pk for user in users])
+            created += count
+            self.stderr.write(f"  {created}/{size} users", ending="\r")
+        self.stderr.write("")
+        return created
+
+    def analyze(self):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {User._meta.db_table}")
+                cursor.execute(f"ANALYZE {APIKeyLookup._meta.db_table}")
+
+    def report(self, size, options):
+        lookups = options["lookups"]
+        sample = self.sample_keys(lookups)
+        misses = [f"ak_{secrets.token_hex(16).upper()}" for _ in range(lookups)]
+
+        hits = self.time_calls(APIKeyLookup.objects.resolve, sample)
+        missed = self.time_calls(APIKeyLookup.objects.resolve, misses)
+        row = (
+            f"{size:>12} {self.p(hits, 50):>10} {self.p(hits, 99):>10} "
+            f"{self.p(missed, 50):>10} {self.p(missed, 99):>10}"
+        )
+        if options["compare_generated_field"]:
+            scan = self.time_calls(
+                lambda key: User.objects.filter(
+                    api_key=key, is_api_key_active=True
+                ).first(),
+                sample[: max(1, lookups // 100)],
+            )
+            row += f" {self.p(scan, 50):>10}"
+        self.stdout.write(row)
+
+    def sample_keys(self, count):
+        if connection.vendor != "postgresql":
+            keys = User.objects.order_by("?").values_list("api_key", flat=True)
+            return list(keys[:count])
+
+        # ORDER BY random() over millions of rows is slow, sample pages instead
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT api_key FROM {User._meta.db_table} "
+                "TABLESAMPLE SYSTEM (1) LIMIT %s",
+                [count],
+            )
+            keys = [row[0] for row in cursor.fetchall()]
+        if len(keys) < count:
+            keys += list(
+                User.objects.values_list("api_key", flat=True)[: count - len(keys)]
+            )
+        random.shuffle(keys)
+        return keys
+
+    def time_calls(self, func, args):
+        timings = []
+        for arg in args:
+            start = time.perf_counter()
+            func(arg)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def p(self, timings, percentile):
+        """Format a latency percentile in microseconds"""
+        if len(timings) < 2:
+            return f"{timings[0] * 1e6:.0f}us"
+        value = statistics.quantiles(timings, n=100)[percentile - 1]
+        return f"{value * 1e6:.0f}us"
@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.bulk_keys import BULK_ACTIONS, bulk_update_api_keys
+from authentication.tasks import bulk_update_api_keys_task
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rotate, activate or deactivate API keys in batches of "
+        "API_KEY_BULK_BATCH_SIZE users, each batch one UPDATE in its own "
+        "transaction. Runs here by default, or as a Celery task."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=sorted(BULK_ACTIONS))
+        users = parser.add_mutually_exclusive_group(required=True)
+        users.add_argument("--all", action="store_true", help="Every user")
+        users.add_argument("--users", nargs="+", metavar="USERNAME")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument(
+            "--background",
+            action="store_true",
+            help="Queue a task reporting progress instead of running here",
+        )
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        user_ids = None
+        if options["users"]:
+            users = dict(
+                User.objects.filter(username__in=options["users"]).values_list(
+                    "username", "pk"
+                )
+            )
+            missing = sorted(set(options["users"]) - set(users))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(missing)}")
+            user_ids = [str(pk) for pk in users.values()]
+
+        if options["background"]:
+            task = bulk_update_api_keys_task.delay(action, user_ids)
+            self.stdout.write(f"Queued task {task.id}")
+            return
+
+        total = len(user_ids) if user_ids is not None else User.objects.count()
+        done = 0
+        for count, _ in bulk_update_api_keys(
+            action, user_ids, batch_size=options["batch_size"]
+        ):
+            done += count
+            self.stdout.write(f"{action}: {done}/{total} users")
+        self.stdout.write(self.style.SUCCESS(f"API key {action} done: {done} users"))
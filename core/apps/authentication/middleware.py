@@ -0,0 +1,56 @@
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from .cache import api_key_cache
+
+
+class APIKeyAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate WebSocket handshakes by API key, before the consumer accepts.
+
+    The key is read from the ``X-API-Key`` header or, for browsers that
+    cannot set headers, from the subprotocol list ``["apikey", "<key>"]``.
+    A socket presenting an unknown key is rejected during the handshake.
+    Sockets without a key reach the consumer as ``AnonymousUser`` so the
+    message-based ``auth`` flow still works, unless
+    ``WS_REQUIRE_HANDSHAKE_AUTH`` is enabled.
+    """
+
+    header_name = b"x-api-key"
+    subprotocol = "apikey"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket":
+            return await super().__call__(scope, receive, send)
+
+        scope = dict(scope)
+        scope["user"] = AnonymousUser()
+
+        api_key = self.get_api_key(scope)
+        if api_key:
+            user = await api_key_cache.aget_user(api_key)
+            if user is None:
+                return await self.deny(receive, send, code=4001)
+            scope["user"] = user
+        elif settings.WS_REQUIRE_HANDSHAKE_AUTH:
+            return await self.deny(receive, send, code=4001)
+
+        return await self.inner(scope, receive, send)
+
+    def get_api_key(self, scope):
+        for name, value in scope.get("headers", []):
+            if name == self.header_name:
+                return value.decode("latin1")
+
+        subprotocols = scope.get("subprotocols") or []
+        if self.subprotocol in subprotocols:
+            index = subprotocols.index(self.subprotocol)
+            if index + 1 < len(subprotocols):
+                return subprotocols[index + 1]
+        return None
+
+    async def deny(self, receive, send, code):
+        """Close before accept(), which servers answer with HTTP 403"""
+        message = await receive()
+        if message["type"] == "websocket.connect":
+            await send({"type": "websocket.close", "code": code})
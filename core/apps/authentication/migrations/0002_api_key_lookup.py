@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:49
+
+import hashlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def backfill_api_key_lookups(apps, schema_editor):
+    User = apps.get_model("authentication", "User")
+    APIKeyLookup = apps.get_model("authentication", "APIKeyLookup")
+    db_alias = schema_editor.connection.alias
+
+    batch = []
+    users = User.objects.using(db_alias).values_list("id", "api_key")
+    for user_id, api_key in users.iterator(chunk_size=BATCH_SIZE):
+        digest = hashlib.sha256(api_key.encode()).digest()
+        batch.append(APIKeyLookup(user_id=user_id, digest=digest))
+        if len(batch) >= BATCH_SIZE:
+            APIKeyLookup.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    if batch:
+        APIKeyLookup.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="APIKeyLookup",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="api_key_lookup",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("digest", models.BinaryField(max_length=32, unique=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_api_key_lookups, migrations.RunPython.noop),
+    ]
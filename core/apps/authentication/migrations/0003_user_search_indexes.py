@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# Indexes behind the admin user search (authentication.admin.UserAdmin).
+# Django compares UPPER(column) in case-insensitive lookups, so they are on
+# that expression: trigram GIN indexes serve icontains and istartswith, a
+# B-tree the exact email match and a pattern index the API key prefix
+# match. Built CONCURRENTLY, so auth_user stays writable meanwhile.
+SEARCH_INDEXES = {
+    "auth_user_username_trgm": "USING gin (UPPER(username) gin_trgm_ops)",
+    "auth_user_first_name_trgm": "USING gin (UPPER(first_name) gin_trgm_ops)",
+    "auth_user_last_name_trgm": "USING gin (UPPER(last_name) gin_trgm_ops)",
+    "auth_user_email_trgm": "USING gin (UPPER(email) gin_trgm_ops)",
+    "auth_user_email_upper": "(UPPER(email))",
+    "auth_user_api_key_prefix": "(api_key varchar_pattern_ops)",
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    """PostgreSQL only; other databases search without them"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, definition in SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+            f'ON "auth_user" {definition}'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ("authentication", "0002_api_key_lookup"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
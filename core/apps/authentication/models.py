@@ -1,10 +1,16 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.db.models import CharField, Value
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.db.models.functions import Concat, Upper, Substr, MD5
+import hashlib
+import hmac
 import secrets
 import uuid
 
+from .cache import invalidate_api_keys
+
 
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -21,19 +27,137 @@ class User(AbstractUser):
         db_persist=True,  # Store in database for performance
     )
 
+    # Seed as loaded from the database, to detect key changes on save
+    _loaded_api_key_seed = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_api_key_seed = instance.__dict__.get("api_key_seed")
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.api_key_seed:
             self.api_key_seed = secrets.token_urlsafe(64)
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        seed_changed = adding or self.api_key_seed != self._loaded_api_key_seed
+        previous_api_key = self._loaded_api_key()
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+            if seed_changed:
+                # api_key is recomputed by the database, keep the lookup in step
+                api_keys = APIKeyLookup.objects.sync_users([self.pk])
+                self.api_key = api_keys[self.pk]
+                self._loaded_api_key_seed = self.api_key_seed
+        if not adding:
+            # Any change may affect the cached user, so drop the old key's entry
+            transaction.on_commit(lambda: invalidate_api_keys(previous_api_key))
+
+    def _loaded_api_key(self):
+        """API key as currently stored, without a query when already loaded"""
+        if self._state.adding:
+            return None
+        if "api_key" in self.__dict__:
+            return self.__dict__["api_key"]
+        return (
+            type(self)
+            .objects.filter(pk=self.pk)
+            .values_list("api_key", flat=True)
+            .first()
+        )
 
     def regenerate_api_key(self):
         """Regenerate API key by changing the seed"""
         self.api_key_seed = secrets.token_urlsafe(64)
-        self.save()
+        # Only the seed: the instance may be a cached snapshot whose other
+        # fields (is_api_key_active, is_staff...) are older than the row
+        self.save(update_fields=["api_key_seed"])
         # The api_key field will be automatically updated by the database
 
+    async def aregenerate_api_key(self):
+        """Async version of regenerate_api_key()"""
+        self.api_key_seed = secrets.token_urlsafe(64)
+        await self.asave(update_fields=["api_key_seed"])
+
     def __str__(self):
         return f"{self.username} (API: {self.api_key[:8]}...)"
 
     class Meta:
         db_table = "auth_user"
+
+
+class APIKeyLookupManager(models.Manager):
+    def sync_users(self, user_ids):
+        """Upsert lookup rows from the stored api_key, return {user_id: api_key}"""
+        User = self.model._meta.get_field("user").related_model
+        api_keys = dict(
+            User.objects.filter(pk__in=user_ids).values_list("id", "api_key")
+        )
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, digest=self.model.digest_for(api_key))
+                for user_id, api_key in api_keys.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["digest"],
+        )
+        return api_keys
+
+    def resolve(self, api_key):
+        """Return the active user owning ``api_key``, or None"""
+        try:
+            lookup = self.select_related("user").get(
+                digest=self.model.digest_for(api_key), user__is_api_key_active=True
+            )
+        except self.model.DoesNotExist:
+            return None
+        return lookup.verified_user(api_key)
+
+    async def aresolve(self, api_key):
+        """Async version of resolve()"""
+        try:
+            lookup = await self.select_related("user").aget(
+                digest=self.model.digest_for(api_key), user__is_api_key_active=True
+            )
+        except self.model.DoesNotExist:
+            return None
+        return lookup.verified_user(api_key)
+
+
+class APIKeyLookup(models.Model):
+    """
+    Fixed-length SHA-256 digest of each user's API key under a unique B-tree
+    index, so key lookups stay a single index probe however large auth_user
+    grows. Maintained by User.save() and APIKeyLookupManager.sync_users().
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="api_key_lookup",
+    )
+    digest = models.BinaryField(max_length=32, unique=True)
+
+    objects = APIKeyLookupManager()
+
+    @staticmethod
+    def digest_for(api_key):
+        return hashlib.sha256(api_key.encode()).digest()
+
+    def verified_user(self, api_key):
+        """Return the user if its key matches ``api_key`` (constant-time)"""
+        if hmac.compare_digest(self.user.api_key.encode(), api_key.encode()):
+            return self.user
+        return None
+
+    def __str__(self):
+        return f"API key lookup for {self.user_id}"
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user_api_key(sender, instance, **kwargs):
+    """Covers queryset deletes (e.g. the admin bulk delete) as well"""
+    api_key = instance.__dict__.get("api_key")
+    transaction.on_commit(lambda: invalidate_api_keys(api_key))
@@ -1 +1,85 @@
-# Auth tasks (empty as per plan structure)
+import logging
+
+from celery import shared_task
+from celery.exceptions import Ignore
+from django.contrib.auth import get_user_model
+
+from apps.common.broadcast import task_group, user_group
+from apps.common.progress import TaskProgress
+from apps.common.task_control import TaskCheckpoint
+
+from .bulk_keys import (
+    bulk_update_api_keys,
+    drop_stored_user_ids,
+    stored_user_count,
+)
+
+logger = logging.getLogger("db")
+
+
+@shared_task(
+    bind=True,
+    name="authentication.tasks.bulk_update_api_keys",
+    acks_late=True,
+    reject_on_worker_lost=True,
+)
+def bulk_update_api_keys_task(
+    self, action, user_ids=None, requested_by=None, user_set=None
+):
+    """
+    Rotate, activate or deactivate the API keys of ``user_ids``, of the ids
+    stored under ``user_set`` by store_user_ids() (large selections), or of
+    every user when both are None, in batches of API_KEY_BULK_BATCH_SIZE
+    Progress goes to the task's group and to the requesting user's group;
+    each committed batch is checkpointed, so a retry resumes after it, and
+    a cancellation request stops the task between batches
+    """
+    groups = [task_group(self.request.id)]
+    if requested_by:
+        groups.append(user_group(requested_by))
+    reporter = TaskProgress(groups, self.request.id)
+    checkpoint = TaskCheckpoint(self.request.id).load()
+    if user_set is not None:
+        total = stored_user_count(user_set)
+    elif user_ids is not None:
+        total = len(user_ids)
+    else:
+        total = get_user_model().objects.count()
+    done = checkpoint.step
+    logger.info(f"Bulk API key {action} of {total} user(s): {self.request.id}")
+
+    try:
+        batches = bulk_update_api_keys(
+            action, user_ids, after=checkpoint.state.get("after"), user_set=user_set
+        )
+        for count, last in batches:
+            done += count
+            checkpoint.save(done, after=last)
+            reporter.update(
+                message=f"API key {action}: {done}/{total} users",
+                progress=done * 100 // max(total, 1),
+                processed=done,
+                total=total,
+            )
+            if checkpoint.cancelled:
+                break
+    except Exception as exc:
+        logger.exception(f"Bulk API key {action} {self.request.id} failed: {exc}")
+        reporter.failed(message=f"Task failed: {str(exc)}", error=str(exc))
+        raise self.retry(exc=exc, countdown=60, max_retries=3)
+
+    checkpoint.clear()
+    if user_set is not None:
+        drop_stored_user_ids(user_set)
+    if checkpoint.cancelled:
+        reporter.cancelled(
+            message=f"API key {action} cancelled after {done} users",
+            progress=done * 100 // max(total, 1),
+        )
+        logger.info(f"Cancelled bulk API key {action}: {self.request.id}")
+        self.backend.mark_as_revoked(self.request.id, "Cancelled", request=self.request)
+        raise Ignore()
+
+    reporter.completed(message=f"API key {action} done: {done} users", progress=100)
+    logger.info(f"Bulk API key {action} done for {done} user(s): {self.request.id}")
+    return {"status": "completed", "action": action, "users": done}
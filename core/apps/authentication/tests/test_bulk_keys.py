@@ -0,0 +1,78 @@
+import json
+from unittest import mock
+
+import fakeredis
+from django.contrib import admin
+from django.test import RequestFactory, TestCase, override_settings
+
+from authentication.bulk_keys import (
+    drop_stored_user_ids,
+    store_user_ids,
+    stored_user_count,
+    user_id_batches,
+)
+from authentication.models import User
+
+
+class StoredUserIdsTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "authentication.bulk_keys.get_redis",
+            return_value=fakeredis.FakeStrictRedis(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ids = sorted(f"{n:08x}-0000-0000-0000-000000000000" for n in range(7))
+
+    def test_batches_in_primary_key_order(self):
+        user_set = store_user_ids(reversed(self.ids), batch_size=3)
+        self.assertEqual(stored_user_count(user_set), 7)
+        self.assertEqual(
+            list(user_id_batches(batch_size=3, user_set=user_set)),
+            [self.ids[:3], self.ids[3:6], self.ids[6:]],
+        )
+
+    def test_resumes_after_checkpoint(self):
+        user_set = store_user_ids(self.ids)
+        batches = user_id_batches(batch_size=4, after=self.ids[2], user_set=user_set)
+        self.assertEqual(list(batches), [self.ids[3:7]])
+
+    def test_drop(self):
+        user_set = store_user_ids(self.ids)
+        drop_stored_user_ids(user_set)
+        self.assertEqual(list(user_id_batches(user_set=user_set)), [])
+
+
+@override_settings(API_KEY_BULK_BATCH_SIZE=2)
+class AdminBulkActionTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        for target in ("authentication.bulk_keys", "apps.common.task_control"):
+            patcher = mock.patch(f"{target}.get_redis", return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.staff = User.objects.create_superuser("admin", "admin@example.com", "x")
+        for n in range(4):
+            User.objects.create_user(f"user{n}", f"user{n}@example.com")
+        self.model_admin = admin.site._registry[User]
+        self.request = RequestFactory().post("/admin/authentication/user/")
+        self.request.user = self.staff
+
+    def test_large_selection_sends_key_of_stored_ids(self):
+        queryset = User.objects.all()
+        with mock.patch(
+            "authentication.admin.bulk_update_api_keys_task.delay"
+        ) as delay, mock.patch.object(self.model_admin, "message_user"):
+            delay.return_value.id = "task-1"
+            self.model_admin.deactivate_api_keys(self.request, queryset)
+
+        args, kwargs = delay.call_args
+        self.assertEqual(args, ("deactivate",))
+        self.assertNotIn("user_ids", kwargs)
+        self.assertLess(len(json.dumps(kwargs)), 200)
+        stored = [
+            pk for batch in user_id_batches(user_set=kwargs["user_set"]) for pk in batch
+        ]
+        self.assertEqual(
+            stored, sorted(str(pk) for pk in queryset.values_list("pk", flat=True))
+        )
@@ -0,0 +1,52 @@
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from authentication.cache import api_key_cache
+from authentication.models import APIKeyLookup, User
+
+
+class RegenerateAPIKeyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", "alice@example.com")
+
+    def authenticated(self):
+        """The user as API key authentication hands it to a route"""
+        return api_key_cache.to_user(
+            api_key_cache.values_of(self.user), self.user.api_key
+        )
+
+    def deactivate_and_demote(self):
+        """An admin change committed after the user authenticated"""
+        User.objects.filter(pk=self.user.pk).update(
+            is_api_key_active=False, is_staff=False
+        )
+
+    def assert_regenerated_only(self, old_api_key):
+        stored = User.objects.get(pk=self.user.pk)
+        self.assertNotEqual(stored.api_key, old_api_key)
+        self.assertFalse(stored.is_api_key_active)
+        self.assertFalse(stored.is_staff)
+        self.assertEqual(
+            APIKeyLookup.objects.get(user=stored).digest,
+            APIKeyLookup.digest_for(stored.api_key),
+        )
+
+    def test_keeps_key_deactivated_since_authentication(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.user.refresh_from_db()
+        user = self.authenticated()
+        self.deactivate_and_demote()
+
+        user.regenerate_api_key()
+
+        self.assert_regenerated_only(self.user.api_key)
+
+    def test_async_keeps_key_deactivated_since_authentication(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.user.refresh_from_db()
+        user = self.authenticated()
+        self.deactivate_and_demote()
+
+        async_to_sync(user.aregenerate_api_key)()
+
+        self.assert_regenerated_only(self.user.api_key)
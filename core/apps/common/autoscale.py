@@ -0,0 +1,255 @@
+import json
+import logging
+import math
+import time
+
+from celery.worker import state
+from celery.worker.autoscale import Autoscaler
+from django.conf import settings
+
+from .metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+CELERY_POOL_CONCURRENCY = Gauge(
+    "celery_pool_concurrency",
+    "Pool size of autoscaled Celery workers, by consumed queues",
+    ["queues"],
+)
+
+
+class ScalingPolicy:
+    """
+    Pool size wanted for a backlog, with a dead band between growing and
+    shrinking so the pool does not flap around a threshold.
+
+    The pool grows when more than ``scale_up_backlog`` tasks per worker are
+    waiting, or when the oldest one has waited ``scale_up_wait`` seconds. It
+    shrinks only once nothing has been waiting and fewer than
+    ``scale_down_utilization`` of the workers have been busy for
+    ``scale_down_delay`` seconds in a row, and never below the busy workers.
+    ``scale_up_step`` and ``scale_down_step`` bound one change (None for no
+    bound).
+    """
+
+    def __init__(
+        self,
+        scale_up_backlog=1.0,
+        scale_up_wait=10.0,
+        scale_up_step=None,
+        scale_down_utilization=0.5,
+        scale_down_delay=60.0,
+        scale_down_step=None,
+    ):
+        self.scale_up_backlog = scale_up_backlog
+        self.scale_up_wait = scale_up_wait
+        self.scale_up_step = scale_up_step
+        self.scale_down_utilization = scale_down_utilization
+        self.scale_down_delay = scale_down_delay
+        self.scale_down_step = scale_down_step
+        self.quiet_since = None
+
+    def target(self, current, busy, backlog, wait, now):
+        """The pool size to move to, ``current`` to stay"""
+        current = max(current, 1)
+        pressure = backlog > self.scale_up_backlog * current or (
+            backlog and wait is not None and wait >= self.scale_up_wait
+        )
+        if pressure:
+            self.quiet_since = None
+            return current + step(busy + backlog - current, self.scale_up_step)
+
+        if backlog or busy >= self.scale_down_utilization * current:
+            self.quiet_since = None
+            return current
+        if self.quiet_since is None:
+            self.quiet_since = now
+        if now - self.quiet_since < self.scale_down_delay:
+            return current
+        # Shrink to the size at which the busy workers hit the threshold
+        wanted = math.ceil(busy / self.scale_down_utilization)
+        return current - step(current - wanted, self.scale_down_step)
+
+
+def step(change, bound):
+    return max(change, 0) if bound is None else min(max(change, 0), bound)
+
+
+class BrokerQueues:
+    """
+    Length of broker queues and age of their oldest message.
+
+    With the Redis transport a queue is one list per priority step, read
+    with LLEN and LINDEX in one pipeline; the age comes from the
+    ``published_at`` header stamped by core.celery. Other transports only
+    report the length (AMQP passive declare).
+    """
+
+    def __init__(self, app, timeout=1.0):
+        self.app = app
+        self.timeout = timeout
+        self._connection = None
+
+    @property
+    def channel(self):
+        if self._connection is None:
+            self._connection = self.app.connection_for_read(
+                transport_options={"socket_timeout": self.timeout}
+            )
+            self._connection.ensure_connection(
+                max_retries=1, interval_start=0, timeout=self.timeout
+            )
+        return self._connection.default_channel
+
+    def sample(self, names):
+        """(messages waiting, seconds the oldest has waited or None)"""
+        try:
+            channel = self.channel
+            if hasattr(channel, "priority_steps"):
+                return redis_queue_sample(
+                    channel.client, redis_queue_keys(channel, names), time.time()
+                )
+            depth = sum(
+                channel.queue_declare(name, passive=True).message_count
+                for name in names
+            )
+            return depth, None
+        except Exception:
+            # Reconnect on the next sample
+            self.close()
+            raise
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.release()
+            except Exception:
+                pass
+            self._connection = None
+
+
+def redis_queue_keys(channel, names):
+    return [
+        f"{name}{channel.sep}{priority}" if priority else name
+        for name in names
+        for priority in channel.priority_steps
+    ]
+
+
+def redis_queue_sample(client, keys, now):
+    # Kombu pushes on the left and pops on the right: index -1 is the oldest
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.llen(key)
+        pipe.lindex(key, -1)
+    replies = pipe.execute()
+
+    depth, wait = 0, None
+    for length, oldest in zip(replies[::2], replies[1::2]):
+        depth += length
+        published = published_at(oldest)
+        if published is not None:
+            wait = max(wait or 0.0, now - published)
+    return depth, wait
+
+
+def published_at(message):
+    if message is None:
+        return None
+    try:
+        return float(json.loads(message)["headers"]["published_at"])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class QueueAutoscaler(Autoscaler):
+    """
+    Resizes the pool of a worker started with ``--autoscale=max,min`` from
+    the backlog of the queues it consumes, rather than from its own
+    prefetched tasks only as Celery's default autoscaler does.
+
+    The backlog is the broker queues' length plus the tasks this worker
+    reserved but has not started; the broker is read at most once every
+    ``AUTOSCALE_INTERVAL`` seconds. Each pool type has its own policy in
+    ``AUTOSCALE_POLICIES``: forking processes is expensive, so the prefork
+    pool grows a few processes at a time and shrinks slowly, while gevent
+    greenlets are cheap and the pool follows the backlog closely. While the
+    broker cannot be read the pool keeps its size.
+    """
+
+    def __init__(self, pool, max_concurrency, min_concurrency=0, **kwargs):
+        kwargs["keepalive"] = settings.AUTOSCALE_INTERVAL
+        super().__init__(pool, max_concurrency, min_concurrency, **kwargs)
+        self.kind = type(pool).__module__.rsplit(".", 1)[-1]
+        policies = settings.AUTOSCALE_POLICIES
+        self.policy = ScalingPolicy(**policies.get(self.kind, policies["prefork"]))
+        self.interval = settings.AUTOSCALE_INTERVAL
+        self.broker = None
+        self.backlog = 0
+        self.wait = None
+        self._sampled = None
+
+    @property
+    def queues(self):
+        app = self.worker.app
+        return sorted(app.amqp.queues.consume_from) or [app.conf.task_default_queue]
+
+    @property
+    def processes(self):
+        # The gevent pool counts running greenlets, not its size
+        if self.kind == "gevent":
+            return self.pool._pool.size
+        return self.pool.num_processes
+
+    @property
+    def busy(self):
+        return len(state.active_requests)
+
+    def sample(self, now):
+        """Read the backlog; False if the last reading is still recent"""
+        if self._sampled is not None and now - self._sampled < self.interval:
+            return False
+        if self.broker is None:
+            self.broker = BrokerQueues(self.worker.app)
+        self._sampled = now
+        try:
+            depth, self.wait = self.broker.sample(self.queues)
+        except Exception as exc:
+            logger.warning("Autoscaler cannot read the broker queues: %s", exc)
+            return False
+        prefetched = len(state.reserved_requests) - len(state.active_requests)
+        self.backlog = depth + max(prefetched, 0)
+        return True
+
+    def _maybe_scale(self, req=None):
+        now = time.monotonic()
+        if not self.sample(now):
+            return None
+        current = self.processes
+        target = self.policy.target(current, self.busy, self.backlog, self.wait, now)
+        target = min(max(target, self.min_concurrency), self.max_concurrency)
+        CELERY_POOL_CONCURRENCY.set(target, queues=",".join(self.queues))
+        if target > current:
+            self.scale_up(target - current)
+            return True
+        if target < current:
+            # Idle gevent slots only; prefork refuses to stop busy processes
+            self._shrink(current - target)
+            return True
+        return None
+
+    def _shrink(self, n):
+        if self.kind == "gevent":
+            n = min(n, self.processes - self.busy)
+            if n <= 0:
+                return
+        super()._shrink(n)
+
+    def info(self):
+        return {
+            **super().info(),
+            "policy": self.kind,
+            "busy": self.busy,
+            "backlog": self.backlog,
+            "wait": round(self.wait, 2) if self.wait is not None else None,
+        }
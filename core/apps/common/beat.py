@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django_celery_beat.schedulers import DatabaseScheduler
+
+from .redis_clients import get_redis, redis_clients
+
+logger = logging.getLogger(__name__)
+
+
+def schedule_channel():
+    return f"{redis_clients.prefix('beat')}schedule_changed"
+
+
+def publish_schedule_change():
+    """Tell running beat schedulers to reload; wired to model signals in core.celery"""
+    try:
+        get_redis("beat").publish(schedule_channel(), 1)
+    except redis.RedisError as exc:
+        logger.warning("Schedule change not published, beat polls for it: %s", exc)
+
+
+class NotifiedDatabaseScheduler(DatabaseScheduler):
+    """
+    DatabaseScheduler keeping the whole schedule in memory between changes.
+
+    The parent asks the database whether the schedule changed on every tick,
+    compares every entry with the previous tick's copy, and reloads
+    everything every five minutes because it only loads the tasks due around
+    the current hour. This scheduler loads every enabled task once and
+    reloads when a change is published on Redis (``publish_schedule_change``,
+    sent after each commit that touches the schedule). In case a
+    notification is missed (Redis down, queryset updates that skip model
+    signals) it also checks the change timestamp every
+    ``BEAT_SCHEDULE_POLL_INTERVAL`` seconds. Between reloads a tick only
+    looks at the head of Celery's due-time heap.
+    """
+
+    listen_timeout = 1.0
+    retry_seconds = 5.0
+
+    def __init__(self, *args, **kwargs):
+        self._notified = threading.Event()
+        self._listener = None
+        self._last_poll = time.monotonic()
+        self.poll_interval = settings.BEAT_SCHEDULE_POLL_INTERVAL
+        super().__init__(*args, **kwargs)
+
+    def setup_schedule(self):
+        super().setup_schedule()
+        if self._listener is None:
+            self._listener = threading.Thread(
+                target=self.listen, name="beat-schedule-listener", daemon=True
+            )
+            self._listener.start()
+
+    def listen(self):
+        while True:
+            pubsub = get_redis("beat").pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(schedule_channel())
+                # Changes published while unsubscribed were missed
+                self._notified.set()
+                while True:
+                    if pubsub.get_message(timeout=self.listen_timeout):
+                        self._notified.set()
+            except redis.RedisError as exc:
+                logger.warning("Schedule change listener disconnected: %s", exc)
+                time.sleep(self.retry_seconds)
+            finally:
+                pubsub.close()
+
+    def enabled_models_qs(self):
+        # Everything enabled, not only the tasks due in the parent's window
+        return self.Model.objects.enabled()
+
+    def schedule_changed(self):
+        if self._notified.is_set():
+            self._notified.clear()
+            # Records the change timestamp so the next poll skips this change
+            super().schedule_changed()
+            return True
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return False
+        self._last_poll = now
+        return super().schedule_changed()
+
+    @property
+    def schedule(self):
+        if self._initial_read:
+            self._initial_read = False
+            # Remember the change timestamp, then load at least that state
+            super().schedule_changed()
+            self._schedule = self.all_as_schedule()
+        elif self.schedule_changed():
+            logger.info("Schedule changed, reloading")
+            self.sync()
+            self._schedule = self.all_as_schedule()
+            # tick() rebuilds it from the new entries
+            self._heap = None
+        return self._schedule
+
+    def schedules_equal(self, *args, **kwargs):
+        # The schedule only changes on reload, which drops the heap; no need
+        # to compare every entry on every tick
+        return self._heap is not None
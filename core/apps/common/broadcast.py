@@ -0,0 +1,55 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Opt-in group for periodic and global broadcasts only; task progress goes to
+# the task's and the triggering user's groups
+GLOBAL_GROUP = "test_group"
+
+
+def task_group(task_id):
+    """Group of the clients subscribed to one task"""
+    return f"task.{task_id}"
+
+
+def user_group(user_id):
+    """Group of one user's sockets, which receives all of their tasks"""
+    return f"user.{user_id}"
+
+
+def dumps(obj):
+    """Serialize to a JSON string, with orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            pass  # e.g. non-str keys, let the stdlib encoder handle it
+    return json.dumps(obj)
+
+
+def encode_frame(message_type, data):
+    """The WebSocket text frame consumers send for a group event"""
+    return dumps({"type": message_type, "data": data})
+
+
+def group_event(handler, data, message_type=None):
+    """
+    Build a channel layer event whose client frame is serialized once here.
+
+    ``handler`` is the consumer method the event dispatches to (e.g.
+    ``"task_update"``). Consumers send ``event["frame"]`` as-is, so a group
+    broadcast costs one encode instead of one per subscriber.
+    """
+    data = {"type": handler, **data}
+    return {"type": handler, "frame": encode_frame(message_type or handler, data)}
+
+
+def event_frame(event, message_type):
+    """Pre-encoded frame of ``event``, encoding it for legacy senders"""
+    frame = event.get("frame")
+    if frame is None:
+        frame = encode_frame(message_type, event)
+    return frame
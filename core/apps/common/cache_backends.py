@@ -0,0 +1,27 @@
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient
+
+from .redis_clients import redis_clients
+
+
+class SharedRedisCacheClient(RedisCacheClient):
+    def __init__(self, servers, consumer="cache", **options):
+        super().__init__(servers, **options)
+        self._consumer = consumer
+
+    def _get_connection_pool(self, write):
+        return redis_clients.pool(self._consumer)
+
+    def get_client(self, key=None, *, write=False):
+        return redis_clients.client(self._consumer)
+
+
+class SharedRedisCache(RedisCache):
+    """
+    Django's Redis cache on the process's shared Redis pools. ``OPTIONS``
+    may name the ``consumer`` (default ``"cache"``) whose db and timeout
+    it uses; ``LOCATION`` is only informational.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._class = SharedRedisCacheClient
@@ -0,0 +1,19 @@
+from channels_redis.core import RedisChannelLayer
+
+from .redis_clients import redis_clients
+
+
+class SharedRedisChannelLayer(RedisChannelLayer):
+    """
+    RedisChannelLayer drawing its connections from the process's shared
+    Redis pools (apps.common.redis_clients) as the ``consumer`` it is
+    configured with. Only a single Redis host is supported.
+    """
+
+    def __init__(self, consumer="channels", **kwargs):
+        kwargs.setdefault("prefix", redis_clients.prefix(consumer) or "asgi")
+        super().__init__(**kwargs)
+        self.consumer = consumer
+
+    def create_pool(self, index):
+        return redis_clients.async_pool(self.consumer)
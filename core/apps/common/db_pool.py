@@ -0,0 +1,17 @@
+from django.db import connections
+
+
+def pool_stats():
+    """
+    Counters of each database connection pool in this process, keyed by alias.
+
+    See psycopg_pool's ``ConnectionPool.get_stats()`` for the fields, e.g.
+    ``pool_size``, ``pool_available``, ``requests_waiting`` and
+    ``requests_wait_ms``. Aliases without pooling are left out.
+    """
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
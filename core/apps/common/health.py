@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .db_pool import pool_stats
+from .redis_clients import get_redis, redis_pool_stats
+
+logger = logging.getLogger(__name__)
+
+
+class Probe:
+    """
+    One dependency check, always run on the same dedicated daemon thread.
+
+    The thread keeps the probe's connections (a DB connection, an event loop
+    for the channel layer) between rounds. A probe still running from an
+    earlier round is reported as timed out instead of being started again,
+    so a hung dependency never piles up threads or blocks shutdown.
+    """
+
+    def __init__(self, name, check):
+        self.name = name
+        self.check = check
+        self.started = None
+        self._result = None
+        self._thread = None
+        self._requested = threading.Event()
+        self._done = threading.Event()
+        self._done.set()
+
+    def submit(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self.run, name=f"health-{self.name}", daemon=True
+            )
+            self._thread.start()
+        if self._done.is_set():
+            self._done.clear()
+            self.started = time.monotonic()
+            self._requested.set()
+
+    def run(self):
+        while True:
+            self._requested.wait()
+            self._requested.clear()
+            self._result = self.timed_check()
+            self._done.set()
+
+    def timed_check(self):
+        start = time.perf_counter()
+        try:
+            details = self.check() or {}
+            status = details.pop("status", "ok")
+        except Exception as exc:
+            details = {"error": f"{type(exc).__name__}: {exc}"}
+            status = "error"
+        latency = (time.perf_counter() - start) * 1000
+        return {"status": status, "latency_ms": round(latency, 2), **details}
+
+    def result(self, timeout):
+        if self._done.wait(timeout):
+            return self._result
+        elapsed = (time.monotonic() - self.started) * 1000
+        return {"status": "timeout", "latency_ms": round(elapsed, 2)}
+
+
+class HealthMonitor:
+    """
+    Readiness state refreshed by a background thread every ``interval`` seconds.
+
+    Requests read the last snapshot, so polling costs a dictionary read and
+    never adds load to the dependencies being checked. A snapshot older than
+    ``max_age`` means the refresher itself is stuck and is reported as such.
+    """
+
+    # Checks whose failure makes the process unable to serve requests;
+    # a queue backlog only degrades it
+    critical = ("database", "redis", "channel_layer", "broker")
+
+    def __init__(self, interval=10.0, timeout=2.0, queue_depth_limit=1000):
+        self.interval = interval
+        self.timeout = timeout
+        self.queue_depth_limit = queue_depth_limit
+        self.max_age = interval * 3 + timeout
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._snapshot = None
+        self._loop = None
+        self.probes = [
+            Probe("database", self.check_database),
+            Probe("redis", self.check_redis),
+            Probe("channel_layer", self.check_channel_layer),
+            Probe("broker", self.check_broker),
+            Probe("queues", self.check_queues),
+        ]
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self.run, name="health-monitor", daemon=True
+                    )
+                    self._thread.start()
+
+    def snapshot(self):
+        """The latest results, waiting for the first round after startup"""
+        self.start()
+        self._ready.wait(self.timeout + 1)
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"status": "unavailable", "error": "No health data yet"}
+
+        age = time.time() - snapshot["checked_at"]
+        snapshot = {**snapshot, "age": round(age, 2)}
+        if age > self.max_age:
+            snapshot["status"] = "unavailable"
+            snapshot["error"] = "Health data is stale"
+        return snapshot
+
+    def run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Health check round failed")
+            time.sleep(self.interval)
+
+    def refresh(self):
+        deadline = time.monotonic() + self.timeout
+        for probe in self.probes:
+            probe.submit()
+        checks = {
+            probe.name: probe.result(max(deadline - time.monotonic(), 0))
+            for probe in self.probes
+        }
+
+        status = "ready"
+        if any(checks[name]["status"] != "ok" for name in self.critical):
+            status = "unavailable"
+        elif checks["queues"]["status"] != "ok":
+            status = "degraded"
+
+        self._snapshot = {
+            "status": status,
+            "checked_at": time.time(),
+            "checks": checks,
+        }
+        self._ready.set()
+
+    # Probes, each on its own thread
+
+    def check_database(self):
+        # Replace a connection the server dropped since the last round
+        close_old_connections()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+        finally:
+            # Hand a pooled connection back between rounds
+            close_old_connections()
+        pool = pool_stats().get(connection.alias)
+        return {"pool": pool} if pool is not None else None
+
+    def check_redis(self):
+        # Through the shared pools, so a saturated pool shows up here too
+        get_redis().ping()
+        return {"pools": redis_pool_stats()}
+
+    def check_channel_layer(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(
+            asyncio.wait_for(self.channel_layer_round_trip(), self.timeout)
+        )
+
+    async def channel_layer_round_trip(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.send(channel, {"type": "health.ping"})
+        await layer.receive(channel)
+
+    def check_broker(self):
+        from core.celery import app
+
+        with app.connection_for_read() as conn:
+            conn.ensure_connection(
+                max_retries=1, interval_start=0, timeout=self.timeout
+            )
+
+    def check_queues(self):
+        from core.celery import app
+
+        names = sorted({*app.amqp.queues, app.conf.task_default_queue})
+        depth = {}
+        with app.connection_for_read() as conn:
+            conn.ensure_connection(
+                max_retries=1, interval_start=0, timeout=self.timeout
+            )
+            channel = conn.default_channel
+            for name in names:
+                try:
+                    depth[name] = channel.queue_declare(
+                        name, passive=True
+                    ).message_count
+                except conn.channel_errors:
+                    # Not declared yet, nothing was ever published to it
+                    channel = conn.channel()
+                    depth[name] = 0
+
+        backlog = any(count > self.queue_depth_limit for count in depth.values())
+        return {"status": "backlog" if backlog else "ok", "depth": depth}
+
+
+_monitor = None
+
+
+def get_health_monitor():
+    global _monitor
+    if _monitor is None:
+        _monitor = HealthMonitor(
+            interval=settings.HEALTH_CHECK_INTERVAL,
+            timeout=settings.HEALTH_CHECK_TIMEOUT,
+            queue_depth_limit=settings.HEALTH_QUEUE_DEPTH_LIMIT,
+        )
+    return _monitor
+
+
+def _reset_after_fork():
+    # Probe threads do not survive fork(); children start their own
+    if _monitor is not None:
+        _monitor._reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
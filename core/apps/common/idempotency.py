@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyError(Exception):
+    """The key cannot be used for this request; ``status`` is the HTTP answer"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class IdempotencyStore:
+    """
+    Responses of requests sent with an ``Idempotency-Key``, per owner, so a
+    retried request gets the first response instead of repeating its side
+    effects.
+
+    claim() reserves a key atomically (cache.add) before the work starts,
+    so a retry racing the original is refused rather than run twice. The
+    reservation lapses after ``pending_timeout`` seconds if the process
+    dies before complete() or release(). A key reused with a different
+    request body is refused.
+    """
+
+    key_prefix = "idempotency:"
+    pending_timeout = 60
+
+    @property
+    def cache(self):
+        return caches[settings.IDEMPOTENCY_CACHE_ALIAS]
+
+    def cache_key(self, owner, key):
+        return self.key_prefix + hashlib.sha256(f"{owner}:{key}".encode()).hexdigest()
+
+    def claim(self, owner, key, request_data):
+        """The stored response of an earlier identical request, or None once reserved"""
+        cache_key = self.cache_key(owner, key)
+        entry = {"fingerprint": fingerprint(request_data), "response": None}
+        try:
+            if self.cache.add(cache_key, entry, self.pending_timeout):
+                return None
+            stored = self.cache.get(cache_key)
+        except Exception:
+            logger.warning("Idempotency store unavailable", exc_info=True)
+            raise IdempotencyError(503, "Idempotency keys are unavailable")
+
+        if stored is not None and stored["fingerprint"] != entry["fingerprint"]:
+            raise IdempotencyError(
+                422, "Idempotency-Key was already used for a different request"
+            )
+        # Gone since add() means the first request just released it
+        if stored is None or stored["response"] is None:
+            raise IdempotencyError(
+                409, "A request with this Idempotency-Key is in progress"
+            )
+        return stored["response"]
+
+    def complete(self, owner, key, request_data, response):
+        entry = {"fingerprint": fingerprint(request_data), "response": response}
+        try:
+            self.cache.set(
+                self.cache_key(owner, key), entry, settings.IDEMPOTENCY_KEY_TTL
+            )
+        except Exception:
+            logger.warning("Failed to store idempotent response", exc_info=True)
+
+    def release(self, owner, key):
+        """Free a claimed key whose request failed, so it can be retried"""
+        try:
+            self.cache.delete(self.cache_key(owner, key))
+        except Exception:
+            logger.warning("Failed to release idempotency key", exc_info=True)
+
+
+def fingerprint(data):
+    content = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,172 @@
+import contextvars
+import datetime
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+from .metrics import Histogram
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to respond to an HTTP request, by URL pattern",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    "http_request_queries",
+    "Database queries made while handling an HTTP request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100),
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Database query execution time",
+    ["alias"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+CELERY_TASK_SECONDS = Histogram(
+    "celery_task_runtime_seconds",
+    "Celery task execution time",
+    ["task", "queue", "state"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+CELERY_TASK_QUEUE_WAIT_SECONDS = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time between publishing a Celery task (or its ETA) and a worker starting it",
+    ["task", "queue", "tier"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0),
+)
+
+# Query counter of the request being handled; sync_to_async copies the
+# context, so queries the ORM runs in executor threads are counted too
+_request_queries = contextvars.ContextVar("request_queries", default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        DB_QUERY_SECONDS.observe(
+            time.perf_counter() - start, alias=context["connection"].alias
+        )
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+
+
+def instrument_connection(sender, connection, **kwargs):
+    # Innermost, so connection.execute_wrapper() blocks still pop their own
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_query)
+
+
+def install_db_instrumentation():
+    """Time every query of this thread's open connections and all new ones"""
+    connection_created.connect(instrument_connection, dispatch_uid="time_query")
+    for connection in connections.all(initialized_only=True):
+        instrument_connection(None, connection)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Request latency and query count per URL pattern; list it first"""
+    if not settings.METRICS_ENABLED:
+        raise MiddlewareNotUsed
+    install_db_instrumentation()
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            start = time.perf_counter()
+            queries = [0]
+            token = _request_queries.set(queries)
+            try:
+                response = await get_response(request)
+            finally:
+                _request_queries.reset(token)
+            observe_request(request, response, start, queries[0])
+            return response
+
+    else:
+
+        def middleware(request):
+            start = time.perf_counter()
+            queries = [0]
+            token = _request_queries.set(queries)
+            try:
+                response = get_response(request)
+            finally:
+                _request_queries.reset(token)
+            observe_request(request, response, start, queries[0])
+            return response
+
+    return middleware
+
+
+def observe_request(request, response, start, queries):
+    match = request.resolver_match
+    # The pattern, not the path, keeps the label set bounded
+    route = f"/{match.route}" if match is not None else "<unmatched>"
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route,
+        status=response.status_code,
+    )
+    HTTP_REQUEST_QUERIES.observe(queries, method=request.method, route=route)
+
+
+# Celery, wired up through signal receivers in core.celery
+
+_task_started = {}
+
+
+def stamp_published(headers):
+    headers["published_at"] = time.time()
+
+
+def task_queue(task):
+    return (task.request.delivery_info or {}).get("routing_key") or ""
+
+
+def task_tier(task):
+    from .task_routing import task_routes
+
+    priority = (task.request.delivery_info or {}).get("priority")
+    return task_routes.tier_of(priority)
+
+
+def task_started(task_id, task):
+    _task_started[task_id] = time.perf_counter()
+    published = getattr(task.request, "published_at", None)
+    if published is None:
+        return
+    ready = published
+    eta = task.request.eta
+    if isinstance(eta, str):
+        eta = datetime.datetime.fromisoformat(eta)
+    if eta:
+        ready = max(ready, eta.timestamp())
+    CELERY_TASK_QUEUE_WAIT_SECONDS.observe(
+        max(time.time() - ready, 0),
+        task=task.name,
+        queue=task_queue(task),
+        tier=task_tier(task),
+    )
+
+
+def task_finished(task_id, task, state):
+    start = _task_started.pop(task_id, None)
+    if start is None:
+        return
+    CELERY_TASK_SECONDS.observe(
+        time.perf_counter() - start,
+        task=task.name,
+        queue=task_queue(task),
+        state=state or "UNKNOWN",
+    )
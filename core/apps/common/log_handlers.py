@@ -0,0 +1,184 @@
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+import weakref
+
+from django_db_logger.config import DJANGO_DB_LOGGER_ENABLE_FORMATTER
+from django_db_logger.db_log_handler import DatabaseLogHandler, db_default_formatter
+
+# Every live handler, so shutdown hooks can flush them all
+_handlers = weakref.WeakSet()
+
+
+class QueuedDatabaseLogHandler(DatabaseLogHandler):
+    """
+    Drop-in replacement for django_db_logger's DatabaseLogHandler.
+
+    emit() only formats the record and puts it on a bounded queue; a
+    background thread (a greenlet under gevent) writes batches with
+    bulk_create once ``batch_size`` records are waiting or
+    ``flush_interval`` seconds have passed. Records that arrive while the
+    queue is full are counted in ``dropped`` instead of blocking the caller.
+    Rows are stamped when the batch is written, so ``create_datetime`` can
+    trail the log call by up to ``flush_interval``.
+    """
+
+    def __init__(
+        self,
+        level=logging.NOTSET,
+        max_queue_size=10000,
+        batch_size=500,
+        flush_interval=1.0,
+    ):
+        super().__init__(level)
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._reset()
+        _handlers.add(self)
+
+    def _reset(self):
+        """(Re)create per-process state; also called in forked children"""
+        self.queue = queue.Queue(maxsize=self.max_queue_size)
+        self.written = 0
+        self.dropped = 0
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closed = False
+
+    def emit(self, record):
+        if self._closed:
+            return
+        try:
+            entry = self._to_kwargs(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        self._ensure_writer()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self._count(dropped=1)
+
+    def _count(self, written=0, dropped=0):
+        # emit() runs on every logging thread, _write() on the writer too
+        self.acquire()
+        try:
+            self.written += written
+            self.dropped += dropped
+        finally:
+            self.release()
+
+    def _to_kwargs(self, record):
+        trace = None
+        if record.exc_info:
+            trace = db_default_formatter.formatException(record.exc_info)
+
+        if DJANGO_DB_LOGGER_ENABLE_FORMATTER:
+            msg = self.format(record)
+        else:
+            msg = record.getMessage()
+
+        return {
+            "logger_name": record.name,
+            "level": record.levelno,
+            "msg": msg,
+            "trace": trace,
+        }
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._run, name="db-log-writer", daemon=True
+                )
+                self._writer.start()
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while not self._closed:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+            # Give a pooled connection back while idle between batches
+            close_old_connections()
+
+    def _write(self, batch):
+        from django.apps import apps
+        from django.conf import settings
+        from django.db import close_old_connections
+
+        Model = apps.get_model(settings.DB_LOG_MODEL)
+
+        with self._write_lock:
+            try:
+                close_old_connections()
+                Model.objects.bulk_create(
+                    [Model(**entry) for entry in batch],
+                    batch_size=self.batch_size,
+                )
+                self._count(written=len(batch))
+            except Exception:
+                self._count(dropped=len(batch))
+                if logging.raiseExceptions:
+                    sys.stderr.write(
+                        f"--- Dropped {len(batch)} database log records ---\n"
+                    )
+                    traceback.print_exc(file=sys.stderr)
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        # logging.shutdown() calls this at interpreter exit: let the writer
+        # finish its current batch, then drain whatever is left
+        self._closed = True
+        if self._writer is not None and self._writer is not threading.current_thread():
+            self._writer.join(timeout=self.flush_interval + 5)
+        self.flush()
+        super().close()
+
+
+def flush_all():
+    """Flush every queued handler, e.g. before a worker process exits"""
+    for handler in list(_handlers):
+        handler.flush()
+
+
+def _reset_after_fork():
+    for handler in list(_handlers):
+        handler._reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
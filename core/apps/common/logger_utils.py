@@ -1,5 +1,11 @@
+import asyncio
 import logging
+import sys
+import traceback
+import weakref
+from collections import deque
 from channels.db import database_sync_to_async
+from django.conf import settings
 
 
 # Create a WebSocket-safe logger that only uses console handlers
@@ -51,26 +57,152 @@ def log_warning_to_db(message):
     db_logger.warning(message)
 
 
-# Convenience functions that log to console immediately and database asynchronously
+class AsyncLogSink:
+    """
+    Event-loop-local buffer of database log entries.
+
+    submit() returns immediately; a single background task bulk-inserts the
+    buffer once ``batch_size`` entries are waiting or every
+    ``flush_interval`` seconds, with one thread hop per batch. When the
+    buffer holds ``max_size`` entries the drop policy applies:
+    ``drop_newest`` discards the incoming entry, ``drop_oldest`` evicts the
+    oldest one, and ``block`` makes awaiting callers wait for the flusher.
+    """
+
+    DROP_NEWEST = "drop_newest"
+    DROP_OLDEST = "drop_oldest"
+    BLOCK = "block"
+
+    def __init__(
+        self, max_size=10000, batch_size=200, flush_interval=1.0, policy=DROP_NEWEST
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.buffer = deque()
+        self.written = 0
+        self.dropped = 0
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._task = None
+
+    def submit(self, level, message, exc_info=None):
+        """Queue an entry for the "db" logger; never waits"""
+        db_logger = logging.getLogger("db")
+        if not db_logger.isEnabledFor(level):
+            return
+        trace = "".join(traceback.format_exception(*exc_info)) if exc_info else None
+        entry = {"logger_name": "db", "level": level, "msg": message, "trace": trace}
+
+        if len(self.buffer) >= self.max_size:
+            if self.policy == self.DROP_OLDEST:
+                self.buffer.popleft()
+                self.dropped += 1
+            elif self.policy == self.DROP_NEWEST:
+                self.dropped += 1
+                return
+        self.buffer.append(entry)
+
+        self._ensure_task()
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def wait_for_capacity(self):
+        """Backpressure for the ``block`` policy: wait until the buffer has room"""
+        while self.policy == self.BLOCK and len(self.buffer) >= self.max_size:
+            self._drained.clear()
+            self._wakeup.set()
+            await self._drained.wait()
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            # Loop shutting down: one last attempt to persist the buffer
+            await self.flush()
+            raise
+
+    async def flush(self):
+        while self.buffer:
+            count = min(len(self.buffer), self.batch_size)
+            batch = [self.buffer.popleft() for _ in range(count)]
+            self._drained.set()
+            try:
+                await self._write(batch)
+                self.written += len(batch)
+            except Exception:
+                self.dropped += len(batch)
+                websocket_logger.exception(
+                    f"Dropped {len(batch)} WebSocket log entries"
+                )
+
+    @staticmethod
+    @database_sync_to_async
+    def _write(batch):
+        from django.apps import apps
+        from django.conf import settings
+
+        Model = apps.get_model(settings.DB_LOG_MODEL)
+        Model.objects.bulk_create([Model(**entry) for entry in batch])
+
+
+_sinks = weakref.WeakKeyDictionary()
+
+
+def get_log_sink():
+    """Return the AsyncLogSink of the running event loop"""
+    loop = asyncio.get_running_loop()
+    sink = _sinks.get(loop)
+    if sink is None:
+        sink = AsyncLogSink(
+            max_size=settings.WS_LOG_BUFFER_SIZE,
+            batch_size=settings.WS_LOG_BATCH_SIZE,
+            flush_interval=settings.WS_LOG_FLUSH_INTERVAL,
+            policy=settings.WS_LOG_DROP_POLICY,
+        )
+        _sinks[loop] = sink
+    return sink
+
+
+async def _submit(level, message, exc_info=None):
+    sink = get_log_sink()
+    await sink.wait_for_capacity()
+    sink.submit(level, message, exc_info)
+
+
+# Convenience functions that log to console immediately and buffer database writes
 async def async_log_info(message):
-    """Log info message to console immediately and database asynchronously"""
+    """Log info message to console immediately and database in the background"""
     websocket_logger.info(message)
-    await log_info_to_db(message)
+    await _submit(logging.INFO, message)
 
 
 async def async_log_error(message):
-    """Log error message to console immediately and database asynchronously"""
+    """Log error message to console immediately and database in the background"""
     websocket_logger.error(message)
-    await log_error_to_db(message)
+    await _submit(logging.ERROR, message)
 
 
 async def async_log_exception(message, exc_info=True):
-    """Log exception to console immediately and database asynchronously"""
+    """Log exception to console immediately and database in the background"""
     websocket_logger.exception(message, exc_info=exc_info)
-    await log_exception_to_db(message, exc_info=exc_info)
+    if exc_info is True:
+        exc_info = sys.exc_info()
+    await _submit(logging.ERROR, message, exc_info if exc_info else None)
 
 
 async def async_log_warning(message):
-    """Log warning message to console immediately and database asynchronously"""
+    """Log warning message to console immediately and database in the background"""
     websocket_logger.warning(message)
-    await log_warning_to_db(message)
+    await _submit(logging.WARNING, message)
@@ -0,0 +1,346 @@
+import atexit
+import bisect
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        registry.add(self, self.key(labels), amount)
+
+
+class Gauge(Metric):
+    """A per-process value; the rendered value is the sum over live processes"""
+
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        registry.move(self, self.key(labels), amount)
+
+    def dec(self, amount=1, **labels):
+        registry.move(self, self.key(labels), -amount)
+
+    def set(self, value, **labels):
+        registry.put(self, self.key(labels), value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        registry.observe(self, self.key(labels), value)
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process, accumulated in memory and merged into Redis by
+    a background thread (a greenlet under gevent) every flush interval.
+
+    Recording a sample is a dictionary update under a lock. Counters and
+    histograms are flushed as increments, so Redis holds the totals of every
+    process and container; gauges are written per process, expire when a
+    process stops reporting and are summed when rendered. Samples recorded
+    while Redis is unreachable are dropped.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._reset()
+
+    def _reset(self):
+        """(Re)create per-process state; also called in forked children"""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self.instance = f"{socket.gethostname()}:{os.getpid()}"
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self.metrics[metric.name] = metric
+
+    @property
+    def enabled(self):
+        return settings.METRICS_ENABLED
+
+    @property
+    def interval(self):
+        return settings.METRICS_FLUSH_INTERVAL
+
+    # Recording
+
+    def add(self, metric, key, amount):
+        if not self.enabled:
+            return
+        self.start()
+        with self._lock:
+            self._counters[metric, key] = self._counters.get((metric, key), 0) + amount
+
+    def move(self, metric, key, amount):
+        if not self.enabled:
+            return
+        self.start()
+        with self._lock:
+            self._gauges[metric, key] = self._gauges.get((metric, key), 0) + amount
+
+    def put(self, metric, key, value):
+        if not self.enabled:
+            return
+        self.start()
+        with self._lock:
+            self._gauges[metric, key] = value
+
+    def observe(self, metric, key, value):
+        if not self.enabled:
+            return
+        self.start()
+        index = bisect.bisect_left(metric.buckets, value)
+        with self._lock:
+            entry = self._histograms.get((metric, key))
+            if entry is None:
+                entry = self._histograms[metric, key] = [[0] * len(metric.buckets), 0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    # Flushing
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.run, name="metrics-flusher", daemon=True
+                )
+                self._thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Metrics flush failed")
+
+    def key(self, name):
+        from .redis_clients import redis_clients
+
+        return redis_clients.prefix("metrics") + name
+
+    def client(self):
+        from .redis_clients import get_redis
+
+        return get_redis("metrics")
+
+    @property
+    def gauge_ttl(self):
+        # Gauges of a process that missed a few flushes no longer count
+        return max(int(self.interval * 3), 10)
+
+    def flush(self):
+        """Merge what this process recorded since the last flush into Redis"""
+        with self._flush_lock:
+            with self._lock:
+                counters, self._counters = self._counters, {}
+                histograms, self._histograms = self._histograms, {}
+                gauges = dict(self._gauges)
+            if not (counters or histograms or gauges):
+                return
+
+            samples = self.key("samples")
+            pipe = self.client().pipeline(transaction=False)
+            for (metric, key), amount in counters.items():
+                pipe.hincrbyfloat(samples, field(metric, "", key), amount)
+            for (metric, key), (counts, total) in histograms.items():
+                cumulative = 0
+                for bound, count in zip(metric.buckets, counts):
+                    cumulative += count
+                    pipe.hincrbyfloat(
+                        samples, field(metric, "_bucket", key, bound), cumulative
+                    )
+                pipe.hincrbyfloat(samples, field(metric, "_sum", key), total)
+                pipe.hincrbyfloat(samples, field(metric, "_count", key), cumulative)
+            if gauges:
+                instance = self.key(f"gauges:{self.instance}")
+                pipe.delete(instance)
+                pipe.hset(
+                    instance,
+                    mapping={
+                        field(metric, "", key): value
+                        for (metric, key), value in gauges.items()
+                    },
+                )
+                pipe.expire(instance, self.gauge_ttl)
+                pipe.zadd(self.key("instances"), {self.instance: time.time()})
+            pipe.hset(
+                self.key("families"),
+                mapping={
+                    metric.name: json.dumps([metric.kind, metric.documentation])
+                    for metric in self.metrics.values()
+                },
+            )
+            try:
+                pipe.execute()
+            except redis.RedisError as exc:
+                logger.warning("Dropped metrics, Redis unavailable: %s", exc)
+
+    # Rendering
+
+    def collect(self):
+        """{family: (kind, documentation, [(name, labels, value), ...])}"""
+        client = self.client()
+        families = client.hgetall(self.key("families"))
+        samples = client.hgetall(self.key("samples"))
+
+        instances = self.key("instances")
+        client.zremrangebyscore(instances, "-inf", time.time() - self.gauge_ttl)
+        pipe = client.pipeline(transaction=False)
+        for instance in client.zrange(instances, 0, -1):
+            pipe.hgetall(self.key(f"gauges:{instance.decode()}"))
+        gauges = {}
+        for values in pipe.execute():
+            for name, value in values.items():
+                gauges[name] = gauges.get(name, 0) + float(value)
+
+        collected = {}
+        for name, meta in families.items():
+            kind, documentation = json.loads(meta)
+            collected[name.decode()] = (kind, documentation, [])
+        for encoded, value in [*samples.items(), *gauges.items()]:
+            family, suffix, labels = json.loads(encoded)
+            if family in collected:
+                collected[family][2].append((suffix, labels, float(value)))
+        return collected
+
+    def render(self):
+        """Every process's metrics in the Prometheus text format (0.0.4)"""
+        lines = []
+        for family, (kind, documentation, samples) in sorted(self.collect().items()):
+            if not samples:
+                continue
+            name = f"{family}_total" if kind == "counter" else family
+            lines.append(f"# HELP {name} {escape(documentation, help=True)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in sorted(samples, key=sample_order):
+                if kind == "counter":
+                    suffix = "_total"
+                lines.append(
+                    f"{family}{suffix}{format_labels(labels)} {format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def field(metric, suffix, key, le=None):
+    labels = list(zip(metric.labelnames, key))
+    if le is not None:
+        labels.append(("le", format_value(le)))
+    return json.dumps([metric.name, suffix, labels], separators=(",", ":"))
+
+
+SUFFIX_ORDER = {"": 0, "_bucket": 1, "_sum": 2, "_count": 3}
+
+
+def sample_order(sample):
+    suffix, labels, _ = sample
+    le = math.inf
+    plain = []
+    for name, value in labels:
+        if name == "le":
+            le = float(value)
+        else:
+            plain.append((name, value))
+    return plain, SUFFIX_ORDER.get(suffix, 0), le
+
+
+def escape(value, help=False):
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value if help else value.replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, aggregated across every process"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse(status=401)
+
+    # Include this process's latest samples
+    registry.flush()
+    try:
+        body = registry.render()
+    except redis.RedisError:
+        logger.warning("Metrics store unavailable", exc_info=True)
+        return HttpResponse("Metrics store unavailable\n", status=503)
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def flush_metrics():
+    """Flush this process's metrics, e.g. before a worker process exits"""
+    if registry.enabled:
+        registry.flush()
+
+
+def _reset_after_fork():
+    # The flusher thread does not survive fork(), and samples recorded by the
+    # parent must not be flushed twice
+    registry._reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(flush_metrics)
@@ -0,0 +1,81 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_count(queryset):
+    """The planner's row estimate for ``queryset`` on PostgreSQL, else None"""
+    if connections[queryset.db].vendor != "postgresql":
+        return None
+    try:
+        plan = json.loads(queryset.order_by().explain(format="json"))
+    except DatabaseError:
+        logger.warning("Row estimate unavailable, counting", exc_info=True)
+        return None
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the row count from the query plan instead of
+    running COUNT(*), which reads every matching row.
+
+    The estimate is EXPLAIN of the filtered queryset, so it follows the
+    table statistics (refreshed by autovacuum): close for a whole table,
+    rougher under filters. Below ``ADMIN_EXACT_COUNT_BELOW`` estimated rows
+    a real count is cheap and is used instead, as it is on databases other
+    than PostgreSQL.
+
+    With an estimate, each page is read with one extra row (LIMIT per page
+    + 1). A short read pins the count to the real end; a full read extends
+    it past the page, so rows beyond an underestimate stay reachable one
+    page at a time. Pages past the real end of an overestimate are empty,
+    and the total the changelist shows is the estimate, taken before the
+    page is read.
+    """
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < settings.ADMIN_EXACT_COUNT_BELOW:
+            return self.object_list.count()
+        self.estimated = True
+        return estimate
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Past the estimated end; page() probes whether rows are there
+            if not self.estimated or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.estimated:
+            return super().page(number)
+
+        bottom = (number - 1) * self.per_page
+        last = self.per_page + self.orphans
+        rows = list(self.object_list[bottom : bottom + last + 1])
+        if len(rows) > last:
+            rows = rows[: self.per_page]
+            self.set_count(max(self.count, bottom + last + 1))
+        elif rows:
+            self.set_count(bottom + len(rows))
+        elif number > self.num_pages:
+            raise EmptyPage(self.error_messages["no_results"])
+        return self._get_page(rows, number, self)
+
+    def set_count(self, count):
+        self.__dict__["count"] = count
+        self.__dict__.pop("num_pages", None)
@@ -0,0 +1,229 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+
+from celery import current_app
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .broadcast import group_event
+
+logger = logging.getLogger(__name__)
+
+# Result backend state of a running task that reported progress
+PROGRESS = "PROGRESS"
+
+
+class ProgressPublisher:
+    """
+    Process-wide publisher of task progress events to channel layer groups.
+
+    One event loop runs in a background thread (a greenlet under gevent)
+    for the life of the worker process, so the channel layer keeps a single
+    Redis connection pool instead of async_to_sync building loop machinery
+    per update. Non-terminal updates are coalesced per task: at most one is
+    sent every ``interval`` seconds and a newer update replaces an unsent
+    one. Terminal updates skip the throttle and block until delivered.
+    Throttle state of tasks that never sent a terminal update (crashed,
+    killed or revoked) is dropped every ``expire_interval`` seconds.
+    """
+
+    expire_interval = 60.0
+
+    def __init__(self, interval=0.5, timeout=5.0):
+        self.interval = interval
+        self.timeout = timeout
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._last_sent = {}
+        self._pending = {}
+        self._inflight = {}
+
+    @property
+    def loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(
+                        target=loop.run_forever, name="progress-publisher", daemon=True
+                    )
+                    self._thread.start()
+                    self._loop = loop
+                    loop.call_soon_threadsafe(self._expire)
+        return self._loop
+
+    def update(self, group, key, event):
+        """Queue a throttled update; ``key`` identifies the task being reported"""
+        self.loop.call_soon_threadsafe(self._offer, group, key, event)
+
+    def send(self, group, event, key=None):
+        """Send now and wait for delivery, dropping any pending update for ``key``"""
+        future = asyncio.run_coroutine_threadsafe(
+            self._send_final(group, key, event), self.loop
+        )
+        try:
+            future.result(self.timeout)
+        except Exception:
+            logger.exception("Failed to publish event to %s", group)
+
+    def close(self):
+        """Deliver pending updates and stop the loop"""
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._flush_all(), self._loop)
+        try:
+            future.result(self.timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._reset()
+
+    # Everything below runs on the publisher loop
+
+    def _offer(self, group, key, event):
+        now = self._loop.time()
+        last = self._last_sent.get(key)
+        if last is None or now - last >= self.interval:
+            self._last_sent[key] = now
+            self._start_send(key, group, event)
+            return
+
+        if key not in self._pending:
+            self._loop.call_at(last + self.interval, self._flush_key, key)
+        self._pending[key] = (group, event)
+
+    def _expire(self):
+        # A send older than the interval no longer throttles anything, so
+        # forgetting it changes nothing; pending keys are flushed by timer
+        now = self._loop.time()
+        self._last_sent = {
+            key: last
+            for key, last in self._last_sent.items()
+            if now - last < self.interval or key in self._pending
+        }
+        self._loop.call_later(self.expire_interval, self._expire)
+
+    def _flush_key(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            self._last_sent[key] = self._loop.time()
+            self._start_send(key, *pending)
+
+    def _start_send(self, key, group, event):
+        task = self._loop.create_task(self._send(group, event))
+        self._inflight[key] = task
+        task.add_done_callback(functools.partial(self._clear_inflight, key))
+
+    def _clear_inflight(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _send_final(self, group, key, event):
+        self._pending.pop(key, None)
+        self._last_sent.pop(key, None)
+        inflight = self._inflight.pop(key, None)
+        if inflight is not None:
+            # Keep the terminal event after the last progress update
+            await inflight
+        await get_channel_layer().group_send(group, event)
+
+    async def _flush_all(self):
+        pending, self._pending = self._pending, {}
+        await asyncio.gather(
+            *(self._send(group, event) for group, event in pending.values())
+        )
+
+    async def _send(self, group, event):
+        try:
+            await get_channel_layer().group_send(group, event)
+        except Exception:
+            logger.exception("Failed to publish progress to %s", group)
+
+
+_publisher = None
+
+
+def get_progress_publisher():
+    global _publisher
+    if _publisher is None:
+        _publisher = ProgressPublisher(
+            interval=settings.TASK_PROGRESS_INTERVAL,
+            timeout=settings.TASK_PROGRESS_TIMEOUT,
+        )
+    return _publisher
+
+
+def close_progress_publisher():
+    if _publisher is not None:
+        _publisher.close()
+
+
+def _reset_after_fork():
+    # The loop thread does not survive fork(); children start their own
+    if _publisher is not None:
+        _publisher._reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class TaskProgress:
+    """
+    Progress reporting for one task run, sent as ``task_update`` events to
+    each of ``groups`` (a group name or a list of them).
+
+    update() is throttled and may be coalesced; completed(), failed() and
+    cancelled() are always delivered before they return. Updates are also stored as the
+    task's PROGRESS state in the result backend, at most once per publisher
+    interval, for clients polling the task status API.
+    """
+
+    def __init__(self, groups, task_id):
+        self.groups = [groups] if isinstance(groups, str) else list(groups)
+        self.task_id = task_id
+        self.publisher = get_progress_publisher()
+        self._stored_at = None
+
+    def event(self, **data):
+        return group_event("task_update", {**data, "task_id": self.task_id})
+
+    def update(self, **data):
+        event = self.event(**data)
+        for group in self.groups:
+            self.publisher.update(group, (group, self.task_id), event)
+        self.store(data)
+
+    def store(self, data):
+        now = time.monotonic()
+        if (
+            self._stored_at is not None
+            and now - self._stored_at < self.publisher.interval
+        ):
+            return
+        self._stored_at = now
+        try:
+            current_app.backend.store_result(self.task_id, data, PROGRESS)
+        except Exception:
+            logger.warning(
+                "Failed to store progress of %s", self.task_id, exc_info=True
+            )
+
+    def completed(self, **data):
+        self.send(self.event(**data, status="completed"))
+
+    def failed(self, **data):
+        self.send(self.event(**data, status="failed"))
+
+    def cancelled(self, **data):
+        self.send(self.event(**data, status="cancelled"))
+
+    def send(self, event):
+        for group in self.groups:
+            self.publisher.send(group, event, key=(group, self.task_id))
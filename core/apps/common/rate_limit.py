@@ -0,0 +1,429 @@
+import contextvars
+import functools
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+from ninja.throttling import BaseThrottle
+
+from .metrics import Counter
+from .redis_clients import get_async_redis, get_redis, redis_clients
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DECISIONS = Counter(
+    "rate_limit_decisions",
+    "Rate limit checks by scope, result (allowed, limited) and where they "
+    "were decided (local, redis, fallback)",
+    ["scope", "result", "source"],
+)
+
+# Token bucket refilled continuously from the Redis clock. Takes nothing
+# unless ARGV[4] tokens (the request's cost) are available, then up to
+# ARGV[3] (a lease), so a process can admit several requests from one round
+# trip; the bucket is debited either way, so leases never let a key past its
+# limit. Returns {granted, tokens left, seconds until the cost is available
+# when nothing was granted}.
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local granted = 0
+if tokens >= cost then
+    granted = math.min(wanted, math.floor(tokens))
+end
+tokens = tokens - granted
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", string.format("%.6f", now))
+redis.call("PEXPIRE", KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+
+local retry_after = 0
+if granted == 0 then
+    retry_after = (cost - tokens) / rate
+end
+return {granted, tostring(tokens), tostring(retry_after)}
+"""
+TOKEN_BUCKET_SHA = hashlib.sha1(TOKEN_BUCKET.encode()).hexdigest()
+
+ALLOWED = (True, None)
+
+
+class Rate:
+    """``count`` requests per ``period`` seconds"""
+
+    periods = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+
+    def __init__(self, count, period):
+        self.count = count
+        self.period = period
+        self.per_second = count / period
+
+    @classmethod
+    def parse(cls, value):
+        """``"<count>/<period>"``, period s, m, h or d, optionally a multiple: "10/5m" """
+        try:
+            count, period = value.split("/", 1)
+            unit = period.lstrip("0123456789")
+            multiple = int(period[: len(period) - len(unit)] or 1)
+            rate = cls(int(count), multiple * cls.periods[unit[:1]])
+        except (AttributeError, KeyError, ValueError):
+            raise ImproperlyConfigured(f"Invalid rate: {value!r}") from None
+        if rate.count < 1 or rate.period < 1:
+            raise ImproperlyConfigured(f"Invalid rate: {value!r}")
+        return rate
+
+
+class LocalBucket:
+    """This process's view of one shared bucket"""
+
+    __slots__ = (
+        "leased",
+        "lease_expires",
+        "remaining",
+        "blocked_until",
+        "tokens",
+        "updated",
+    )
+
+    def __init__(self, rate, now):
+        # Tokens taken from Redis and not used yet
+        self.leased = 0
+        self.lease_expires = 0.0
+        # Tokens Redis had left after the last lease, None before the first
+        self.remaining = None
+        self.blocked_until = 0.0
+        # A process-local bucket, only used while Redis is unavailable
+        self.tokens = float(rate.count)
+        self.updated = now
+
+
+class RateLimiter:
+    """
+    Token buckets per (scope, key), shared by every process through a single
+    atomic Redis script, with limits per scope and user tier in RATE_LIMITS.
+
+    Most checks never reach Redis: a key that Redis reported as well under
+    its limit gets a lease of several tokens, spent locally until used up or
+    ``lease_seconds`` old, and a key that was refused stays refused locally
+    until its retry time. A lease is at most what the bucket refills during
+    ``lease_seconds``, so tokens a process leased but did not use cost a key
+    little. While Redis is unreachable each process applies the limits on
+    its own, which still keeps one client from starving the others.
+    """
+
+    # Lease at most this fraction of a bucket's capacity at once
+    lease_fraction = 0.05
+    lease_seconds = 1.0
+    # Keys tracked locally before the table is pruned
+    max_keys = 10_000
+    # Skip Redis for this long after it failed
+    redis_retry_seconds = 5.0
+
+    def __init__(self):
+        self._rates = {}
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._redis_down_until = 0.0
+
+    @property
+    def enabled(self):
+        return settings.RATE_LIMIT_ENABLED
+
+    def rate(self, scope, tier):
+        """The Rate of ``tier`` in ``scope`` (its "default" if unset), or None"""
+        if (scope, tier) not in self._rates:
+            try:
+                limits = settings.RATE_LIMITS[scope]
+            except KeyError:
+                raise ImproperlyConfigured(f"No RATE_LIMITS for scope {scope!r}")
+            value = limits.get(tier, limits.get("default"))
+            self._rates[scope, tier] = Rate.parse(value) if value else None
+        return self._rates[scope, tier]
+
+    def check(self, scope, ident, tier, cost=1):
+        """
+        (allowed, seconds to wait when refused) for a request worth ``cost``
+        tokens. The wait is None for a cost above the limit, which no wait
+        would allow.
+        """
+        if not self.enabled:
+            return ALLOWED
+        rate = self.rate(scope, tier)
+        if rate is None:
+            return ALLOWED
+        if cost > rate.count:
+            return self.too_costly(scope)
+        key = f"{scope}:{ident}"
+        decision, wanted = self.local(scope, key, rate, cost)
+        if decision is not None:
+            return decision
+        try:
+            reply = self.run_script(get_redis("ratelimit"), key, rate, wanted, cost)
+        except redis.RedisError as exc:
+            return self.fallback(scope, key, rate, cost, exc)
+        return self.apply(scope, key, rate, cost, reply)
+
+    async def acheck(self, scope, ident, tier, cost=1):
+        if not self.enabled:
+            return ALLOWED
+        rate = self.rate(scope, tier)
+        if rate is None:
+            return ALLOWED
+        if cost > rate.count:
+            return self.too_costly(scope)
+        key = f"{scope}:{ident}"
+        decision, wanted = self.local(scope, key, rate, cost)
+        if decision is not None:
+            return decision
+        try:
+            reply = await self.arun_script(
+                get_async_redis("ratelimit"), key, rate, wanted, cost
+            )
+        except redis.RedisError as exc:
+            return self.fallback(scope, key, rate, cost, exc)
+        return self.apply(scope, key, rate, cost, reply)
+
+    def too_costly(self, scope):
+        decision = (False, None)
+        record(scope, decision, "local")
+        return decision
+
+    # Local state
+
+    def bucket(self, key, rate, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self.prune(now)
+            bucket = self._buckets[key] = LocalBucket(rate, now)
+        return bucket
+
+    def prune(self, now):
+        self._buckets = {
+            key: bucket
+            for key, bucket in self._buckets.items()
+            if bucket.blocked_until > now
+            or (bucket.leased and bucket.lease_expires > now)
+        }
+        if len(self._buckets) >= self.max_keys:
+            self._buckets = {}
+
+    def local(self, scope, key, rate, cost):
+        """(decision, None) without Redis, or (None, tokens to ask Redis for)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self.bucket(key, rate, now)
+            if bucket.blocked_until > now:
+                decision = (False, bucket.blocked_until - now)
+            elif bucket.leased >= cost and bucket.lease_expires > now:
+                bucket.leased -= cost
+                decision = ALLOWED
+            elif self._redis_down_until > now:
+                decision = None
+            else:
+                return None, max(cost, self.lease_size(rate, bucket))
+        if decision is None:
+            return self.fallback(scope, key, rate, cost), None
+        record(scope, decision, "local")
+        return decision, None
+
+    def lease_size(self, rate, bucket):
+        # Only keys clearly under their limit lease more than one token
+        if bucket.remaining is None or bucket.remaining < rate.count / 2:
+            return 1
+        lease = min(
+            rate.count * self.lease_fraction, rate.per_second * self.lease_seconds
+        )
+        return max(1, int(lease))
+
+    def apply(self, scope, key, rate, cost, reply):
+        granted, remaining, retry_after = (
+            int(reply[0]),
+            float(reply[1]),
+            float(reply[2]),
+        )
+        now = time.monotonic()
+        with self._lock:
+            bucket = self.bucket(key, rate, now)
+            bucket.remaining = remaining
+            if granted:
+                bucket.leased = granted - cost
+                bucket.lease_expires = now + self.lease_seconds
+                decision = ALLOWED
+            else:
+                if cost == 1:
+                    bucket.blocked_until = now + retry_after
+                decision = (False, retry_after)
+        record(scope, decision, "redis")
+        return decision
+
+    def fallback(self, scope, key, rate, cost, exc=None):
+        """Apply the limit to this process alone"""
+        now = time.monotonic()
+        with self._lock:
+            if exc is not None:
+                logger.warning("Rate limiting per process, Redis unavailable: %s", exc)
+                self._redis_down_until = now + self.redis_retry_seconds
+            bucket = self.bucket(key, rate, now)
+            tokens = min(
+                rate.count, bucket.tokens + (now - bucket.updated) * rate.per_second
+            )
+            bucket.updated = now
+            if tokens >= cost:
+                bucket.tokens = tokens - cost
+                decision = ALLOWED
+            else:
+                bucket.tokens = tokens
+                decision = (False, (cost - tokens) / rate.per_second)
+        record(scope, decision, "fallback")
+        return decision
+
+    # Redis
+
+    def script_args(self, key, rate, wanted, cost):
+        return (
+            TOKEN_BUCKET_SHA,
+            1,
+            redis_clients.prefix("ratelimit") + key,
+            rate.count,
+            repr(rate.per_second),
+            wanted,
+            cost,
+        )
+
+    def run_script(self, client, key, rate, wanted, cost):
+        args = self.script_args(key, rate, wanted, cost)
+        try:
+            return client.evalsha(*args)
+        except redis.exceptions.NoScriptError:
+            return client.eval(TOKEN_BUCKET, *args[1:])
+
+    async def arun_script(self, client, key, rate, wanted, cost):
+        args = self.script_args(key, rate, wanted, cost)
+        try:
+            return await client.evalsha(*args)
+        except redis.exceptions.NoScriptError:
+            return await client.eval(TOKEN_BUCKET, *args[1:])
+
+
+def record(scope, decision, source):
+    result = "allowed" if decision[0] else "limited"
+    RATE_LIMIT_DECISIONS.inc(scope=scope, result=result, source=source)
+
+
+rate_limiter = RateLimiter()
+
+
+def identify(user, address):
+    """(key, tier) of a client: its user when authenticated, else its address"""
+    if user is not None and getattr(user, "is_authenticated", False):
+        return f"user:{user.pk}", "staff" if user.is_staff else "default"
+    return f"addr:{address}", "anonymous"
+
+
+def retry_after_seconds(wait):
+    """Whole seconds for a Retry-After header or message"""
+    return max(1, math.ceil(wait))
+
+
+def rate_limited_response(wait):
+    """The 429 a RateLimit throttle answers with, for limits checked in views"""
+    response = JsonResponse({"detail": "Too many requests."}, status=429)
+    if wait is not None:
+        response["Retry-After"] = str(retry_after_seconds(wait))
+    return response
+
+
+# Ninja asks a throttle for its wait right after refusing, in the same context
+_wait = contextvars.ContextVar("rate_limit_wait", default=None)
+
+
+class RateLimit(BaseThrottle):
+    """
+    Ninja throttle applying one RATE_LIMITS scope per API key owner, or per
+    client address on routes without authentication::
+
+        router = Router(auth=api_key_auth, throttle=RateLimit("api"))
+
+        @router.post("/trigger-task", throttle=[RateLimit("api"), RateLimit("example.trigger_task")])
+
+    Refused requests get a 429 with ``Retry-After``. Ninja runs throttles
+    synchronously, for async operations too, so this is for the sync
+    routers only; async routers use ``async_rate_limit``.
+    """
+
+    def __init__(self, scope):
+        self.scope = scope
+
+    def check(self, request):
+        ident, tier = identify(getattr(request, "auth", None), self.get_ident(request))
+        return rate_limiter.check(self.scope, ident, tier)
+
+    async def acheck(self, request):
+        ident, tier = identify(getattr(request, "auth", None), self.get_ident(request))
+        return await rate_limiter.acheck(self.scope, ident, tier)
+
+    def allow_request(self, request):
+        allowed, wait = self.check(request)
+        _wait.set(wait)
+        return allowed
+
+    def wait(self):
+        wait = _wait.get()
+        return retry_after_seconds(wait) if wait is not None else None
+
+
+def async_rate_limit(*scopes):
+    """
+    Async counterpart of RateLimit: an operation decorator checking each
+    scope in turn with rate_limiter.acheck(), after authentication, without
+    blocking the event loop::
+
+        async_router.add_decorator(async_rate_limit("api"))
+
+        @async_router.post("/trigger-task")
+        @async_rate_limit("example.trigger_task")
+        async def atrigger_streaming_task(request): ...
+
+    Refused requests get the same 429 with ``Retry-After``.
+    """
+    throttles = [RateLimit(scope) for scope in scopes]
+
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            for throttle in throttles:
+                allowed, wait = await throttle.acheck(request)
+                if not allowed:
+                    return rate_limited_response(wait)
+            return await view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _reset_after_fork():
+    # Leases were taken for the parent; the lock may be held by another thread
+    rate_limiter._reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
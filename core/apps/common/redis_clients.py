@@ -0,0 +1,262 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from .metrics import Histogram
+
+REDIS_COMMAND_SECONDS = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command round trip time, by consumer",
+    ["consumer", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class PoolCounters:
+    """Cumulative checkout counters of one connection pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        # Checkouts that failed: no free connection within the pool timeout,
+        # or no connection to Redis at all
+        self.errors = 0
+
+    def acquired(self, waited):
+        self.checkouts += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def as_dict(self):
+        return {
+            "checkouts": self.checkouts,
+            "wait_ms": round(self.wait_seconds * 1000, 2),
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+            "errors": self.errors,
+        }
+
+
+class CountingConnectionPool(redis.BlockingConnectionPool):
+    """Waits up to ``timeout`` for a free connection instead of failing"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.counters = PoolCounters()
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self.counters.errors += 1
+            raise
+        self.counters.acquired(time.perf_counter() - start)
+        return connection
+
+
+class AsyncCountingConnectionPool(redis.asyncio.BlockingConnectionPool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.counters = PoolCounters()
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self.counters.errors += 1
+            raise
+        self.counters.acquired(time.perf_counter() - start)
+        return connection
+
+
+class TimedRedis(redis.Redis):
+    """Times each command for the consumer the client was created for"""
+
+    consumer = "default"
+
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_SECONDS.observe(
+                time.perf_counter() - start, consumer=self.consumer, command=args[0]
+            )
+
+
+class AsyncTimedRedis(redis.asyncio.Redis):
+    consumer = "default"
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_SECONDS.observe(
+                time.perf_counter() - start, consumer=self.consumer, command=args[0]
+            )
+
+
+class RedisClients:
+    """
+    Process-wide Redis connection pools shared by every consumer.
+
+    Consumers are named in ``REDIS_CONSUMERS`` with an optional logical
+    ``db``, a key ``prefix`` and socket timeouts (``socket_timeout`` is None
+    for consumers issuing blocking commands such as the channel layer's
+    BRPOP). Consumers that agree on db and timeouts share one pool, so a
+    process holds at most ``REDIS_MAX_CONNECTIONS`` connections per distinct
+    combination rather than one pool per library. Async pools are per event loop, since
+    redis.asyncio connections cannot cross loops.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._async_pools = weakref.WeakKeyDictionary()
+        # Building a client copies its response callbacks, so reuse them
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def consumer(self, name):
+        try:
+            options = settings.REDIS_CONSUMERS[name]
+        except KeyError:
+            raise ValueError(f"Unknown Redis consumer: {name}") from None
+        return {
+            "db": options.get("db"),
+            "prefix": options.get("prefix", ""),
+            "socket_timeout": options.get(
+                "socket_timeout", settings.REDIS_SOCKET_TIMEOUT
+            ),
+            "socket_connect_timeout": options.get(
+                "socket_connect_timeout", settings.REDIS_CONNECT_TIMEOUT
+            ),
+        }
+
+    def prefix(self, name):
+        return self.consumer(name)["prefix"]
+
+    def pool_options(self, name):
+        consumer = self.consumer(name)
+        options = {
+            "max_connections": settings.REDIS_MAX_CONNECTIONS,
+            "timeout": settings.REDIS_POOL_TIMEOUT,
+            "socket_timeout": consumer["socket_timeout"],
+            "socket_connect_timeout": consumer["socket_connect_timeout"],
+            "socket_keepalive": settings.REDIS_SOCKET_KEEPALIVE,
+            "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+        }
+        if consumer["db"] is not None:
+            options["db"] = consumer["db"]
+        key = (
+            consumer["db"],
+            consumer["socket_timeout"],
+            consumer["socket_connect_timeout"],
+        )
+        return key, options
+
+    def pool(self, name="default"):
+        key, options = self.pool_options(name)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = CountingConnectionPool.from_url(
+                        settings.REDIS_URL, **options
+                    )
+                    self._pools[key] = pool
+        return pool
+
+    def async_pool(self, name="default"):
+        key, options = self.pool_options(name)
+        pools = self._async_pools.setdefault(asyncio.get_running_loop(), {})
+        pool = pools.get(key)
+        if pool is None:
+            pool = AsyncCountingConnectionPool.from_url(settings.REDIS_URL, **options)
+            pools[key] = pool
+        return pool
+
+    def client(self, name="default"):
+        client = self._clients.get(name)
+        if client is None:
+            client = TimedRedis(connection_pool=self.pool(name))
+            client.consumer = name
+            self._clients[name] = client
+        return client
+
+    def async_client(self, name="default"):
+        """A client on the running loop's pool"""
+        clients = self._async_clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get(name)
+        if client is None:
+            client = AsyncTimedRedis(connection_pool=self.async_pool(name))
+            client.consumer = name
+            clients[name] = client
+        return client
+
+    def stats(self):
+        """Size, utilisation and checkout counters of this process's pools"""
+        pools = [("sync", key, pool) for key, pool in list(self._pools.items())]
+        for loop_pools in list(self._async_pools.values()):
+            pools.extend(("async", key, pool) for key, pool in list(loop_pools.items()))
+
+        stats = []
+        for kind, (db, timeout, _), pool in pools:
+            in_use, idle = pool_usage(pool)
+            stats.append(
+                {
+                    "kind": kind,
+                    "db": db,
+                    "socket_timeout": timeout,
+                    "max_connections": pool.max_connections,
+                    "in_use": in_use,
+                    "idle": idle,
+                    **pool.counters.as_dict(),
+                }
+            )
+        return stats
+
+
+def pool_usage(pool):
+    """(in use, idle) connections of a blocking pool"""
+    if hasattr(pool, "_in_use_connections"):
+        return len(pool._in_use_connections), len(pool._available_connections)
+    # The sync pool queues idle connections among None placeholders
+    idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+    return len(pool._connections) - idle, idle
+
+
+redis_clients = RedisClients()
+
+
+def get_redis(consumer="default"):
+    return redis_clients.client(consumer)
+
+
+def get_async_redis(consumer="default"):
+    return redis_clients.async_client(consumer)
+
+
+def redis_pool_stats():
+    return redis_clients.stats()
+
+
+def _reset_after_fork():
+    # Connections inherited from the parent must not be shared with it
+    redis_clients._reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
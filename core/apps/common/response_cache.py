@@ -0,0 +1,259 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from ninja.decorators import decorate_view
+
+logger = logging.getLogger(__name__)
+
+
+def etag_matches(request, etag):
+    """Whether the request's ``If-None-Match`` covers ``etag``"""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return "*" in etags or etag in etags or f"W/{etag}" in etags
+
+
+def add_private_etag(response, etag):
+    response["ETag"] = etag
+    # Per-key content, shared caches must not store it
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["X-API-Key"])
+
+
+class ResponseCache:
+    """
+    Rendered responses of authenticated GET routes, cached per API key.
+
+    All cached routes of one key live in a single cache entry, so a lookup is
+    one round trip and invalidate() drops every route for a key at once.
+    Cache errors are logged and the route is served uncached.
+    """
+
+    key_prefix = "response:"
+    # Cached (route, path) variants kept per API key
+    max_variants = 32
+
+    @property
+    def enabled(self):
+        return settings.RESPONSE_CACHE_ENABLED
+
+    @property
+    def cache(self):
+        return caches[settings.RESPONSE_CACHE_ALIAS]
+
+    def cache_key(self, api_key):
+        return self.key_prefix + hashlib.sha256(api_key.encode()).hexdigest()
+
+    def get(self, key):
+        try:
+            return self.cache.get(key) or {}
+        except Exception:
+            logger.warning("Response cache unavailable", exc_info=True)
+            return {}
+
+    def set(self, key, entries):
+        # Drop expired variants, then the oldest, before writing back
+        now = time.time()
+        live = {v: e for v, e in entries.items() if e["expires"] > now}
+        live = dict(list(live.items())[-self.max_variants :])
+        timeout = max(e["expires"] for e in live.values()) - now
+        try:
+            self.cache.set(key, live, timeout)
+        except Exception:
+            logger.warning("Response cache unavailable", exc_info=True)
+
+    def invalidate(self, *api_keys):
+        keys = [self.cache_key(api_key) for api_key in api_keys if api_key]
+        if not keys:
+            return
+        try:
+            self.cache.delete_many(keys)
+        except Exception:
+            logger.warning("Failed to invalidate cached responses", exc_info=True)
+
+    async def aget(self, key):
+        # Django's async cache API hops through the thread-sensitive executor
+        return await sync_to_async(self.get, thread_sensitive=False)(key)
+
+    async def aset(self, key, entries):
+        await sync_to_async(self.set, thread_sensitive=False)(key, entries)
+
+
+response_cache = ResponseCache()
+
+
+class CachedRoute:
+    """
+    The two hooks of one cached route.
+
+    ``lookup`` wraps the view, runs after authentication and answers from
+    the cache (a 304 when ``If-None-Match`` matches) before the view or any
+    serialization runs. On a miss it marks the request, and ``store``, which
+    wraps the operation, caches the body Ninja rendered and adds the ETag.
+    ``secret_fields`` of the JSON body are cached as null and filled in from
+    ``request.auth`` when a cached body is served.
+    """
+
+    def __init__(self, name, ttl, secret_fields=()):
+        self.name = name
+        self.ttl = ttl
+        self.secret_fields = secret_fields
+
+    def begin(self, request, entries):
+        """A cached response for ``request``, or None after marking it a miss"""
+        variant = f"{self.name} {request.get_full_path()}"
+        entry = entries.get(variant)
+        if entry is not None and entry["expires"] > time.time():
+            return self.respond(request, entry)
+        request._response_cache = (variant, entries)
+        return None
+
+    def finish(self, request, response):
+        """Entries to write back for a miss, or None if nothing is cached"""
+        pending = getattr(request, "_response_cache", None)
+        if pending is None or response.status_code != 200:
+            return None
+        variant, entries = pending
+        etag = quote_etag(hashlib.sha256(response.content).hexdigest()[:32])
+        entries[variant] = {
+            "expires": time.time() + self.ttl,
+            "etag": etag,
+            "content": self.redact(response.content),
+            "content_type": response["Content-Type"],
+        }
+        self.add_headers(response, etag)
+        return entries
+
+    def respond(self, request, entry):
+        if self.matches(request, entry["etag"]):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                self.restore(request, entry["content"]),
+                content_type=entry["content_type"],
+            )
+        self.add_headers(response, entry["etag"])
+        return response
+
+    def redact(self, content):
+        if not self.secret_fields:
+            return content
+        body = json.loads(content)
+        # Kept as null so the restored body has the original field order
+        body.update(dict.fromkeys(self.secret_fields))
+        return json.dumps(body).encode()
+
+    def restore(self, request, content):
+        if not self.secret_fields:
+            return content
+        body = json.loads(content)
+        body.update({name: getattr(request.auth, name) for name in self.secret_fields})
+        return json.dumps(body).encode()
+
+    def conditional(self, request, response):
+        """Turn a freshly rendered response into a 304 if the client has it"""
+        if response.has_header("ETag") and self.matches(request, response["ETag"]):
+            not_modified = HttpResponseNotModified()
+            self.add_headers(not_modified, response["ETag"])
+            return not_modified
+        return response
+
+    def matches(self, request, etag):
+        return etag_matches(request, etag)
+
+    def add_headers(self, response, etag):
+        add_private_etag(response, etag)
+
+    def credential(self, request):
+        if not response_cache.enabled or request.method != "GET":
+            return None
+        return getattr(request.auth, "api_key", None)
+
+    def lookup(self, view_func):
+        if inspect.iscoroutinefunction(view_func):
+
+            @functools.wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                api_key = self.credential(request)
+                if api_key is not None:
+                    entries = await response_cache.aget(
+                        response_cache.cache_key(api_key)
+                    )
+                    response = self.begin(request, entries)
+                    if response is not None:
+                        return response
+                return await view_func(request, *args, **kwargs)
+
+        else:
+
+            @functools.wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                api_key = self.credential(request)
+                if api_key is not None:
+                    entries = response_cache.get(response_cache.cache_key(api_key))
+                    response = self.begin(request, entries)
+                    if response is not None:
+                        return response
+                return view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    def store(self, run):
+        if inspect.iscoroutinefunction(run):
+
+            @functools.wraps(run)
+            async def wrapper(request, *args, **kwargs):
+                response = await run(request, *args, **kwargs)
+                entries = self.finish(request, response)
+                if entries is not None:
+                    key = response_cache.cache_key(request.auth.api_key)
+                    await response_cache.aset(key, entries)
+                return self.conditional(request, response)
+
+        else:
+
+            @functools.wraps(run)
+            def wrapper(request, *args, **kwargs):
+                response = run(request, *args, **kwargs)
+                entries = self.finish(request, response)
+                if entries is not None:
+                    key = response_cache.cache_key(request.auth.api_key)
+                    response_cache.set(key, entries)
+                return self.conditional(request, response)
+
+        return wrapper
+
+
+def cache_response(name, ttl=None, secret_fields=()):
+    """
+    Cache a GET route's rendered response per API key, with ETag support.
+
+    Place it below the router decorator. ``name`` identifies the route in
+    the cache, so sync and async variants of one route share entries::
+
+        @router.get("/me", response=UserProfileSchema, auth=api_key_auth)
+        @cache_response("auth.me", ttl=60)
+        def get_user_profile(request): ...
+
+    Entries are dropped by ``response_cache.invalidate(api_key)``. Credentials
+    in the body must not reach the cache: list them in ``secret_fields``, as
+    attributes of ``request.auth`` to serve them from.
+    """
+    route = CachedRoute(name, ttl or settings.RESPONSE_CACHE_TTL, secret_fields)
+
+    def decorator(view_func):
+        return decorate_view(route.store)(route.lookup(view_func))
+
+    return decorator
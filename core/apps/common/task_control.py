@@ -0,0 +1,149 @@
+import json
+import logging
+
+import redis
+from django.conf import settings
+
+from .redis_clients import get_async_redis, get_redis, redis_clients
+
+logger = logging.getLogger(__name__)
+
+
+def task_key(kind, task_id):
+    return f"{redis_clients.prefix('tasks')}{kind}:{task_id}"
+
+
+class TaskCheckpoint:
+    """
+    Completed steps of one task, kept in Redis under the task id so a retry
+    or a redelivery after the worker died resumes where the last run left
+    off instead of at step 0::
+
+        checkpoint = TaskCheckpoint(self.request.id).load()
+        for step in range(checkpoint.step, total):
+            if checkpoint.cancelled:
+                ...
+            do_step(step, **checkpoint.state)
+            checkpoint.save(step + 1, partial=...)
+        checkpoint.clear()
+
+    Each load() and save() is one round trip that also reads the task's
+    cancellation flag into ``cancelled``. Checkpoints are an optimization:
+    when Redis is unavailable the task runs from the start and is not
+    saved.
+    """
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.key = task_key("checkpoint", task_id)
+        self.cancel_key = task_key("cancel", task_id)
+        self.step = 0
+        self.state = {}
+        self.cancelled = False
+
+    @property
+    def redis(self):
+        return get_redis("tasks")
+
+    def load(self):
+        try:
+            checkpoint, cancelled = self.redis.mget(self.key, self.cancel_key)
+        except redis.RedisError as exc:
+            logger.warning("Checkpoint of %s unavailable: %s", self.task_id, exc)
+            return self
+        if checkpoint is not None:
+            data = json.loads(checkpoint)
+            self.step, self.state = data["step"], data["state"]
+        self.cancelled = cancelled is not None
+        return self
+
+    def save(self, step, **state):
+        """Record ``step`` completed steps and the state needed to go on"""
+        self.step, self.state = step, state
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(
+            self.key,
+            json.dumps({"step": step, "state": state}),
+            ex=settings.TASK_CHECKPOINT_TTL,
+        )
+        pipe.exists(self.cancel_key)
+        try:
+            _, cancelled = pipe.execute()
+        except redis.RedisError as exc:
+            logger.warning("Checkpoint of %s not saved: %s", self.task_id, exc)
+            return
+        self.cancelled = bool(cancelled)
+
+    def clear(self):
+        """Drop the checkpoint and cancellation flag once the task is done"""
+        try:
+            self.redis.delete(self.key, self.cancel_key)
+        except redis.RedisError as exc:
+            logger.warning("Checkpoint of %s not cleared: %s", self.task_id, exc)
+
+
+# Cancellation is cooperative: the task sees the flag at its next checkpoint.
+# Tasks are owned by the user who triggered them; only they and staff users
+# may follow, read or cancel them.
+
+
+def record_task_owners(task_ids, user_id):
+    pipe = get_redis("tasks").pipeline(transaction=False)
+    for task_id in task_ids:
+        pipe.set(
+            task_key("owner", task_id), str(user_id), ex=settings.TASK_CHECKPOINT_TTL
+        )
+    try:
+        pipe.execute()
+    except redis.RedisError as exc:
+        logger.warning("Task owners not recorded: %s", exc)
+
+
+async def arecord_task_owners(task_ids, user_id):
+    pipe = get_async_redis("tasks").pipeline(transaction=False)
+    for task_id in task_ids:
+        pipe.set(
+            task_key("owner", task_id), str(user_id), ex=settings.TASK_CHECKPOINT_TTL
+        )
+    try:
+        await pipe.execute()
+    except redis.RedisError as exc:
+        logger.warning("Task owners not recorded: %s", exc)
+
+
+def may_access(user, owner):
+    return owner is not None and (user.is_staff or owner.decode() == str(user.pk))
+
+
+def accessible_tasks(task_ids, user):
+    """The ids among ``task_ids`` that ``user`` may access, in one MGET"""
+    if not task_ids:
+        return set()
+    owners = get_redis("tasks").mget([task_key("owner", t) for t in task_ids])
+    return {t for t, owner in zip(task_ids, owners) if may_access(user, owner)}
+
+
+async def aaccessible_tasks(task_ids, user):
+    if not task_ids:
+        return set()
+    owners = await get_async_redis("tasks").mget(
+        [task_key("owner", t) for t in task_ids]
+    )
+    return {t for t, owner in zip(task_ids, owners) if may_access(user, owner)}
+
+
+def request_cancel(task_id, user):
+    """Flag ``task_id`` for cancellation; False if ``user`` may not cancel it"""
+    client = get_redis("tasks")
+    if not may_access(user, client.get(task_key("owner", task_id))):
+        return False
+    client.set(task_key("cancel", task_id), 1, ex=settings.TASK_CHECKPOINT_TTL)
+    return True
+
+
+async def arequest_cancel(task_id, user):
+    client = get_async_redis("tasks")
+    if not may_access(user, await client.get(task_key("owner", task_id))):
+        return False
+    await client.set(task_key("cancel", task_id), 1, ex=settings.TASK_CHECKPOINT_TTL)
+    return True
@@ -0,0 +1,115 @@
+import fnmatch
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .autoscale import redis_queue_sample
+
+
+class UnroutableTask(Exception):
+    """A task without an entry in ``TASK_ROUTES``"""
+
+
+class TaskRoutes:
+    """
+    Queue and latency tier of every task, by its registered name.
+
+    ``TASK_ROUTES`` maps task names, or fnmatch patterns tried in order
+    after the exact names, to a queue and a tier. Each tier in
+    ``TASK_TIERS`` owns a band of broker priorities (0 is served first):
+    a task gets the top of its tier's band unless published with
+    ``priority=tier_priority(tier, level)``. Bands do not overlap, so a
+    worker takes every waiting interactive task before any bulk one,
+    whichever of its queues they are in.
+    """
+
+    def __init__(self, routes, tiers):
+        self.routes = routes
+        self.tiers = tiers
+        self.patterns = [name for name in routes if "*" in name or "?" in name]
+
+    def lookup(self, name):
+        route = self.routes.get(name)
+        if route is None:
+            pattern = next(
+                (p for p in self.patterns if fnmatch.fnmatchcase(name, p)), None
+            )
+            route = self.routes.get(pattern)
+        return route
+
+    def priority(self, tier, level=0):
+        low, high = self.tiers[tier]
+        return min(low + max(level, 0), high)
+
+    def tier_of(self, priority):
+        if priority is None:
+            return "unknown"
+        for tier, (low, high) in self.tiers.items():
+            if low <= priority <= high:
+                return tier
+        return "unknown"
+
+    def route_task(self, name, args, kwargs, options, task=None, **kw):
+        """Celery router; priorities given when publishing take precedence"""
+        route = self.lookup(name)
+        if route is None:
+            raise UnroutableTask(f"No route for task {name}, see TASK_ROUTES")
+        return {"queue": route["queue"], "priority": self.priority(route["tier"])}
+
+    def problems(self, app):
+        """Registered tasks without a route, and routes nothing consumes"""
+        app.loader.import_default_modules()
+        problems = [
+            f"{name}: no route in TASK_ROUTES"
+            for name in sorted(app.tasks)
+            if self.lookup(name) is None
+        ]
+        for name, route in self.routes.items():
+            if route["queue"] not in app.amqp.queues:
+                problems.append(f"{name}: unknown queue {route['queue']}")
+            if route["tier"] not in self.tiers:
+                problems.append(f"{name}: unknown tier {route['tier']}")
+        return problems
+
+
+task_routes = TaskRoutes(settings.TASK_ROUTES, settings.TASK_TIERS)
+route_task = task_routes.route_task
+
+
+def tier_priority(tier, level=0):
+    """Broker priority of a task published in ``tier``, ``level`` 0 first"""
+    return task_routes.priority(tier, level)
+
+
+def check_task_routes(app):
+    problems = task_routes.problems(app)
+    if problems:
+        raise ImproperlyConfigured("Unroutable tasks:\n  " + "\n  ".join(problems))
+
+
+def tier_backlog(app, timeout=2.0):
+    """
+    {queue: {tier: (waiting tasks, seconds the oldest has waited or None)}}
+
+    Read from the per-priority lists of the Redis transport, so the split
+    by tier is exact; other brokers do not expose it.
+    """
+    queues = sorted({route["queue"] for route in task_routes.routes.values()})
+    with app.connection_for_read() as conn:
+        conn.ensure_connection(max_retries=1, interval_start=0, timeout=timeout)
+        channel = conn.default_channel
+        if not hasattr(channel, "priority_steps"):
+            raise ImproperlyConfigured("Tier backlog needs the Redis transport")
+        now = time.time()
+        backlog = {}
+        for queue in queues:
+            backlog[queue] = {}
+            for tier, (low, high) in task_routes.tiers.items():
+                keys = [
+                    f"{queue}{channel.sep}{step}" if step else queue
+                    for step in channel.priority_steps
+                    if low <= step <= high
+                ]
+                backlog[queue][tier] = redis_queue_sample(channel.client, keys, now)
+        return backlog
@@ -0,0 +1,121 @@
+import datetime
+import hashlib
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from celery import current_app, states
+from celery.backends.base import BaseKeyValueStoreBackend
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import quote_etag
+
+from .local_cache import MISSING, LocalTTLCache
+from .progress import PROGRESS
+
+logger = logging.getLogger(__name__)
+
+
+class TaskStatusReader:
+    """
+    Status of many Celery tasks at once, read from the result backend.
+
+    Key-value backends (Redis, cache) answer every id in one MGET; other
+    backends are read once per id. Tasks in a ready state (SUCCESS, FAILURE,
+    REVOKED) no longer change, so their status is kept in-process for
+    ``TASK_STATUS_CACHE_TTL`` seconds and polls of finished tasks skip the
+    backend. Unknown ids are reported as PENDING, as Celery does.
+    """
+
+    def __init__(self):
+        self.ready = LocalTTLCache(
+            maxsize=settings.TASK_STATUS_CACHE_MAXSIZE,
+            ttl=settings.TASK_STATUS_CACHE_TTL,
+        )
+
+    def get_many(self, task_ids):
+        """Statuses of ``task_ids``, in order"""
+        statuses = {}
+        unready = []
+        for task_id in task_ids:
+            status = self.ready.get(task_id)
+            if status is MISSING:
+                unready.append(task_id)
+            else:
+                statuses[task_id] = status
+
+        for task_id, meta in self.read(unready).items():
+            status = self.to_status(task_id, meta)
+            if status["state"] in states.READY_STATES:
+                self.ready.set(task_id, status)
+            statuses[task_id] = status
+        return [statuses[task_id] for task_id in task_ids]
+
+    async def aget_many(self, task_ids):
+        # The result backend clients are blocking
+        return await sync_to_async(self.get_many, thread_sensitive=False)(task_ids)
+
+    def read(self, task_ids):
+        """{task id: raw meta or None}"""
+        if not task_ids:
+            return {}
+        backend = current_app.backend
+        if not isinstance(backend, BaseKeyValueStoreBackend):
+            return {task_id: backend.get_task_meta(task_id) for task_id in task_ids}
+
+        keys = [backend.get_key_for_task(task_id) for task_id in task_ids]
+        values = backend.mget(keys)
+        if hasattr(values, "items"):
+            # The cache backend answers with a mapping of the keys found
+            values = [values.get(key) for key in keys]
+        return {
+            task_id: backend.decode(value) if value is not None else None
+            for task_id, value in zip(task_ids, values)
+        }
+
+    def to_status(self, task_id, meta):
+        status = {
+            "task_id": task_id,
+            "state": states.PENDING,
+            "progress": None,
+            "result": None,
+            "error": None,
+            "date_done": None,
+        }
+        if not meta:
+            return status
+
+        state = meta["status"]
+        result = meta.get("result")
+        date_done = meta.get("date_done")
+        if isinstance(date_done, datetime.datetime):
+            date_done = date_done.isoformat()
+        status.update(state=state, date_done=date_done)
+        # STARTED carries the worker's pid and hostname, not for clients
+        if state == PROGRESS:
+            status["progress"] = result
+        elif state == states.SUCCESS:
+            status["result"] = result
+        elif state in states.EXCEPTION_STATES:
+            status["error"] = describe_exception(result)
+        return status
+
+
+def describe_exception(result):
+    """Type and message of an exception object or of a serialized one"""
+    if isinstance(result, BaseException):
+        return f"{type(result).__name__}: {result}"
+    if isinstance(result, dict) and "exc_type" in result:
+        message = result.get("exc_message")
+        if isinstance(message, (list, tuple)):
+            message = ", ".join(str(part) for part in message)
+        return f"{result['exc_type']}: {message}"
+    return str(result) if result is not None else None
+
+
+def statuses_etag(statuses):
+    content = json.dumps(statuses, sort_keys=True, cls=DjangoJSONEncoder)
+    return quote_etag(hashlib.sha256(content.encode()).hexdigest()[:32])
+
+
+task_status_reader = TaskStatusReader()
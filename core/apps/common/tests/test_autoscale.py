@@ -0,0 +1,135 @@
+import json
+from types import SimpleNamespace
+
+import fakeredis
+from django.conf import settings
+from django.test import SimpleTestCase
+from kombu.transport.redis import Channel
+
+from apps.common.autoscale import ScalingPolicy, redis_queue_keys, redis_queue_sample
+
+
+def run(policy, current, script):
+    """
+    Feed ``script`` of (seconds, busy, backlog, oldest wait) samples to
+    ``policy``, resizing to each target; returns the pool sizes
+    """
+    sizes = []
+    for now, busy, backlog, wait in script:
+        current = policy.target(current, busy, backlog, wait, now)
+        sizes.append(current)
+    return sizes
+
+
+class PreforkPolicyTests(SimpleTestCase):
+    def setUp(self):
+        self.policy = ScalingPolicy(**settings.AUTOSCALE_POLICIES["prefork"])
+
+    def test_grows_in_bounded_steps_under_backlog(self):
+        sizes = run(
+            self.policy,
+            2,
+            [(0, 2, 20, 1.0), (5, 4, 20, 1.0), (10, 6, 20, 1.0), (15, 8, 3, 1.0)],
+        )
+        self.assertEqual(sizes, [4, 6, 8, 8])
+
+    def test_waiting_task_grows_a_pool_without_backlog_pressure(self):
+        script = [(0, 4, 1, 2.0), (5, 4, 1, 9.9), (10, 4, 1, 10.0)]
+        self.assertEqual(run(self.policy, 4, script), [4, 4, 5])
+
+    def test_dead_band_holds_size(self):
+        # One waiting task per worker is not pressure, half busy is not idle
+        script = [(0, 4, 4, 1.0), (100, 2, 0, None), (400, 2, 0, None)]
+        self.assertEqual(run(self.policy, 4, script), [4, 4, 4])
+
+    def test_shrinks_one_at_a_time_after_quiet_period(self):
+        script = [
+            (0, 1, 0, None),
+            (299, 1, 0, None),
+            (300, 1, 0, None),
+            (305, 1, 0, None),
+            (310, 1, 0, None),
+        ]
+        self.assertEqual(run(self.policy, 8, script), [8, 8, 7, 6, 5])
+
+    def test_backlog_restarts_quiet_period(self):
+        script = [(0, 1, 0, None), (200, 1, 1, 0.5), (300, 1, 0, None)]
+        self.assertEqual(run(self.policy, 8, script), [8, 8, 8])
+        # Quiet again from 300, not from 0
+        self.assertEqual(self.policy.target(8, 1, 0, None, 599), 8)
+        self.assertEqual(self.policy.target(8, 1, 0, None, 600), 7)
+
+    def test_never_shrinks_below_busy_workers(self):
+        script = [(0, 3, 0, None), (300, 3, 0, None), (305, 3, 0, None)]
+        self.assertEqual(run(self.policy, 7, script), [7, 6, 6])
+
+
+class GeventPolicyTests(SimpleTestCase):
+    def setUp(self):
+        self.policy = ScalingPolicy(**settings.AUTOSCALE_POLICIES["gevent"])
+
+    def test_follows_backlog_in_one_step(self):
+        script = [
+            (0, 10, 200, 0.1),
+            # 0.1 waiting tasks per greenlet is not pressure
+            (1, 210, 21, 0.1),
+            (2, 210, 30, 0.1),
+            (3, 240, 0, None),
+        ]
+        self.assertEqual(run(self.policy, 10, script), [210, 210, 240, 240])
+
+    def test_short_wait_grows_the_pool(self):
+        script = [(0, 50, 1, 0.5), (1, 50, 1, 1.0)]
+        self.assertEqual(run(self.policy, 50, script), [50, 51])
+
+    def test_shrinks_to_busy_workers_after_quiet_period(self):
+        script = [(0, 20, 0, None), (59, 20, 0, None), (60, 20, 0, None)]
+        self.assertEqual(run(self.policy, 200, script), [200, 200, 40])
+
+
+class RedisQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        self.channel = SimpleNamespace(
+            sep=Channel.sep, priority_steps=Channel.priority_steps
+        )
+
+    def push(self, key, published_at=None):
+        headers = {} if published_at is None else {"published_at": published_at}
+        self.redis.lpush(key, json.dumps({"body": "", "headers": headers}))
+
+    def test_keys_cover_each_priority_step(self):
+        keys = redis_queue_keys(self.channel, ["cpu_queue", "io_queue"])
+        sep = Channel.sep
+        self.assertEqual(
+            keys,
+            [
+                "cpu_queue",
+                f"cpu_queue{sep}3",
+                f"cpu_queue{sep}6",
+                f"cpu_queue{sep}9",
+                "io_queue",
+                f"io_queue{sep}3",
+                f"io_queue{sep}6",
+                f"io_queue{sep}9",
+            ],
+        )
+
+    def test_sample_sums_priorities_and_ages_oldest_message(self):
+        keys = redis_queue_keys(self.channel, ["cpu_queue"])
+        self.push("cpu_queue", 990.0)
+        self.push("cpu_queue", 995.0)
+        self.push(keys[2], 970.0)
+        self.push(keys[2], 998.0)
+        self.push(keys[3])
+        self.assertEqual(redis_queue_sample(self.redis, keys, 1000.0), (5, 30.0))
+
+    def test_sample_without_published_at_has_no_wait(self):
+        keys = redis_queue_keys(self.channel, ["cpu_queue"])
+        self.push("cpu_queue")
+        self.redis.lpush(keys[1], "not json")
+        self.assertEqual(redis_queue_sample(self.redis, keys, 1000.0), (2, None))
+
+    def test_sample_of_empty_queues(self):
+        keys = redis_queue_keys(self.channel, ["cpu_queue", "io_queue"])
+        self.assertEqual(redis_queue_sample(self.redis, keys, 1000.0), (0, None))
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.common.progress import ProgressPublisher
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class ProgressPublisherTests(SimpleTestCase):
+    def setUp(self):
+        self.publisher = ProgressPublisher(interval=0.05)
+        self.addCleanup(self.publisher.close)
+
+    def on_loop(self, func):
+        async def call():
+            return func()
+
+        loop = self.publisher.loop
+        return asyncio.run_coroutine_threadsafe(call(), loop).result(5)
+
+    def test_expires_throttle_state_of_tasks_that_never_finished(self):
+        for step in range(3):
+            self.publisher.update("task_a", "a", {"type": "task_update", "step": step})
+        self.publisher.update("task_b", "b", {"type": "task_update"})
+        self.assertEqual(
+            self.on_loop(lambda: set(self.publisher._last_sent)), {"a", "b"}
+        )
+
+        time.sleep(0.1)
+        self.on_loop(self.publisher._expire)
+
+        self.assertEqual(self.on_loop(lambda: self.publisher._last_sent), {})
+        self.assertEqual(self.on_loop(lambda: self.publisher._pending), {})
+
+    def test_keeps_recent_throttle_state(self):
+        self.publisher.interval = 60
+        self.publisher.update("task_a", "a", {"type": "task_update"})
+        self.on_loop(self.publisher._expire)
+        self.assertEqual(self.on_loop(lambda: set(self.publisher._last_sent)), {"a"})
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ninja import NinjaAPI, Router
+from ninja.testing import TestAsyncClient
+
+from apps.common.rate_limit import ALLOWED, async_rate_limit, rate_limiter
+
+
+def limited_router():
+    router = Router()
+    router.add_decorator(async_rate_limit("api"))
+
+    @router.get("/test")
+    async def atest(request):
+        return {"ok": True}
+
+    @router.post("/trigger-task")
+    @async_rate_limit("example.trigger_task")
+    async def atrigger(request, steps: int = 1):
+        return {"steps": steps}
+
+    return router
+
+
+class AsyncRateLimitTests(SimpleTestCase):
+    def setUp(self):
+        self.client = TestAsyncClient(limited_router())
+        # The blocking check must not run for async operations
+        patcher = mock.patch.object(
+            rate_limiter, "check", side_effect=AssertionError("blocking check")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def acheck(self, *decisions):
+        patcher = mock.patch.object(
+            rate_limiter, "acheck", mock.AsyncMock(side_effect=decisions)
+        )
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    async def test_allowed_request_checks_router_scope(self):
+        acheck = self.acheck(ALLOWED)
+        response = await self.client.get("/test")
+        self.assertEqual(response.status_code, 200)
+        acheck.assert_awaited_once_with("api", "addr:127.0.0.1", "anonymous")
+
+    async def test_operation_scope_checked_after_router_scope(self):
+        acheck = self.acheck(ALLOWED, ALLOWED)
+        response = await self.client.post("/trigger-task?steps=3")
+        self.assertEqual(response.json(), {"steps": 3})
+        self.assertEqual(
+            [call.args[0] for call in acheck.await_args_list],
+            ["api", "example.trigger_task"],
+        )
+
+    async def test_refused_request_gets_429_with_retry_after(self):
+        acheck = self.acheck((False, 2.5))
+        response = await self.client.post("/trigger-task")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "3")
+        # Refused by the router scope, the operation scope is not debited
+        acheck.assert_awaited_once()
+
+
+class AsyncRoutersTests(SimpleTestCase):
+    def test_async_routers_have_no_blocking_throttle(self):
+        from apps.example.api import async_router as example_router
+        from authentication.api import async_router as auth_router
+        from logs.api import async_router as logs_router
+
+        api = NinjaAPI(urls_namespace="async-routers-test")
+        api.add_router("/auth", auth_router)
+        api.add_router("/example", example_router)
+        api.add_router("/logs", logs_router)
+        api.urls
+        operations = [
+            operation
+            for router in api._get_bound_routers()
+            for view in router.path_operations.values()
+            for operation in view.operations
+        ]
+        self.assertTrue(operations)
+        for operation in operations:
+            self.assertTrue(operation.is_async)
+            self.assertEqual(operation.throttle_objects, [])
@@ -1,11 +1,46 @@
 from ninja import Router
-from authentication.authentication import api_key_auth
+from ninja.errors import HttpError
+from asgiref.sync import sync_to_async
+from celery import group
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from authentication.authentication import api_key_auth, async_api_key_auth
+from apps.common.idempotency import IdempotencyError, idempotency_store
+from apps.common.rate_limit import (
+    RateLimit,
+    async_rate_limit,
+    identify,
+    rate_limited_response,
+    rate_limiter,
+)
+from apps.common.response_cache import add_private_etag, etag_matches
+from apps.common.task_control import (
+    aaccessible_tasks,
+    accessible_tasks,
+    arecord_task_owners,
+    arequest_cancel,
+    record_task_owners,
+    request_cancel,
+)
+from apps.common.task_routing import tier_priority
+from apps.common.task_status import statuses_etag, task_status_reader
 from .tasks import streaming_task
-from .schemas import TestResponseSchema, TaskResponseSchema
+from .schemas import (
+    TestResponseSchema,
+    TaskBatchResponseSchema,
+    TaskBatchSchema,
+    TaskResponseSchema,
+    TaskStatusListSchema,
+)
 import logging
+import uuid
 
 logger = logging.getLogger("db")
-router = Router(tags=["Example"], auth=api_key_auth)
+router = Router(tags=["Example"], auth=api_key_auth, throttle=RateLimit("api"))
+async_router = Router(tags=["Example"], auth=async_api_key_auth)
+async_router.add_decorator(async_rate_limit("api"))
+# Each triggered task holds an io_queue worker for several seconds
+trigger_task_throttle = [RateLimit("api"), RateLimit("example.trigger_task")]
 
 
 @router.get("/test", response=TestResponseSchema)
@@ -22,14 +57,232 @@ def test_endpoint(request):
     )
 
 
-@router.post("/trigger-task", response=TaskResponseSchema)
+@router.post(
+    "/trigger-task", response=TaskResponseSchema, throttle=trigger_task_throttle
+)
 def trigger_streaming_task(request):
     """Trigger the streaming task"""
     logger.info(f"Streaming task triggered by user: {request.auth.username}")
 
-    task = streaming_task.delay()
+    task = streaming_task.delay(user_id=str(request.auth.pk))
+    record_task_owners([task.id], request.auth.pk)
 
     return TaskResponseSchema(
         message="Streaming task started",
         task_id=task.id,
     )
+
+
+@router.post("/trigger-tasks", response=TaskBatchResponseSchema)
+def trigger_streaming_tasks(request, response: HttpResponse, payload: TaskBatchSchema):
+    """Trigger a batch of streaming tasks, published together"""
+    return trigger_batch(request, response, payload)
+
+
+def trigger_batch(request, response, payload):
+    # Retried requests with the same Idempotency-Key get the first response
+    specs = [spec.dict() for spec in payload.tasks]
+    key = request.headers.get("Idempotency-Key")
+    if key is None:
+        return submit_batch(request, specs)
+    if not 0 < len(key) <= 255:
+        raise HttpError(400, "Idempotency-Key must be 1 to 255 characters")
+
+    try:
+        stored = idempotency_store.claim(request.auth.pk, key, specs)
+    except IdempotencyError as exc:
+        raise HttpError(exc.status, str(exc))
+    if stored is not None:
+        response["Idempotent-Replayed"] = "true"
+        return stored
+
+    try:
+        result = submit_batch(request, specs)
+    except BaseException:
+        idempotency_store.release(request.auth.pk, key)
+        raise
+    if isinstance(result, HttpResponse):
+        # Refused by the rate limit, nothing was enqueued
+        idempotency_store.release(request.auth.pk, key)
+    else:
+        idempotency_store.complete(request.auth.pk, key, specs, result)
+    return result
+
+
+def submit_batch(request, specs):
+    # Each task counts against the per-task limit, as if triggered one by one
+    ident, tier = identify(request.auth, None)
+    allowed, wait = rate_limiter.check(
+        "example.trigger_task", ident, tier, cost=len(specs)
+    )
+    if not allowed:
+        if wait is None:
+            raise HttpError(400, "The batch exceeds your task rate limit")
+        return rate_limited_response(wait)
+
+    logger.info(
+        f"{len(specs)} streaming tasks triggered by user: {request.auth.username}"
+    )
+    user_id = str(request.auth.pk)
+    # Batches run after single tasks triggered interactively
+    result = group(
+        streaming_task.s(user_id=user_id, steps=spec["steps"]) for spec in specs
+    ).apply_async(priority=tier_priority("bulk"))
+    task_ids = [task.id for task in result.results]
+    record_task_owners(task_ids, request.auth.pk)
+
+    return {
+        "message": f"{len(specs)} streaming tasks started",
+        "task_ids": task_ids,
+    }
+
+
+@router.get("/tasks", response=TaskStatusListSchema)
+def task_statuses(request, response: HttpResponse, ids: str):
+    """State, progress and result of tasks, given as comma-separated ids"""
+    task_ids = parse_task_ids(ids)
+    try:
+        visible = accessible_tasks(task_ids, request.auth)
+        statuses = task_status_reader.get_many(
+            [task_id for task_id in task_ids if task_id in visible]
+        )
+    except Exception:
+        logger.warning("Task status unavailable", exc_info=True)
+        raise HttpError(503, "Task status unavailable")
+    return statuses_response(request, response, with_unknown(task_ids, statuses))
+
+
+@router.post("/tasks/{task_id}/cancel", response={202: TaskResponseSchema})
+def cancel_task(request, task_id: str):
+    """Ask a running or queued task to stop at its next step"""
+    task_id = parse_task_id(task_id)
+    try:
+        allowed = request_cancel(task_id, request.auth)
+    except Exception:
+        logger.warning("Task control store unavailable", exc_info=True)
+        raise HttpError(503, "Cancellation unavailable")
+    return cancel_response(task_id, allowed)
+
+
+def parse_task_id(task_id):
+    try:
+        return str(uuid.UUID(task_id))
+    except ValueError:
+        raise HttpError(404, "Unknown task")
+
+
+def cancel_response(task_id, allowed):
+    # Tasks of other users are reported as unknown
+    if not allowed:
+        raise HttpError(404, "Unknown task")
+    return 202, TaskResponseSchema(message="Cancellation requested", task_id=task_id)
+
+
+def parse_task_ids(ids):
+    task_ids = list(dict.fromkeys(part.strip() for part in ids.split(",")))
+    task_ids = [task_id for task_id in task_ids if task_id]
+    if not task_ids:
+        raise HttpError(400, "Provide at least one task id")
+    if len(task_ids) > settings.TASK_STATUS_MAX_IDS:
+        raise HttpError(
+            400, f"At most {settings.TASK_STATUS_MAX_IDS} task ids per request"
+        )
+    try:
+        return [str(uuid.UUID(task_id)) for task_id in task_ids]
+    except ValueError:
+        raise HttpError(400, "Task ids must be UUIDs")
+
+
+def with_unknown(task_ids, statuses):
+    # Tasks of other users are reported as unknown: PENDING, like ids that
+    # were never queued
+    known = {status["task_id"]: status for status in statuses}
+    return [
+        known.get(task_id) or task_status_reader.to_status(task_id, None)
+        for task_id in task_ids
+    ]
+
+
+def statuses_response(request, response, statuses):
+    # Polls that find nothing changed get a bodiless 304
+    etag = statuses_etag(statuses)
+    if etag_matches(request, etag):
+        not_modified = HttpResponseNotModified()
+        add_private_etag(not_modified, etag)
+        return not_modified
+    add_private_etag(response, etag)
+    return {"tasks": statuses}
+
+
+# Async variants, mounted instead of the routes above when API_ASYNC is enabled
+
+
+@async_router.get("/test", response=TestResponseSchema)
+async def atest_endpoint(request):
+    """Test endpoint that returns user info"""
+    from datetime import datetime
+
+    logger.info(f"Test endpoint accessed by user: {request.auth.username}")
+
+    return TestResponseSchema(
+        message="Test endpoint successful",
+        user=request.auth.username,
+        timestamp=datetime.now().isoformat(),
+    )
+
+
+@async_router.post("/trigger-task", response=TaskResponseSchema)
+@async_rate_limit("example.trigger_task")
+async def atrigger_streaming_task(request):
+    """Trigger the streaming task"""
+    logger.info(f"Streaming task triggered by user: {request.auth.username}")
+
+    # Broker publishing is blocking I/O; keep it off the loop without
+    # queueing behind the single thread-sensitive executor
+    task = await sync_to_async(streaming_task.delay, thread_sensitive=False)(
+        user_id=str(request.auth.pk)
+    )
+    await arecord_task_owners([task.id], request.auth.pk)
+
+    return TaskResponseSchema(
+        message="Streaming task started",
+        task_id=task.id,
+    )
+
+
+@async_router.post("/trigger-tasks", response=TaskBatchResponseSchema)
+async def atrigger_streaming_tasks(
+    request, response: HttpResponse, payload: TaskBatchSchema
+):
+    """Trigger a batch of streaming tasks, published together"""
+    # Publishing and the idempotency store are blocking I/O
+    return await sync_to_async(trigger_batch, thread_sensitive=False)(
+        request, response, payload
+    )
+
+
+@async_router.get("/tasks", response=TaskStatusListSchema)
+async def atask_statuses(request, response: HttpResponse, ids: str):
+    """State, progress and result of tasks, given as comma-separated ids"""
+    task_ids = parse_task_ids(ids)
+    try:
+        visible = await aaccessible_tasks(task_ids, request.auth)
+        statuses = await task_status_reader.aget_many(
+            [task_id for task_id in task_ids if task_id in visible]
+        )
+    except Exception:
+        logger.warning("Task status unavailable", exc_info=True)
+        raise HttpError(503, "Task status unavailable")
+    return statuses_response(request, response, with_unknown(task_ids, statuses))
+
+
+@async_router.post("/tasks/{task_id}/cancel", response={202: TaskResponseSchema})
+async def acancel_task(request, task_id: str):
+    """Ask a running or queued task to stop at its next step"""
+    task_id = parse_task_id(task_id)
+    try:
+        allowed = await arequest_cancel(task_id, request.auth)
+    except Exception:
+        logger.warning("Task control store unavailable", exc_info=True)
+        raise HttpError(503, "Cancellation unavailable")
+    return cancel_response(task_id, allowed)
@@ -1,15 +1,79 @@
 import json
 import logging
+import uuid
+from collections import deque
+import redis
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
+from authentication.cache import api_key_cache
+from authentication.middleware import APIKeyAuthMiddleware
+from apps.common.broadcast import GLOBAL_GROUP, event_frame, task_group, user_group
 from apps.common.logger_utils import async_log_info, async_log_exception
+from apps.common.metrics import Counter, Gauge
+from apps.common.rate_limit import identify, rate_limiter, retry_after_seconds
+from apps.common.task_control import aaccessible_tasks, arequest_cancel
+
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections", "Open WebSocket connections", ["consumer"]
+)
+WEBSOCKET_CONNECTIONS_OPENED = Counter(
+    "websocket_connections_opened", "WebSocket connections accepted", ["consumer"]
+)
+WEBSOCKET_MESSAGES = Counter(
+    "websocket_messages",
+    "WebSocket frames by direction (received, sent)",
+    ["consumer", "direction"],
+)
 
 
 class ExampleConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
+    # Groups one socket may be subscribed to at once
+    max_subscriptions = 100
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         self.authenticated = False
         self.user = None
+        self.subscriptions = set()
+        # Frames delivered recently, so an update reaching this socket
+        # through both its user group and a task group is sent once
+        self.recent_frames = deque(maxlen=16)
+
+    async def websocket_connect(self, message):
+        WEBSOCKET_CONNECTIONS.inc(consumer=type(self).__name__)
+        WEBSOCKET_CONNECTIONS_OPENED.inc(consumer=type(self).__name__)
+        await super().websocket_connect(message)
+
+    async def websocket_disconnect(self, message):
+        WEBSOCKET_CONNECTIONS.dec(consumer=type(self).__name__)
+        await super().websocket_disconnect(message)
+
+    async def websocket_receive(self, message):
+        WEBSOCKET_MESSAGES.inc(consumer=type(self).__name__, direction="received")
+        await super().websocket_receive(message)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if text_data is not None or bytes_data is not None:
+            WEBSOCKET_MESSAGES.inc(consumer=type(self).__name__, direction="sent")
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    async def connect(self):
+        wait = await self.rate_limit_wait("ws.connect")
+        if wait is not None:
+            await self.accept()
+            await self.send_rate_limited(wait)
+            await self.close(code=4029)
+            return
+
+        # Already authenticated during the handshake by APIKeyAuthMiddleware
+        user = self.scope.get("user")
+        if user is not None and user.is_authenticated:
+            subprotocol = None
+            if APIKeyAuthMiddleware.subprotocol in self.scope.get("subprotocols", []):
+                subprotocol = APIKeyAuthMiddleware.subprotocol
+            await self.accept(subprotocol=subprotocol)
+            await self.on_authenticated(user)
+            return
+
         await self.accept()
 
         # Send authentication challenge
@@ -41,7 +105,31 @@ class ExampleConsumer(AsyncWebsocketConsumer):
             )
             await self.close(code=4008)
 
+    async def rate_limit_wait(self, scope):
+        """Seconds to back off when ``scope`` refuses this socket, else None"""
+        client = self.scope.get("client") or [None]
+        ident, tier = identify(self.user or self.scope.get("user"), client[0])
+        allowed, wait = await rate_limiter.acheck(scope, ident, tier)
+        return None if allowed else retry_after_seconds(wait)
+
+    async def send_rate_limited(self, wait):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "rate_limited",
+                    "message": "Too many requests",
+                    "retry_after": wait,
+                }
+            )
+        )
+
     async def receive(self, text_data):
+        # Dropped unread, so a flooding client costs no parsing
+        wait = await self.rate_limit_wait("ws.message")
+        if wait is not None:
+            await self.send_rate_limited(wait)
+            return
+
         try:
             data = json.loads(text_data)
 
@@ -58,25 +146,7 @@ class ExampleConsumer(AsyncWebsocketConsumer):
                 user = await self.authenticate_user(api_key)
 
                 if user:
-                    self.authenticated = True
-                    self.user = user
-                    await self.channel_layer.group_add("test_group", self.channel_name)
-
-                    await self.send(
-                        text_data=json.dumps(
-                            {
-                                "type": "auth_success",
-                                "message": f"Welcome {user.username}! You are now connected.",
-                                "user": {
-                                    "username": user.username,
-                                    "is_staff": user.is_staff,
-                                },
-                            }
-                        )
-                    )
-
-                    # Use async-safe logging
-                    await async_log_info(f"WebSocket authenticated: {user.username}")
+                    await self.on_authenticated(user)
                 else:
                     await self.send(
                         text_data=json.dumps(
@@ -111,6 +181,29 @@ class ExampleConsumer(AsyncWebsocketConsumer):
             )
             await self.close(code=4000)
 
+    async def on_authenticated(self, user):
+        self.authenticated = True
+        self.user = user
+        # Sockets receive their own tasks; other tasks and the global group
+        # are opt-in through subscribe messages
+        await self.join(user_group(user.pk))
+
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "auth_success",
+                    "message": f"Welcome {user.username}! You are now connected.",
+                    "user": {
+                        "username": user.username,
+                        "is_staff": user.is_staff,
+                    },
+                }
+            )
+        )
+
+        # Use async-safe logging
+        await async_log_info(f"WebSocket authenticated: {user.username}")
+
     async def handle_authenticated_message(self, data):
         """Handle messages from authenticated users"""
         message_type = data.get("type")
@@ -121,6 +214,10 @@ class ExampleConsumer(AsyncWebsocketConsumer):
                     {"type": "pong", "timestamp": data.get("timestamp")}
                 )
             )
+        elif message_type in ("subscribe", "unsubscribe"):
+            await self.handle_subscription(message_type, data)
+        elif message_type == "cancel":
+            await self.handle_cancel(data)
         else:
             await self.send(
                 text_data=json.dumps(
@@ -131,9 +228,117 @@ class ExampleConsumer(AsyncWebsocketConsumer):
                 )
             )
 
+    async def handle_subscription(self, action, data):
+        """
+        Join or leave a group, given as ``{"task_id": "<id>"}`` or
+        ``{"channel": "global" | "user"}``
+        """
+        target, group = self.subscription_target(data)
+        if group is None:
+            await self.send(
+                text_data=json.dumps(
+                    {
+                        "type": "error",
+                        "message": 'Specify a task_id or a channel ("global" or "user")',
+                    }
+                )
+            )
+            return
+
+        if action == "subscribe":
+            if (
+                group not in self.subscriptions
+                and len(self.subscriptions) >= self.max_subscriptions
+            ):
+                await self.send(
+                    text_data=json.dumps(
+                        {
+                            "type": "error",
+                            "message": f"At most {self.max_subscriptions} subscriptions are allowed",
+                        }
+                    )
+                )
+                return
+            if "task_id" in target and not await self.may_follow(target["task_id"]):
+                return
+            await self.join(group)
+        else:
+            await self.leave(group)
+
+        await self.send(text_data=json.dumps({"type": f"{action}d", **target}))
+
+    async def handle_cancel(self, data):
+        """Ask one of the user's tasks, given as ``{"task_id": "<id>"}``, to stop"""
+        try:
+            task_id = str(uuid.UUID(str(data.get("task_id"))))
+            allowed = await arequest_cancel(task_id, self.user)
+        except ValueError:
+            allowed = False
+        except redis.RedisError:
+            await self.send(
+                text_data=json.dumps(
+                    {"type": "error", "message": "Cancellation unavailable"}
+                )
+            )
+            return
+
+        if not allowed:
+            await self.send(
+                text_data=json.dumps({"type": "error", "message": "Unknown task"})
+            )
+            return
+        await self.send(
+            text_data=json.dumps({"type": "cancel_requested", "task_id": task_id})
+        )
+
+    async def may_follow(self, task_id):
+        """Whether the user owns the task (any owned task for staff), else say why not"""
+        try:
+            allowed = bool(await aaccessible_tasks([task_id], self.user))
+        except redis.RedisError:
+            await self.send(
+                text_data=json.dumps(
+                    {"type": "error", "message": "Subscription unavailable"}
+                )
+            )
+            return False
+        if not allowed:
+            # Tasks of other users are reported as unknown, as for cancel
+            await self.send(
+                text_data=json.dumps({"type": "error", "message": "Unknown task"})
+            )
+        return allowed
+
+    def subscription_target(self, data):
+        task_id = data.get("task_id")
+        if task_id is not None:
+            try:
+                task_id = str(uuid.UUID(str(task_id)))
+            except ValueError:
+                return None, None
+            return {"task_id": task_id}, task_group(task_id)
+
+        channel = data.get("channel")
+        if channel == "global":
+            return {"channel": channel}, GLOBAL_GROUP
+        if channel == "user":
+            return {"channel": channel}, user_group(self.user.pk)
+        return None, None
+
+    async def join(self, group):
+        if group not in self.subscriptions:
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.subscriptions.add(group)
+
+    async def leave(self, group):
+        if group in self.subscriptions:
+            await self.channel_layer.group_discard(group, self.channel_name)
+            self.subscriptions.discard(group)
+
     async def disconnect(self, close_code):
         if self.authenticated:
-            await self.channel_layer.group_discard("test_group", self.channel_name)
+            for group in list(self.subscriptions):
+                await self.leave(group)
             # Use async-safe logging
             username = self.user.username if self.user else "Unknown"
             await async_log_info(f"WebSocket disconnected: {username}")
@@ -141,14 +346,12 @@ class ExampleConsumer(AsyncWebsocketConsumer):
     async def task_update(self, event):
         """Receive task updates from Celery"""
         if self.authenticated:
-            await self.send(
-                text_data=json.dumps({"type": "task_update", "data": event})
-            )
+            # Senders pre-encode the frame once for every subscriber
+            frame = event_frame(event, "task_update")
+            if frame in self.recent_frames:
+                return
+            self.recent_frames.append(frame)
+            await self.send(text_data=frame)
 
-    @database_sync_to_async
-    def authenticate_user(self, api_key):
-        try:
-            User = get_user_model()
-            return User.objects.get(api_key=api_key, is_api_key_active=True)
-        except User.DoesNotExist:
-            return None
+    async def authenticate_user(self, api_key):
+        return await api_key_cache.aget_user(api_key)
@@ -0,0 +1,312 @@
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import django
+from channels.layers import InMemoryChannelLayer
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.common.broadcast import group_event
+
+from .benchmark_broadcast import Command as BroadcastBenchmark
+
+# Result fields compared against a baseline, and whether higher is better
+COMPARED = {
+    "throughput": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "per_event_ms": False,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the HTTP, task dispatch, WebSocket handshake and broadcast "
+        "scenarios in-process against the ASGI application and write the "
+        "results as JSON. Requires DJANGO_SETTINGS_MODULE=core.settings.benchmark."
+    )
+
+    scenarios = ("example_test", "auth_me", "trigger_task", "ws_handshake", "broadcast")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=self.scenarios,
+            help="Scenario to run, repeatable (default: all)",
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument(
+            "--task-requests",
+            type=int,
+            default=200,
+            help="Requests for trigger_task, which runs the task eagerly",
+        )
+        parser.add_argument("--connections", type=int, default=10_000)
+        parser.add_argument("--consumers", type=int, default=10_000)
+        parser.add_argument("--events", type=int, default=5)
+        parser.add_argument("--payload-bytes", type=int, default=256)
+        parser.add_argument(
+            "--output",
+            help="Result file (default: benchmarks/<timestamp>-<commit>.json)",
+        )
+        parser.add_argument("--compare", help="Earlier result file to compare with")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.10,
+            help="Relative change counted as a regression (default: 0.10)",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error when --compare finds a regression",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "BENCHMARK", False):
+            raise CommandError(
+                "The benchmark migrates and seeds the database; run it with "
+                "DJANGO_SETTINGS_MODULE=core.settings.benchmark"
+            )
+
+        call_command("migrate", interactive=False, verbosity=0)
+        api_key = self.benchmark_api_key()
+
+        from core.asgi import application
+
+        self.application = application
+        self.headers = [(b"x-api-key", api_key.encode())]
+
+        results = {}
+        for name in options["scenario"] or self.scenarios:
+            self.stdout.write(f"Running {name}...")
+            results[name] = asyncio.run(getattr(self, f"run_{name}")(options))
+            self.stdout.write(f"  {self.format_result(results[name])}")
+
+        report = {"environment": self.environment(), "results": results}
+        path = self.write_report(report, options["output"])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
+
+        if options["compare"]:
+            regressions = self.compare(report, options["compare"], options["tolerance"])
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{regressions} regression(s) beyond tolerance")
+
+    def benchmark_api_key(self):
+        User = get_user_model()
+        user = User.objects.filter(username="benchmark").first()
+        if user is None:
+            user = User.objects.create_user("benchmark", "benchmark@example.com")
+        return User.objects.values_list("api_key", flat=True).get(pk=user.pk)
+
+    # Scenarios
+
+    async def run_example_test(self, options):
+        return await self.http_load(
+            "GET", "/api/example/test", options["requests"], options
+        )
+
+    async def run_auth_me(self, options):
+        return await self.http_load("GET", "/api/auth/me", options["requests"], options)
+
+    async def run_trigger_task(self, options):
+        # Celery is eager here: the latency includes running the task with
+        # EXAMPLE_TASK_STEP_SECONDS per step, but no broker round trip
+        result = await self.http_load(
+            "POST", "/api/example/trigger-task", options["task_requests"], options
+        )
+        result["task_step_seconds"] = settings.EXAMPLE_TASK_STEP_SECONDS
+        return result
+
+    async def run_ws_handshake(self, options):
+        """Open every connection at once, authenticating with the API key header"""
+        count = options["connections"]
+        latencies = []
+
+        async def handshake():
+            start = time.perf_counter()
+            communicator = WebsocketCommunicator(
+                self.application, "/ws/test/", headers=self.headers
+            )
+            connected, _ = await communicator.connect(timeout=120)
+            if connected:
+                frame = json.loads(await communicator.receive_from(timeout=120))
+                connected = frame.get("type") == "auth_success"
+            latencies.append(time.perf_counter() - start)
+            return communicator, connected
+
+        start = time.perf_counter()
+        handshakes = await asyncio.gather(*(handshake() for _ in range(count)))
+        elapsed = time.perf_counter() - start
+
+        await asyncio.gather(
+            *(communicator.disconnect() for communicator, _ in handshakes)
+        )
+        errors = sum(1 for _, connected in handshakes if not connected)
+        return self.summarize(latencies, elapsed, errors)
+
+    async def run_broadcast(self, options):
+        """Deliver group events to many local consumers (see benchmark_broadcast)"""
+        broadcast = BroadcastBenchmark()
+        layer = InMemoryChannelLayer(capacity=options["events"] + 1)
+        consumers = await broadcast.make_consumers(layer, options["consumers"])
+        data = broadcast.event_data(options["payload_bytes"])
+        per_event, handlers = await broadcast.measure(
+            layer,
+            consumers,
+            options["events"],
+            lambda n: group_event("task_update", {**data, "step": n}),
+        )
+        delivered = sum(consumer.sent for consumer in consumers.values())
+        return {
+            "consumers": len(consumers),
+            "events": options["events"],
+            "delivered": delivered,
+            "per_event_ms": round(per_event * 1000, 3),
+            "handlers_ms": round(handlers * 1000, 3),
+        }
+
+    # Helpers
+
+    async def http_load(self, method, path, total, options):
+        """``total`` requests over ``concurrency`` concurrent clients"""
+        concurrency = max(1, min(options["concurrency"], total))
+        latencies = []
+        errors = 0
+
+        async def client(requests):
+            nonlocal errors
+            for _ in range(requests):
+                start = time.perf_counter()
+                communicator = HttpCommunicator(
+                    self.application, method, path, headers=self.headers
+                )
+                response = await communicator.get_response(timeout=120)
+                latencies.append(time.perf_counter() - start)
+                if response["status"] != 200:
+                    errors += 1
+                # Django's handler keeps listening for the disconnect after
+                # the response; send it so the app task ends here instead of
+                # being destroyed still pending
+                await communicator.send_input({"type": "http.disconnect"})
+                await communicator.wait(timeout=10)
+
+        shares = [total // concurrency] * concurrency
+        for index in range(total % concurrency):
+            shares[index] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(share) for share in shares))
+        elapsed = time.perf_counter() - start
+        result = self.summarize(latencies, elapsed, errors)
+        result["concurrency"] = concurrency
+        return result
+
+    def summarize(self, latencies, elapsed, errors):
+        latencies = sorted(latencies)
+
+        def percentile(fraction):
+            index = min(len(latencies) - 1, int(fraction * len(latencies)))
+            return round(latencies[index] * 1000, 3)
+
+        return {
+            "count": len(latencies),
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "throughput": round(len(latencies) / elapsed, 1),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+            "p50_ms": percentile(0.50),
+            "p90_ms": percentile(0.90),
+            "p99_ms": percentile(0.99),
+            "max_ms": percentile(1.0),
+        }
+
+    def format_result(self, result):
+        return ", ".join(f"{key}={value}" for key, value in result.items())
+
+    def environment(self):
+        from apps.common.redis_clients import get_redis
+
+        try:
+            redis_available = bool(get_redis("auth").ping())
+        except Exception:
+            redis_available = False
+
+        return {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": self.git("rev-parse", "--short", "HEAD"),
+            "dirty": bool(self.git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": os.environ.get("DJANGO_SETTINGS_MODULE"),
+            "api_async": settings.API_ASYNC,
+            "redis_available": redis_available,
+            "argv": sys.argv[2:],
+        }
+
+    def git(self, *args):
+        try:
+            completed = subprocess.run(
+                ["git", *args],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return completed.stdout.strip()
+
+    def write_report(self, report, output):
+        if output:
+            path = Path(output)
+        else:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            commit = report["environment"]["commit"] or "unknown"
+            path = Path(settings.BASE_DIR) / "benchmarks" / f"{timestamp}-{commit}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2) + "\n")
+        return path
+
+    def compare(self, report, baseline_path, tolerance):
+        """Print the change of each compared field; returns the regression count"""
+        try:
+            baseline = json.loads(Path(baseline_path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {baseline_path}: {exc}")
+
+        self.stdout.write(f"Compared with {baseline['environment'].get('commit')}:")
+        regressions = 0
+        for name, result in report["results"].items():
+            before = baseline["results"].get(name)
+            if before is None:
+                continue
+            for field, higher_is_better in COMPARED.items():
+                if not before.get(field) or result.get(field) is None:
+                    continue
+                change = (result[field] - before[field]) / before[field]
+                worse = -change if higher_is_better else change
+                line = f"  {name}.{field}: {before[field]} -> {result[field]} ({change:+.1%})"
+                if worse > tolerance:
+                    regressions += 1
+                    self.stdout.write(self.style.ERROR(f"{line} REGRESSION"))
+                elif -worse > tolerance:
+                    self.stdout.write(self.style.SUCCESS(f"{line} improved"))
+                else:
+                    self.stdout.write(line)
+        return regressions
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from apps.common import broadcast
+from apps.common.broadcast import GLOBAL_GROUP, group_event
+from apps.example.consumers import ExampleConsumer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-consumer encoding with encode-once group broadcasts for "
+        "many local ExampleConsumers on the in-memory channel layer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumers", type=int, default=10_000)
+        parser.add_argument("--events", type=int, default=5)
+        parser.add_argument(
+            "--payload-bytes",
+            type=int,
+            default=256,
+            help="Size of the padding field added to each event",
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        count = options["consumers"]
+        layer = InMemoryChannelLayer(capacity=options["events"] + 1)
+        consumers = await self.make_consumers(layer, count)
+        data = self.event_data(options["payload_bytes"])
+
+        self.stdout.write(f"{count} consumers, {options['events']} events each")
+        encoders = [("json", None)]
+        if broadcast.orjson is not None:
+            encoders.append(("orjson", broadcast.orjson))
+
+        for name, module in encoders:
+            broadcast.orjson = module
+            per_consumer, per_consumer_handlers = await self.measure(
+                layer,
+                consumers,
+                options["events"],
+                lambda n: self.legacy_event({**data, "step": n}),
+            )
+            encode_once, encode_once_handlers = await self.measure(
+                layer,
+                consumers,
+                options["events"],
+                lambda n: group_event("task_update", {**data, "step": n}),
+            )
+            self.stdout.write(
+                f"{name:>7}: per-consumer encode {per_consumer * 1e3:8.1f} ms/event "
+                f"(handlers {per_consumer_handlers * 1e3:.1f} ms), "
+                f"encode-once {encode_once * 1e3:8.1f} ms/event "
+                f"(handlers {encode_once_handlers * 1e3:.1f} ms)"
+            )
+
+    def event_data(self, payload_bytes):
+        return {
+            "message": "Processing step 1/10 - 10% complete",
+            "task_id": "7f6c1e8e-2b47-4d0a-9d8e-5c3b1c0f8a21",
+            "progress": 10,
+            "step": 1,
+            "total_steps": 10,
+            "padding": "x" * payload_bytes,
+        }
+
+    async def make_consumers(self, layer, count):
+        consumers = {}
+        for _ in range(count):
+            consumer = ExampleConsumer()
+            consumer.authenticated = True
+            consumer.channel_name = await layer.new_channel()
+            consumer.sent = 0
+            consumer.base_send = self.make_sink(consumer)
+            await layer.group_add(GLOBAL_GROUP, consumer.channel_name)
+            consumers[consumer.channel_name] = consumer
+        return consumers
+
+    def make_sink(self, consumer):
+        async def base_send(message):
+            consumer.sent += 1
+
+        return base_send
+
+    def legacy_event(self, data):
+        # What senders published before frames were pre-encoded
+        return {"type": "task_update", **data}
+
+    async def measure(self, layer, consumers, events, build_event):
+        """
+        Seconds per event to publish and deliver it to every consumer, and
+        the part of that spent in the consumers' task_update handlers
+        """
+        total = handlers = 0.0
+        for n in range(events):
+            # Distinct events, consumers skip frames they just delivered
+            start = time.perf_counter()
+            await layer.group_send(GLOBAL_GROUP, build_event(n))
+            for channel, consumer in consumers.items():
+                # InMemoryChannelLayer.receive() scans every channel for
+                # expiry, which would dominate at this size; read the queue
+                _, event = layer.channels.pop(channel).get_nowait()
+                handler_start = time.perf_counter()
+                await consumer.task_update(event)
+                handlers += time.perf_counter() - handler_start
+            total += time.perf_counter() - start
+        return total / events, handlers / events
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.common.task_routing import tier_backlog
+from core.celery import app
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the tasks waiting in each broker queue and how long the oldest "
+        "has waited, per latency tier."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'queue':<16}{'tier':<14}{'waiting':>10}{'oldest':>12}")
+        for queue, tiers in tier_backlog(app).items():
+            for tier, (depth, wait) in tiers.items():
+                oldest = f"{wait:.1f}s" if wait is not None else "-"
+                self.stdout.write(f"{queue:<16}{tier:<14}{depth:>10}{oldest:>12}")
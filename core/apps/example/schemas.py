@@ -1,4 +1,7 @@
-from ninja import Schema
+from typing import Any, List, Optional
+
+from django.conf import settings
+from ninja import Field, Schema
 
 
 class TaskResponseSchema(Schema):
@@ -10,3 +13,32 @@ class TestResponseSchema(Schema):
     message: str
     user: str
     timestamp: str
+
+
+class TaskSpecSchema(Schema):
+    steps: int = Field(10, ge=1, le=100)
+
+
+class TaskBatchSchema(Schema):
+    tasks: List[TaskSpecSchema] = Field(
+        ..., min_length=1, max_length=settings.TASK_BATCH_MAX_SIZE
+    )
+
+
+class TaskBatchResponseSchema(Schema):
+    message: str
+    task_ids: List[str]
+
+
+class TaskStatusSchema(Schema):
+    task_id: str
+    state: str
+    # Latest update reported by a running task (PROGRESS state)
+    progress: Optional[dict] = None
+    result: Any = None
+    error: Optional[str] = None
+    date_done: Optional[str] = None
+
+
+class TaskStatusListSchema(Schema):
+    tasks: List[TaskStatusSchema]
@@ -1,78 +1,89 @@
 from celery import shared_task
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from celery.exceptions import Ignore
+from django.conf import settings
+from apps.common.broadcast import GLOBAL_GROUP, group_event, task_group, user_group
+from apps.common.progress import TaskProgress, get_progress_publisher
+from apps.common.task_control import TaskCheckpoint
 import time
 import logging
 
 logger = logging.getLogger("db")
-channel_layer = get_channel_layer()
 
 
-@shared_task(bind=True, queue="io_queue")
-def streaming_task(self):
+# Acked after running, so a run killed with its worker (time limit, crash)
+# is redelivered and resumes from its checkpoint
+@shared_task(
+    bind=True,
+    name="example.tasks.streaming_task",
+    acks_late=True,
+    reject_on_worker_lost=True,
+)
+def streaming_task(self, user_id=None, steps=10):
     """
     Test task that streams progress to WebSocket clients
-    Uses async_to_sync to properly handle channel layer communication
+    Progress goes through the worker's shared, throttled progress publisher
+    to the task's group and to the group of the user who triggered it
+    Completed steps are checkpointed, so retries resume after the last one,
+    and a cancellation request stops the task at the next step
     """
     logger.info(f"Starting streaming task: {self.request.id}")
+    groups = [task_group(self.request.id)]
+    if user_id:
+        groups.append(user_group(user_id))
+    reporter = TaskProgress(groups, self.request.id)
+    checkpoint = TaskCheckpoint(self.request.id).load()
+    if checkpoint.step:
+        logger.info(f"Resuming task {self.request.id} after step {checkpoint.step}")
 
     try:
-        for i in range(10):
+        for i in range(checkpoint.step, steps):
+            if checkpoint.cancelled:
+                break
+
             # Simulate work
-            time.sleep(2)
+            time.sleep(settings.EXAMPLE_TASK_STEP_SECONDS)
 
-            progress = (i + 1) * 10
-            message = f"Processing step {i + 1}/10 - {progress}% complete"
+            progress = (i + 1) * 100 // steps
+            message = f"Processing step {i + 1}/{steps} - {progress}% complete"
 
             # Send progress update to WebSocket group
-            async_to_sync(channel_layer.group_send)(
-                "test_group",
-                {
-                    "type": "task_update",
-                    "message": message,
-                    "task_id": self.request.id,
-                    "progress": progress,
-                    "step": i + 1,
-                    "total_steps": 10,
-                },
+            reporter.update(
+                message=message,
+                progress=progress,
+                step=i + 1,
+                total_steps=steps,
             )
 
-            logger.info(f"Task {self.request.id}: {message}")
+            checkpoint.save(i + 1)
 
-        # Send completion message
-        async_to_sync(channel_layer.group_send)(
-            "test_group",
-            {
-                "type": "task_update",
-                "message": "Task completed successfully!",
-                "task_id": self.request.id,
-                "progress": 100,
-                "status": "completed",
-            },
-        )
-
-        logger.info(f"Completed streaming task: {self.request.id}")
-        return {"status": "completed", "result": "Task finished successfully"}
+            logger.info(f"Task {self.request.id}: {message}")
 
     except Exception as exc:
         logger.exception(f"Task {self.request.id} failed: {exc}")
 
         # Send error message to WebSocket
-        async_to_sync(channel_layer.group_send)(
-            "test_group",
-            {
-                "type": "task_update",
-                "message": f"Task failed: {str(exc)}",
-                "task_id": self.request.id,
-                "status": "failed",
-                "error": str(exc),
-            },
-        )
+        reporter.failed(message=f"Task failed: {str(exc)}", error=str(exc))
 
         raise self.retry(exc=exc, countdown=60, max_retries=3)
 
+    checkpoint.clear()
+    if checkpoint.step < steps:
+        reporter.cancelled(
+            message="Task cancelled", progress=checkpoint.step * 100 // steps
+        )
+        logger.info(f"Cancelled streaming task: {self.request.id}")
+        # Reported as REVOKED by the status API
+        self.backend.mark_as_revoked(self.request.id, "Cancelled", request=self.request)
+        raise Ignore()
+
+    # Send completion message
+    reporter.completed(message="Task completed successfully!", progress=100)
+
+    logger.info(f"Completed streaming task: {self.request.id}")
+    return {"status": "completed", "result": "Task finished successfully"}
 
-@shared_task(queue="cpu_queue")
+
+@shared_task(name="example.tasks.periodic_test_task")
 def periodic_test_task():
     """
     Periodic task that sends updates to WebSocket clients
@@ -85,15 +96,17 @@ def periodic_test_task():
     current_time = datetime.datetime.now().isoformat()
 
     try:
-        async_to_sync(channel_layer.group_send)(
-            "test_group",
-            {
-                "type": "task_update",
-                "message": "Periodic task executed successfully",
-                "timestamp": current_time,
-                "task_type": "periodic",
-                "status": "success",
-            },
+        get_progress_publisher().send(
+            GLOBAL_GROUP,
+            group_event(
+                "task_update",
+                {
+                    "message": "Periodic task executed successfully",
+                    "timestamp": current_time,
+                    "task_type": "periodic",
+                    "status": "success",
+                },
+            ),
         )
 
         logger.info(f"Periodic task completed at {current_time}")
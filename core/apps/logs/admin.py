@@ -0,0 +1,87 @@
+import logging
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.utils import timezone
+from django.utils.html import format_html
+
+from .models import LogRecord, decode_cursor
+
+CURSOR_VAR = "cursor"
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paging by (create_datetime, id) with a ``cursor`` query
+    parameter instead of page numbers: no COUNT over the table and no
+    OFFSET, so the last page is as cheap as the first.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        cursor = self.params.get(CURSOR_VAR)
+        try:
+            cursor = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise IncorrectLookupParameters
+        records, self.next_cursor = self.queryset.page(cursor, self.list_per_page)
+
+        self.newest_url = self.get_query_string(remove=[CURSOR_VAR]) if cursor else None
+        self.older_url = (
+            self.get_query_string({CURSOR_VAR: self.next_cursor})
+            if self.next_cursor
+            else None
+        )
+        self.result_count = len(records)
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = records
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = None
+
+
+@admin.register(LogRecord)
+class LogRecordAdmin(admin.ModelAdmin):
+    list_display = ("colored_msg", "traceback", "create_datetime_format")
+    list_display_links = ("colored_msg",)
+    list_filter = ("level",)
+    list_per_page = 50
+    show_full_result_count = False
+    # Any other order would defeat the keyset pagination
+    sortable_by = ()
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def has_add_permission(self, request):
+        return False
+
+    def colored_msg(self, instance):
+        if instance.level in [logging.NOTSET, logging.INFO]:
+            color = "green"
+        elif instance.level in [logging.WARNING, logging.DEBUG]:
+            color = "orange"
+        else:
+            color = "red"
+        return format_html(
+            '<span style="color: {color};">{msg}</span>', color=color, msg=instance.msg
+        )
+
+    colored_msg.short_description = "Message"
+
+    def traceback(self, instance):
+        return format_html(
+            "<pre><code>{content}</code></pre>", content=instance.trace or ""
+        )
+
+    def create_datetime_format(self, instance):
+        return timezone.localtime(instance.create_datetime).strftime("%Y-%m-%d %X")
+
+    create_datetime_format.short_description = "Created at"
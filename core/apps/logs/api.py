@@ -0,0 +1,80 @@
+from datetime import datetime
+from typing import Optional
+
+from django.conf import settings
+from ninja import Router
+from ninja.errors import HttpError
+
+from apps.common.rate_limit import RateLimit, async_rate_limit
+from authentication.authentication import api_key_auth, async_api_key_auth
+
+from .models import LogRecord, decode_cursor
+from .schemas import LogPageSchema
+
+router = Router(tags=["Logs"], throttle=RateLimit("api"))
+async_router = Router(tags=["Logs"])
+async_router.add_decorator(async_rate_limit("api"))
+
+
+@router.get("/", response=LogPageSchema, auth=api_key_auth)
+def list_logs(
+    request,
+    level: Optional[int] = None,
+    logger: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+):
+    """Database log records, newest first, a page at a time (staff only)"""
+    queryset, cursor, limit = log_query(
+        request, level, logger, since, until, cursor, limit
+    )
+    records, next_cursor = queryset.page(cursor, limit)
+    return {"results": records, "next": next_cursor}
+
+
+def log_query(request, level, logger, since, until, cursor, limit):
+    """Filtered queryset, decoded cursor and page size of a log request"""
+    if not request.auth.is_staff:
+        raise HttpError(403, "Staff only")
+    if not 1 <= limit <= settings.DB_LOG_PAGE_MAX:
+        raise HttpError(400, f"limit must be between 1 and {settings.DB_LOG_PAGE_MAX}")
+    if cursor is not None:
+        try:
+            cursor = decode_cursor(cursor)
+        except ValueError:
+            raise HttpError(400, "Invalid cursor")
+
+    # Each filter matches one of the (…, create_datetime, id) indexes
+    queryset = LogRecord.objects.all()
+    if level is not None:
+        queryset = queryset.filter(level=level)
+    if logger is not None:
+        queryset = queryset.filter(logger_name=logger)
+    if since is not None:
+        queryset = queryset.filter(create_datetime__gte=since)
+    if until is not None:
+        queryset = queryset.filter(create_datetime__lt=until)
+    return queryset, cursor, limit
+
+
+# Async variant, mounted instead of the route above when API_ASYNC is enabled
+
+
+@async_router.get("/", response=LogPageSchema, auth=async_api_key_auth)
+async def alist_logs(
+    request,
+    level: Optional[int] = None,
+    logger: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+):
+    """Database log records, newest first, a page at a time (staff only)"""
+    queryset, cursor, limit = log_query(
+        request, level, logger, since, until, cursor, limit
+    )
+    records, next_cursor = await queryset.apage(cursor, limit)
+    return {"results": records, "next": next_cursor}
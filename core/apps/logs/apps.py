@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class LogsConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "logs"
+
+    def ready(self):
+        post_migrate.connect(create_partitions_after_migrate, sender=self)
+
+
+def create_partitions_after_migrate(using=None, **kwargs):
+    """Inserts fail without a partition for the day, so never wait for beat"""
+    from django.db import connections
+
+    from .partitions import TABLE, ensure_partitions
+
+    if TABLE in connections[using].introspection.table_names():
+        ensure_partitions(using=using)
@@ -0,0 +1,108 @@
+import logging
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# The partition key has to be part of the primary key; Django only knows
+# about "id", which the sequence keeps unique
+PARTITIONED_TABLE_SQL = """
+CREATE TABLE "logs_logrecord" (
+    "id" bigserial NOT NULL,
+    "logger_name" varchar(100) NOT NULL,
+    "level" smallint NOT NULL CHECK ("level" >= 0),
+    "msg" text NOT NULL,
+    "trace" text NULL,
+    "create_datetime" timestamp with time zone NOT NULL,
+    PRIMARY KEY ("id", "create_datetime")
+) PARTITION BY RANGE ("create_datetime")
+"""
+
+
+def create_log_table(apps, schema_editor):
+    """Partitioned by day on PostgreSQL, a plain table elsewhere"""
+    LogRecord = apps.get_model("logs", "LogRecord")
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.create_model(LogRecord)
+        return
+    schema_editor.execute(PARTITIONED_TABLE_SQL)
+    # Rows of days without a partition land here instead of failing
+    schema_editor.execute(
+        'CREATE TABLE "logs_logrecord_default" PARTITION OF "logs_logrecord" DEFAULT'
+    )
+    # Created on the parent, so every partition gets them
+    for index in LogRecord._meta.indexes:
+        schema_editor.add_index(LogRecord, index)
+
+
+def drop_log_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model("logs", "LogRecord"))
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="LogRecord",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        ("logger_name", models.CharField(max_length=100)),
+                        (
+                            "level",
+                            models.PositiveSmallIntegerField(
+                                choices=[
+                                    (logging.DEBUG, "Debug"),
+                                    (logging.INFO, "Info"),
+                                    (logging.WARNING, "Warning"),
+                                    (logging.ERROR, "Error"),
+                                    (logging.CRITICAL, "Critical"),
+                                ],
+                                default=logging.ERROR,
+                            ),
+                        ),
+                        ("msg", models.TextField()),
+                        ("trace", models.TextField(blank=True, null=True)),
+                        (
+                            "create_datetime",
+                            models.DateTimeField(
+                                default=django.utils.timezone.now,
+                                verbose_name="Created at",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "ordering": ("-create_datetime", "-id"),
+                        "indexes": [
+                            models.Index(
+                                fields=["create_datetime", "id"],
+                                name="logs_created_idx",
+                            ),
+                            models.Index(
+                                fields=["level", "create_datetime", "id"],
+                                name="logs_level_idx",
+                            ),
+                            models.Index(
+                                fields=["logger_name", "create_datetime", "id"],
+                                name="logs_logger_idx",
+                            ),
+                        ],
+                    },
+                ),
+            ],
+        ),
+        # Run after the state change, so the model is there to build from
+        migrations.RunPython(create_log_table, drop_log_table),
+    ]
@@ -0,0 +1,101 @@
+import base64
+import datetime
+import logging
+
+from django.db import models
+from django.utils import timezone
+
+LOG_LEVELS = (
+    (logging.DEBUG, "Debug"),
+    (logging.INFO, "Info"),
+    (logging.WARNING, "Warning"),
+    (logging.ERROR, "Error"),
+    (logging.CRITICAL, "Critical"),
+)
+
+
+class LogRecordQuerySet(models.QuerySet):
+    def newest_first(self):
+        return self.order_by("-create_datetime", "-id")
+
+    def before(self, cursor):
+        """Records after ``cursor`` in newest-first order (keyset pagination)"""
+        created, pk = cursor
+        # The range on create_datetime also prunes partitions
+        return self.filter(create_datetime__lte=created).exclude(
+            create_datetime=created, id__gte=pk
+        )
+
+    def page(self, cursor=None, limit=50):
+        """(records, cursor of the next page or None), newest first"""
+        return paginate(list(self.page_query(cursor, limit)), limit)
+
+    async def apage(self, cursor=None, limit=50):
+        records = [record async for record in self.page_query(cursor, limit)]
+        return paginate(records, limit)
+
+    def page_query(self, cursor, limit):
+        # One row more than the page tells whether there is a next page
+        queryset = self.newest_first()
+        if cursor is not None:
+            queryset = queryset.before(cursor)
+        return queryset[: limit + 1]
+
+
+class LogRecord(models.Model):
+    """
+    A database log record, written by QueuedDatabaseLogHandler and the
+    WebSocket log sink when ``DB_LOG_STORAGE`` is "partitioned".
+
+    On PostgreSQL the table is partitioned by day of ``create_datetime``
+    (see logs.partitions); its primary key is (id, create_datetime) in the
+    database. Read it newest first with ``LogRecord.objects.page()``, which
+    pages by (create_datetime, id) instead of OFFSET and never counts rows.
+    """
+
+    logger_name = models.CharField(max_length=100)
+    level = models.PositiveSmallIntegerField(choices=LOG_LEVELS, default=logging.ERROR)
+    msg = models.TextField()
+    trace = models.TextField(blank=True, null=True)
+    create_datetime = models.DateTimeField(
+        default=timezone.now, verbose_name="Created at"
+    )
+
+    objects = LogRecordQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("-create_datetime", "-id")
+        indexes = [
+            models.Index(fields=["create_datetime", "id"], name="logs_created_idx"),
+            models.Index(
+                fields=["level", "create_datetime", "id"], name="logs_level_idx"
+            ),
+            models.Index(
+                fields=["logger_name", "create_datetime", "id"],
+                name="logs_logger_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.msg
+
+
+def paginate(records, limit):
+    if len(records) > limit:
+        return records[:limit], encode_cursor(records[limit - 1])
+    return records, None
+
+
+def encode_cursor(record):
+    value = f"{record.create_datetime.isoformat()}|{record.pk}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(create_datetime, id) of an encoded cursor; ValueError if malformed"""
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created, pk = value.split("|")
+        return datetime.datetime.fromisoformat(created), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor") from None
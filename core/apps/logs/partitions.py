@@ -0,0 +1,161 @@
+import datetime
+import logging
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import LogRecord
+
+logger = logging.getLogger(__name__)
+
+TABLE = LogRecord._meta.db_table
+PARTITION_RE = re.compile(rf"^{TABLE}_p(\d{{8}})$")
+# Catches rows of days without a partition, so inserts never fail while
+# beat is down; ensure_partitions() moves them out when it creates the day
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def is_partitioned(connection):
+    return connection.vendor == "postgresql"
+
+
+def partition_name(day):
+    return f"{TABLE}_p{day:%Y%m%d}"
+
+
+def existing_partitions(connection):
+    """{day: partition table name}"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            day = datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+            partitions[day] = name
+    return partitions
+
+
+def create_default_partition(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" '
+            f'PARTITION OF "{TABLE}" DEFAULT'
+        )
+
+
+def ensure_partitions(today=None, days_ahead=None, using=DEFAULT_DB_ALIAS):
+    """Create the partitions of today and the next ``days_ahead`` days (UTC)"""
+    connection = connections[using]
+    if not is_partitioned(connection):
+        return []
+    today = today or timezone.now().date()
+    if days_ahead is None:
+        days_ahead = settings.DB_LOG_PARTITIONS_AHEAD
+    create_default_partition(connection)
+    existing = existing_partitions(connection)
+
+    created = []
+    for offset in range(days_ahead + 1):
+        day = today + datetime.timedelta(days=offset)
+        if day in existing:
+            continue
+        create_partition(connection, day)
+        created.append(partition_name(day))
+    return created
+
+
+def create_partition(connection, day):
+    """
+    Create the partition of ``day``, taking over the day's rows from the
+    default partition (attaching fails while the default one holds any)
+    """
+    name = partition_name(day)
+    start = datetime.datetime.combine(day, datetime.time(), datetime.timezone.utc)
+    end = start + datetime.timedelta(days=1)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE "{name}" '
+            f'(LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+            f"WHERE create_datetime >= %s AND create_datetime < %s RETURNING *) "
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            [start, end],
+        )
+        # Also creates the parent's indexes on the partition
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" '
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+
+
+def drop_expired(today=None, retention_days=None, using=DEFAULT_DB_ALIAS):
+    """
+    Remove records older than ``retention_days`` whole days: drop their
+    partitions on PostgreSQL, delete them in batches elsewhere. Returns the
+    dropped partitions and the number of rows deleted.
+    """
+    connection = connections[using]
+    today = today or timezone.now().date()
+    if retention_days is None:
+        retention_days = settings.DB_LOG_RETENTION_DAYS
+    oldest_kept = today - datetime.timedelta(days=retention_days)
+
+    if not is_partitioned(connection):
+        cutoff = datetime.datetime.combine(
+            oldest_kept, datetime.time(), datetime.timezone.utc
+        )
+        return [], delete_before(cutoff, using)
+
+    dropped = []
+    for day, name in sorted(existing_partitions(connection).items()):
+        if day >= oldest_kept:
+            break
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS "{name}"')
+        dropped.append(name)
+    # Rows of days that never got a partition
+    cutoff = datetime.datetime.combine(
+        oldest_kept, datetime.time(), datetime.timezone.utc
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM "{DEFAULT_PARTITION}" WHERE create_datetime < %s', [cutoff]
+        )
+        deleted = cursor.rowcount
+    return dropped, deleted
+
+
+def delete_before(cutoff, using=DEFAULT_DB_ALIAS, batch_size=5000):
+    expired = LogRecord.objects.using(using).filter(create_datetime__lt=cutoff)
+    deleted = 0
+    while True:
+        ids = list(expired.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += LogRecord.objects.using(using).filter(id__in=ids).delete()[0]
+
+
+def maintain_partitions(using=DEFAULT_DB_ALIAS):
+    created = ensure_partitions(using=using)
+    dropped, deleted = drop_expired(using=using)
+    if created or dropped or deleted:
+        logger.info(
+            "Log partitions created: %s, dropped: %s, rows deleted: %d",
+            created,
+            dropped,
+            deleted,
+        )
+    return {"created": created, "dropped": dropped, "deleted": deleted}
@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import List, Optional
+
+from ninja import Schema
+
+
+class LogRecordSchema(Schema):
+    id: int
+    logger_name: str
+    level: int
+    msg: str
+    trace: Optional[str] = None
+    create_datetime: datetime
+
+
+class LogPageSchema(Schema):
+    results: List[LogRecordSchema]
+    # Pass as ?cursor= for the next (older) page; null on the last one
+    next: Optional[str] = None
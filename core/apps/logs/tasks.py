@@ -0,0 +1,12 @@
+from celery import shared_task
+
+from .partitions import maintain_partitions
+
+
+@shared_task(name="logs.tasks.maintain_log_partitions")
+def maintain_log_partitions():
+    """
+    Create the coming days' log partitions and drop those past retention
+    Runs hourly via Celery Beat; the work is a no-op most of the time
+    """
+    return maintain_partitions()
@@ -10,8 +10,6 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from apps.example.routers import websocket_urlpatterns
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.development")
 
@@ -19,9 +17,13 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.development")
 # is populated before importing code that may import ORM models.
 django_asgi_app = get_asgi_application()
 
+from authentication.middleware import APIKeyAuthMiddleware
+from apps.example.routers import websocket_urlpatterns
+
 application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
-        "websocket": AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+        # API key auth at handshake time; no session/user lookups needed
+        "websocket": APIKeyAuthMiddleware(URLRouter(websocket_urlpatterns)),
     }
 )
@@ -1,11 +1,23 @@
 from celery import Celery
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
+from celery.worker.control import inspect_command
 from django.conf import settings
+from django.db.models.signals import post_save
+import logging
 import os
 
 # Set default Django settings module
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.development")
 
 app = Celery("core")
+logger = logging.getLogger(__name__)
 
 # Using a string here means the worker doesn't have to serialize
 # the configuration object to child processes.
@@ -25,11 +37,8 @@ app.conf.update(
     worker_max_tasks_per_child=1000,
 )
 
-# Task routing
-app.conf.task_routes = {
-    "apps.example.tasks.streaming_task": {"queue": "io_queue"},
-    "apps.example.tasks.periodic_test_task": {"queue": "cpu_queue"},
-}
+# Task routing, by registered task name (TASK_ROUTES)
+app.conf.task_routes = ("apps.common.task_routing.route_task",)
 
 # Queue configuration
 app.conf.task_default_queue = "default"
@@ -46,6 +55,112 @@ app.conf.task_queues = {
 app.autodiscover_tasks()
 
 
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def flush_before_exit(**kwargs):
+    """
+    Prefork children exit without atexit hooks. Deliver coalesced progress
+    updates first, then write queued log records (sending may log), then
+    flush metrics, which count both
+    """
+    from apps.common.log_handlers import flush_all
+    from apps.common.metrics import flush_metrics
+    from apps.common.progress import close_progress_publisher
+
+    for step in (close_progress_publisher, flush_all, flush_metrics):
+        try:
+            step()
+        except Exception:
+            # One failing step must not cost the data of the others
+            logger.exception("Shutdown step %r failed", step)
+
+
+@worker_init.connect
+def check_task_routes(sender=None, **kwargs):
+    """Refuse to start with tasks that have no queue or tier"""
+    from django.core.exceptions import ImproperlyConfigured
+
+    from apps.common.task_routing import check_task_routes
+
+    try:
+        check_task_routes(sender.app)
+    except ImproperlyConfigured as exc:
+        # Celery logs and swallows exceptions raised by signal receivers
+        raise SystemExit(str(exc))
+
+
+@worker_init.connect
+def install_db_instrumentation(**kwargs):
+    """Time queries in every process of this worker (prefork children inherit it)"""
+    from apps.common.instrumentation import install_db_instrumentation
+
+    install_db_instrumentation()
+
+
+@before_task_publish.connect
+def stamp_published(headers=None, **kwargs):
+    """Publish time, for the queue wait metric"""
+    from apps.common.instrumentation import stamp_published
+
+    if headers is not None:
+        stamp_published(headers)
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    from apps.common.instrumentation import task_started
+
+    task_started(task_id, task)
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    from apps.common.instrumentation import task_finished
+
+    task_finished(task_id, task, state)
+
+
+@task_postrun.connect
+def release_db_connections(**kwargs):
+    """Return the task's connection to the pool (CELERY_DB_REUSE_MAX keeps
+    Celery's fixup from closing the whole pool after every task)"""
+    from django.db import close_old_connections
+
+    close_old_connections()
+
+
+def notify_schedule_changed(**kwargs):
+    """django_celery_beat bumps PeriodicTasks on every schedule change"""
+    from django.db import transaction
+
+    from apps.common.beat import publish_schedule_change
+
+    transaction.on_commit(publish_schedule_change)
+
+
+post_save.connect(
+    notify_schedule_changed,
+    sender="django_celery_beat.PeriodicTasks",
+    dispatch_uid="notify_schedule_changed",
+)
+
+
+@inspect_command()
+def db_pool_stats(state):
+    """celery -A core inspect db_pool_stats"""
+    from apps.common.db_pool import pool_stats
+
+    return pool_stats()
+
+
+@inspect_command()
+def redis_pool_stats(state):
+    """celery -A core inspect redis_pool_stats"""
+    from apps.common.redis_clients import redis_pool_stats
+
+    return redis_pool_stats()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
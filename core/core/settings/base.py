@@ -28,6 +28,8 @@ def required_env(key, default=None):
 def optional_env(key, default=None, cast=str):
     value = os.getenv(key, default)
     if cast == bool:
+        if isinstance(value, bool):
+            return value
         return value.lower() in ("true", "1", "yes", "on") if value else default
     elif cast == int:
         return int(value) if value else default
@@ -71,11 +73,13 @@ THIRD_PARTY_APPS = [
 LOCAL_APPS = [
     "authentication",
     "example",
+    "logs",
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    "apps.common.instrumentation.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -106,11 +110,66 @@ TEMPLATES = [
 WSGI_APPLICATION = "core.wsgi.application"
 ASGI_APPLICATION = "core.asgi.application"
 
+# Serve the Ninja routers with async views and async API key auth
+API_ASYNC = optional_env("API_ASYNC", False, bool)
+
 # Database
 import dj_database_url
 
 DATABASES = {"default": dj_database_url.parse(required_env("DATABASE_URL"))}
 
+# Postgres connection pooling (psycopg 3 pool, one pool per process).
+# DB_PROCESS_TYPE selects the default pool size for the process: web (daphne
+# threads), cpu (a prefork child runs one task at a time), io (gevent
+# greenlets share the pool and wait for a free connection instead of
+# exhausting max_connections) or beat.
+DB_PROCESS_TYPE = optional_env("DB_PROCESS_TYPE", "web")
+DB_POOL_SIZES = {"web": (2, 10), "cpu": (1, 2), "io": (2, 20), "beat": (1, 2)}
+if DB_PROCESS_TYPE not in DB_POOL_SIZES:
+    raise ValueError(
+        f"DB_PROCESS_TYPE must be one of {', '.join(DB_POOL_SIZES)}, got {DB_PROCESS_TYPE}"
+    )
+DB_POOL_ENABLED = optional_env("DB_POOL_ENABLED", True, bool)
+DB_POOL_MIN_SIZE = optional_env(
+    "DB_POOL_MIN_SIZE", DB_POOL_SIZES[DB_PROCESS_TYPE][0], int
+)
+DB_POOL_MAX_SIZE = optional_env(
+    "DB_POOL_MAX_SIZE", DB_POOL_SIZES[DB_PROCESS_TYPE][1], int
+)
+# Seconds to wait for a free connection before failing the query
+DB_POOL_TIMEOUT = optional_env("DB_POOL_TIMEOUT", 10.0, float)
+DB_POOL_MAX_IDLE = optional_env("DB_POOL_MAX_IDLE", 300, int)
+DB_POOL_MAX_LIFETIME = optional_env("DB_POOL_MAX_LIFETIME", 1800, int)
+# Set behind a transaction-pooling proxy (e.g. PgBouncer in transaction mode):
+# consecutive transactions may run on different server sessions, so no
+# prepared statements or server-side cursors
+DB_TRANSACTION_POOLER = optional_env("DB_TRANSACTION_POOLER", False, bool)
+
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    # Connections are checked before being handed out
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+    db_options = DATABASES["default"].setdefault("OPTIONS", {})
+    if DB_TRANSACTION_POOLER:
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+        db_options["prepare_threshold"] = None
+    else:
+        db_options["prepare_threshold"] = 5
+    if DB_POOL_ENABLED:
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        db_options["pool"] = {
+            "min_size": DB_POOL_MIN_SIZE,
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": DB_POOL_TIMEOUT,
+            "max_idle": DB_POOL_MAX_IDLE,
+            "max_lifetime": DB_POOL_MAX_LIFETIME,
+            "name": f"{PROJECT_NAME}-{DB_PROCESS_TYPE}",
+        }
+    else:
+        # Greenlets are short-lived, so io workers cannot reuse connections
+        DATABASES["default"]["CONN_MAX_AGE"] = optional_env(
+            "CONN_MAX_AGE", 0 if DB_PROCESS_TYPE == "io" else 60, int
+        )
+
 # Custom User Model
 AUTH_USER_MODEL = "authentication.User"
 
@@ -151,22 +210,139 @@ MEDIA_ROOT = BASE_DIR / "media"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Redis Configuration
-import redis
-
 REDIS_URL = required_env("REDIS_URL")
 
+# Shared Redis connection pools (apps.common.redis_clients), one per process
+# for each distinct db/socket timeout. A consumer waits up to
+# REDIS_POOL_TIMEOUT seconds for a free connection once MAX_CONNECTIONS are
+# in use.
+REDIS_MAX_CONNECTIONS = optional_env("REDIS_MAX_CONNECTIONS", 50, int)
+REDIS_POOL_TIMEOUT = optional_env("REDIS_POOL_TIMEOUT", 5.0, float)
+REDIS_SOCKET_TIMEOUT = optional_env("REDIS_SOCKET_TIMEOUT", 5.0, float)
+REDIS_CONNECT_TIMEOUT = optional_env("REDIS_CONNECT_TIMEOUT", 2.0, float)
+REDIS_SOCKET_KEEPALIVE = optional_env("REDIS_SOCKET_KEEPALIVE", True, bool)
+REDIS_HEALTH_CHECK_INTERVAL = optional_env("REDIS_HEALTH_CHECK_INTERVAL", 30, int)
+
+# API key authentication cache (in-process LRU backed by Redis)
+# Other processes may keep serving an invalidated entry for up to LOCAL_TTL seconds
+API_KEY_CACHE_ENABLED = optional_env("API_KEY_CACHE_ENABLED", True, bool)
+API_KEY_CACHE_LOCAL_TTL = optional_env("API_KEY_CACHE_LOCAL_TTL", 5, int)
+API_KEY_CACHE_LOCAL_MAXSIZE = optional_env("API_KEY_CACHE_LOCAL_MAXSIZE", 10000, int)
+API_KEY_CACHE_REDIS_TTL = optional_env("API_KEY_CACHE_REDIS_TTL", 300, int)
+API_KEY_CACHE_NEGATIVE_TTL = optional_env("API_KEY_CACHE_NEGATIVE_TTL", 30, int)
+API_KEY_CACHE_REDIS_TIMEOUT = optional_env("API_KEY_CACHE_REDIS_TIMEOUT", 0.5, float)
+# Users per UPDATE (and per transaction) when rotating, activating or
+# deactivating API keys in bulk (authentication.bulk_keys); admin selections
+# larger than this run as a background task
+API_KEY_BULK_BATCH_SIZE = optional_env("API_KEY_BULK_BATCH_SIZE", 1000, int)
+
+# Admin changelists using apps.common.pagination.EstimatedCountPaginator
+# (users) take the row count from the PostgreSQL query plan instead of
+# COUNT(*) once it estimates at least this many rows
+ADMIN_EXACT_COUNT_BELOW = optional_env("ADMIN_EXACT_COUNT_BELOW", 10000, int)
+
+# Redis consumers: an optional logical "db" (defaults to the one in
+# REDIS_URL), a key "prefix", and "socket_timeout" (None for blocking
+# commands) and "socket_connect_timeout" overrides
+REDIS_CONSUMERS = {
+    "default": {},
+    "auth": {
+        "db": optional_env("REDIS_AUTH_DB", None, int),
+        "prefix": "auth:",
+        "socket_timeout": API_KEY_CACHE_REDIS_TIMEOUT,
+        "socket_connect_timeout": API_KEY_CACHE_REDIS_TIMEOUT,
+    },
+    "cache": {
+        "db": optional_env("REDIS_CACHE_DB", None, int),
+        "prefix": PROJECT_NAME,
+        "socket_timeout": API_KEY_CACHE_REDIS_TIMEOUT,
+        "socket_connect_timeout": API_KEY_CACHE_REDIS_TIMEOUT,
+    },
+    "channels": {
+        "db": optional_env("REDIS_CHANNELS_DB", None, int),
+        "prefix": "asgi",
+        # Receives block in BRPOP for several seconds
+        "socket_timeout": None,
+    },
+    "metrics": {
+        "db": optional_env("REDIS_METRICS_DB", None, int),
+        "prefix": "metrics:",
+    },
+    "tasks": {
+        "db": optional_env("REDIS_TASKS_DB", None, int),
+        "prefix": "tasks:",
+    },
+    "beat": {
+        "db": optional_env("REDIS_BEAT_DB", None, int),
+        "prefix": "beat:",
+    },
+    "ratelimit": {
+        "db": optional_env("REDIS_RATE_LIMIT_DB", None, int),
+        "prefix": "ratelimit:",
+        # Checked inline on requests; past this, limits apply per process
+        "socket_timeout": optional_env("RATE_LIMIT_REDIS_TIMEOUT", 0.1, float),
+        "socket_connect_timeout": optional_env("RATE_LIMIT_REDIS_TIMEOUT", 0.1, float),
+    },
+}
+
+# Cache Configuration
+CACHES = {
+    "default": {
+        "BACKEND": "apps.common.cache_backends.SharedRedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": REDIS_CONSUMERS["cache"]["prefix"],
+        "OPTIONS": {"consumer": "cache"},
+    },
+}
+
+# Per-API-key cache of rendered GET responses (apps.common.response_cache)
+RESPONSE_CACHE_ENABLED = optional_env("RESPONSE_CACHE_ENABLED", True, bool)
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TTL = optional_env("RESPONSE_CACHE_TTL", 60, int)
+
+# Rate limits (apps.common.rate_limit) per scope and user tier: "anonymous"
+# (keyed by client address), "default" and "staff" (keyed by user). A tier
+# missing from a scope uses the scope's "default"; None means unlimited.
+# Rates are "<count>/<period>" with period s, m, h or d, e.g. "10/5m"
+RATE_LIMIT_ENABLED = optional_env("RATE_LIMIT_ENABLED", True, bool)
+RATE_LIMITS = {
+    "api": {
+        "anonymous": optional_env("RATE_LIMIT_API_ANONYMOUS", "60/m"),
+        "default": optional_env("RATE_LIMIT_API", "600/m"),
+        "staff": optional_env("RATE_LIMIT_API_STAFF", "3000/m"),
+    },
+    "example.trigger_task": {
+        "default": optional_env("RATE_LIMIT_TRIGGER_TASK", "10/m"),
+        "staff": optional_env("RATE_LIMIT_TRIGGER_TASK_STAFF", "60/m"),
+    },
+    "ws.connect": {
+        "anonymous": optional_env("RATE_LIMIT_WS_CONNECT_ANONYMOUS", "10/m"),
+        "default": optional_env("RATE_LIMIT_WS_CONNECT", "30/m"),
+    },
+    # Before authentication, messages are API key attempts
+    "ws.message": {
+        "anonymous": optional_env("RATE_LIMIT_WS_AUTH_ATTEMPTS", "10/m"),
+        "default": optional_env("RATE_LIMIT_WS_MESSAGE", "20/s"),
+        "staff": optional_env("RATE_LIMIT_WS_MESSAGE_STAFF", "100/s"),
+    },
+}
+
 # Channels Configuration
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "BACKEND": "apps.common.channel_layers.SharedRedisChannelLayer",
         "CONFIG": {
-            "hosts": [REDIS_URL],
+            "consumer": "channels",
             "capacity": 1000,
             "expiry": 60,
         },
     },
 }
 
+# Reject WebSocket handshakes without an API key instead of falling back to
+# the message-based auth flow
+WS_REQUIRE_HANDSHAKE_AUTH = optional_env("WS_REQUIRE_HANDSHAKE_AUTH", False, bool)
+
 # Celery Configuration
 CELERY_BROKER_URL = required_env("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = required_env("CELERY_RESULT_BACKEND")
@@ -180,6 +356,114 @@ CELERY_TASK_TIME_LIMIT = 300
 CELERY_TASK_SOFT_TIME_LIMIT = 240
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
+# Kombu and the result backend keep their own pools; bound them and use the
+# same keepalive and timeouts as the shared pools
+CELERY_BROKER_POOL_LIMIT = optional_env("CELERY_BROKER_POOL_LIMIT", 10, int)
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "max_connections": REDIS_MAX_CONNECTIONS,
+    "socket_keepalive": REDIS_SOCKET_KEEPALIVE,
+    "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+    "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+    # One list per priority, so each tier's band is served strictly in order
+    "priority_steps": list(range(10)),
+}
+CELERY_REDIS_MAX_CONNECTIONS = REDIS_MAX_CONNECTIONS
+CELERY_REDIS_SOCKET_KEEPALIVE = REDIS_SOCKET_KEEPALIVE
+CELERY_REDIS_SOCKET_TIMEOUT = REDIS_SOCKET_TIMEOUT
+CELERY_REDIS_SOCKET_CONNECT_TIMEOUT = REDIS_CONNECT_TIMEOUT
+CELERY_REDIS_BACKEND_HEALTH_CHECK_INTERVAL = REDIS_HEALTH_CHECK_INTERVAL
+# Keep Celery's Django fixup from closing the connection pool around every
+# task; core.celery returns each task's connection to the pool instead
+CELERY_DB_REUSE_MAX = CELERY_WORKER_MAX_TASKS_PER_CHILD
+
+# Task routing (apps.common.task_routing): every registered task needs a
+# route, by name or pattern, to a queue and a latency tier; workers refuse to
+# start otherwise. Each tier owns a band of broker priorities, 0 served first
+TASK_TIERS = {
+    "interactive": (0, 2),
+    "periodic": (3, 5),
+    "bulk": (6, 9),
+}
+TASK_ROUTES = {
+    "example.tasks.streaming_task": {"queue": "io_queue", "tier": "interactive"},
+    "example.tasks.periodic_test_task": {"queue": "cpu_queue", "tier": "periodic"},
+    "logs.tasks.maintain_log_partitions": {"queue": "cpu_queue", "tier": "periodic"},
+    "authentication.tasks.bulk_update_api_keys": {
+        "queue": "cpu_queue",
+        "tier": "bulk",
+    },
+    "core.celery.debug_task": {"queue": "cpu_queue", "tier": "bulk"},
+    # Celery's built-in tasks (chord_unlock, backend_cleanup, ...)
+    "celery.*": {"queue": "cpu_queue", "tier": "bulk"},
+}
+
+# Workers started with --autoscale=max,min resize their pool from the
+# backlog of the queues they consume (apps.common.autoscale), reading the
+# broker every AUTOSCALE_INTERVAL seconds. One policy per pool type: prefork
+# grows by forking, so it moves a few processes at a time and waits longer
+# before shrinking; gevent greenlets are cheap and follow the backlog
+CELERY_WORKER_AUTOSCALER = "apps.common.autoscale:QueueAutoscaler"
+AUTOSCALE_INTERVAL = optional_env("AUTOSCALE_INTERVAL", 5.0, float)
+AUTOSCALE_POLICIES = {
+    "prefork": {
+        "scale_up_backlog": 1.0,
+        "scale_up_wait": optional_env("AUTOSCALE_CPU_SCALE_UP_WAIT", 10.0, float),
+        "scale_up_step": 2,
+        "scale_down_utilization": 0.5,
+        "scale_down_delay": optional_env(
+            "AUTOSCALE_CPU_SCALE_DOWN_DELAY", 300.0, float
+        ),
+        "scale_down_step": 1,
+    },
+    "gevent": {
+        "scale_up_backlog": 0.1,
+        "scale_up_wait": optional_env("AUTOSCALE_IO_SCALE_UP_WAIT", 1.0, float),
+        "scale_up_step": None,
+        "scale_down_utilization": 0.5,
+        "scale_down_delay": optional_env("AUTOSCALE_IO_SCALE_DOWN_DELAY", 60.0, float),
+        "scale_down_step": None,
+    },
+}
+
+# Task progress publishing (apps.common.progress): at most one update per task
+# every TASK_PROGRESS_INTERVAL seconds; terminal updates wait up to
+# TASK_PROGRESS_TIMEOUT seconds for delivery
+TASK_PROGRESS_INTERVAL = optional_env("TASK_PROGRESS_INTERVAL", 0.5, float)
+TASK_PROGRESS_TIMEOUT = optional_env("TASK_PROGRESS_TIMEOUT", 5.0, float)
+
+# Tasks accepted by one bulk trigger request, and how long the response of
+# a request sent with an Idempotency-Key is replayed to retries
+TASK_BATCH_MAX_SIZE = optional_env("TASK_BATCH_MAX_SIZE", 500, int)
+IDEMPOTENCY_KEY_TTL = optional_env("IDEMPOTENCY_KEY_TTL", 86400, int)
+IDEMPOTENCY_CACHE_ALIAS = "default"
+
+# Lifetime of task checkpoints, owners and cancellation flags
+# (apps.common.task_control); covers a task's retries
+TASK_CHECKPOINT_TTL = optional_env("TASK_CHECKPOINT_TTL", 86400, int)
+
+# Task status API: ids per request, and how long a process keeps the status
+# of finished tasks instead of reading the result backend again
+TASK_STATUS_MAX_IDS = optional_env("TASK_STATUS_MAX_IDS", 200, int)
+TASK_STATUS_CACHE_TTL = optional_env("TASK_STATUS_CACHE_TTL", 30, int)
+TASK_STATUS_CACHE_MAXSIZE = optional_env("TASK_STATUS_CACHE_MAXSIZE", 10000, int)
+
+# Simulated work per step of apps.example.tasks.streaming_task
+EXAMPLE_TASK_STEP_SECONDS = optional_env("EXAMPLE_TASK_STEP_SECONDS", 2.0, float)
+
+# Readiness checks (apps.common.health), refreshed in the background every
+# HEALTH_CHECK_INTERVAL seconds; a queue deeper than HEALTH_QUEUE_DEPTH_LIMIT
+# reports the service as degraded
+HEALTH_CHECK_INTERVAL = optional_env("HEALTH_CHECK_INTERVAL", 10.0, float)
+HEALTH_CHECK_TIMEOUT = optional_env("HEALTH_CHECK_TIMEOUT", 2.0, float)
+HEALTH_QUEUE_DEPTH_LIMIT = optional_env("HEALTH_QUEUE_DEPTH_LIMIT", 1000, int)
+
+# Metrics (apps.common.metrics): every process merges what it recorded into
+# Redis every METRICS_FLUSH_INTERVAL seconds and /metrics serves the totals in
+# the Prometheus text format. With METRICS_TOKEN set, scrapes must send
+# "Authorization: Bearer <token>"
+METRICS_ENABLED = optional_env("METRICS_ENABLED", True, bool)
+METRICS_FLUSH_INTERVAL = optional_env("METRICS_FLUSH_INTERVAL", 5.0, float)
+METRICS_TOKEN = optional_env("METRICS_TOKEN", "")
 
 # Celery Beat Schedule
 CELERY_BEAT_SCHEDULE = {
@@ -187,9 +471,19 @@ CELERY_BEAT_SCHEDULE = {
         "task": "example.tasks.periodic_test_task",
         "schedule": crontab(minute="*/5"),  # Every 5 minutes
     },
+    "maintain-log-partitions": {
+        "task": "logs.tasks.maintain_log_partitions",
+        "schedule": crontab(minute=5),  # Hourly
+    },
 }
 
-CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# Keeps the schedule in memory and reloads it when a change is published on
+# Redis (apps.common.beat), checking the database for missed changes every
+# BEAT_SCHEDULE_POLL_INTERVAL seconds. Ticks are cheap, so beat wakes up
+# every second and runs changes within about a second
+CELERY_BEAT_SCHEDULER = "apps.common.beat:NotifiedDatabaseScheduler"
+CELERY_BEAT_MAX_LOOP_INTERVAL = 1
+BEAT_SCHEDULE_POLL_INTERVAL = optional_env("BEAT_SCHEDULE_POLL_INTERVAL", 60.0, float)
 
 # Logging Configuration
 LOGGING = {
@@ -209,7 +503,11 @@ LOGGING = {
         "console": {"class": "logging.StreamHandler", "formatter": "verbose"},
         "db_log": {
             "level": "INFO",
-            "class": "django_db_logger.db_log_handler.DatabaseLogHandler",
+            # Enqueues records and bulk-inserts them from a background thread
+            "class": "apps.common.log_handlers.QueuedDatabaseLogHandler",
+            "max_queue_size": optional_env("DB_LOG_QUEUE_SIZE", 10000, int),
+            "batch_size": optional_env("DB_LOG_BATCH_SIZE", 500, int),
+            "flush_interval": optional_env("DB_LOG_FLUSH_INTERVAL", 1.0, float),
         },
     },
     "root": {
@@ -250,6 +548,29 @@ LOGGING = {
     },
 }
 
+# Where database log records go: "partitioned" writes logs.LogRecord, split
+# into one partition per day on PostgreSQL (apps/logs); "legacy" keeps
+# writing django_db_logger's StatusLog. Records older than
+# DB_LOG_RETENTION_DAYS days are dropped a partition at a time (deleted in
+# batches on other databases), and partitions are created
+# DB_LOG_PARTITIONS_AHEAD days in advance
+DB_LOG_STORAGE = optional_env("DB_LOG_STORAGE", "partitioned")
+DB_LOG_MODEL = {
+    "partitioned": "logs.LogRecord",
+    "legacy": "django_db_logger.StatusLog",
+}[DB_LOG_STORAGE]
+DB_LOG_RETENTION_DAYS = optional_env("DB_LOG_RETENTION_DAYS", 14, int)
+DB_LOG_PARTITIONS_AHEAD = optional_env("DB_LOG_PARTITIONS_AHEAD", 3, int)
+# Largest page of GET /api/logs/
+DB_LOG_PAGE_MAX = optional_env("DB_LOG_PAGE_MAX", 500, int)
+
+# Buffered database logging from WebSocket consumers (apps.common.logger_utils)
+WS_LOG_BUFFER_SIZE = optional_env("WS_LOG_BUFFER_SIZE", 10000, int)
+WS_LOG_BATCH_SIZE = optional_env("WS_LOG_BATCH_SIZE", 200, int)
+WS_LOG_FLUSH_INTERVAL = optional_env("WS_LOG_FLUSH_INTERVAL", 1.0, float)
+# drop_newest, drop_oldest or block
+WS_LOG_DROP_POLICY = optional_env("WS_LOG_DROP_POLICY", "drop_newest")
+
 # Django Jazzmin Configuration
 JAZZMIN_SETTINGS = {
     "site_title": f"{PROJECT_NAME} Admin",
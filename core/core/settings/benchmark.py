@@ -0,0 +1,75 @@
+"""
+Self-contained settings for benchmarks: SQLite, the in-memory channel layer,
+a local-memory cache and eager Celery, so no Postgres, Redis or worker is
+needed.
+
+    DJANGO_SETTINGS_MODULE=core.settings.benchmark python manage.py benchmark
+
+The API key cache still tries REDIS_URL for its shared tier and falls back to
+the database when nothing is listening there.
+"""
+
+import os
+import tempfile
+
+# Read through required_env by the base settings
+os.environ.setdefault("PROJECT_NAME", "benchmark")
+os.environ.setdefault("DJANGO_SECRET_KEY", "insecure-benchmark-only-secret-key")
+os.environ.setdefault("DATABASE_URL", "sqlite://:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+from .base import *
+
+# Marks a profile the benchmark command may migrate and seed
+BENCHMARK = True
+
+DEBUG = False
+ALLOWED_HOSTS = ["*"]
+SECURE_SSL_REDIRECT = False
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": optional_env(
+            "BENCHMARK_DATABASE",
+            os.path.join(tempfile.gettempdir(), f"{PROJECT_NAME}-benchmark.sqlite3"),
+        ),
+        "CONN_MAX_AGE": 60,
+        "OPTIONS": {"timeout": 30},
+    }
+}
+
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "CONFIG": {"capacity": 1000, "expiry": 60},
+    }
+}
+
+# Tasks run inside the request that triggers them
+CELERY_BROKER_URL = "memory://"
+CELERY_RESULT_BACKEND = "cache+memory://"
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+EXAMPLE_TASK_STEP_SECONDS = optional_env("EXAMPLE_TASK_STEP_SECONDS", 0.0, float)
+
+# Metrics are aggregated in Redis
+METRICS_ENABLED = False
+
+# Every scenario runs as one API key, which the limits would throttle
+RATE_LIMIT_ENABLED = optional_env("RATE_LIMIT_ENABLED", False, bool)
+
+# Console output would dominate the measurements, e.g. a warning per API key
+# cache miss when Redis is not running
+LOGGING["root"]["level"] = "ERROR"
+LOGGING["loggers"]["django"]["level"] = "WARNING"
+LOGGING["loggers"]["celery"]["level"] = "WARNING"
+LOGGING["loggers"]["websocket"] = {
+    "handlers": ["console"],
+    "level": "WARNING",
+    "propagate": False,
+}
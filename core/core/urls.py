@@ -21,9 +21,15 @@ from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
 from ninja import NinjaAPI
-from authentication.api import router as auth_router
-from apps.example.api import router as example_router
+from authentication.api import router as auth_router, async_router as async_auth_router
+from apps.example.api import (
+    router as example_router,
+    async_router as async_example_router,
+)
+from logs.api import router as logs_router, async_router as async_logs_router
 from django.http import JsonResponse
+from apps.common.health import get_health_monitor
+from apps.common.metrics import metrics_view
 import time
 
 # Create API instance
@@ -34,21 +40,37 @@ api = NinjaAPI(
     docs_url="/docs",
 )
 
-# Add routers
-api.add_router("/auth", auth_router)
-api.add_router("/example", example_router)
+# Add routers (async stack avoids the sync_to_async thread hop under ASGI)
+if settings.API_ASYNC:
+    api.add_router("/auth", async_auth_router)
+    api.add_router("/example", async_example_router)
+    api.add_router("/logs", async_logs_router)
+else:
+    api.add_router("/auth", auth_router)
+    api.add_router("/example", example_router)
+    api.add_router("/logs", logs_router)
 
 
 # Health check endpoint (no auth required)
 @api.get("/health", tags=["System"])
 def health_check(request):
-    """Health check endpoint for Docker"""
+    """Liveness: the process is up and serving requests"""
     return {"status": "healthy", "timestamp": time.time()}
 
 
+@api.get("/health/ready", tags=["System"])
+def readiness_check(request):
+    """Readiness: dependency status from the last background probe round"""
+    snapshot = get_health_monitor().snapshot()
+    status = 503 if snapshot["status"] == "unavailable" else 200
+    return JsonResponse(snapshot, status=status)
+
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", api.urls),
+    # Prometheus scrape endpoint, not part of the public API
+    path("metrics", metrics_view, name="metrics"),
     # Redirect health check with trailing slash to without trailing slash
     path("api/health/", RedirectView.as_view(url="/api/health", permanent=True)),
 ]